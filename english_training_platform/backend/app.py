@@ -11,6 +11,11 @@ from routes.recommendation import recommendation_bp
 
 # 导入材料管理服务
 from services.material_manager import initialize_sample_materials
+from services.catalog_snapshot import DEFAULT_SNAPSHOT_PATH, load_snapshot
+from services.material_watcher import start_material_watcher
+from services.deepseek.response_cache import get_response_cache
+from services.deepseek.retry_policy import get_circuit_breaker
+from services.deepseek.single_flight import get_single_flight
 
 app = Flask(__name__)
 CORS(app)  # 启用跨域资源共享
@@ -21,10 +26,21 @@ app.register_blueprint(speaking_bp, url_prefix='/api/speaking')
 app.register_blueprint(favorites_bp, url_prefix='/api/favorites')
 app.register_blueprint(recommendation_bp, url_prefix='/api/recommendation')
 
+# 从预编译的快照加载材料目录（每个worker导入时执行），快照不存在或过期时首次访问再解析JSON文件
+load_snapshot(os.environ.get('CATALOG_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH))
+
+# 监视材料目录，教师新增或修改材料后无需重启即可生效（设置MATERIALS_WATCH=0关闭）
+if os.environ.get('MATERIALS_WATCH', '1') != '0':
+    start_material_watcher()
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """健康检查接口"""
-    return jsonify({"status": "ok", "message": "服务正常运行"})
+    """健康检查接口（附带本进程DeepSeek响应缓存的命中统计、熔断器状态和请求合并统计）"""
+    cache = get_response_cache()
+    flight = get_single_flight()
+    return jsonify({"status": "ok", "message": "服务正常运行", "llm_cache": cache.stats() if cache else None,
+                    "llm_circuit": get_circuit_breaker().stats(),
+                    "llm_single_flight": flight.stats() if flight else None})
 
 if __name__ == '__main__':
     # 确保数据目录存在
@@ -1,29 +1,22 @@
 from flask import Blueprint, jsonify, request
-import json
-import os
+
+from services.favorites_store import get_favorites_store
+from services.material_catalog import get_catalog
 
 favorites_bp = Blueprint('favorites', __name__)
 
 @favorites_bp.route('/list/<user_id>', methods=['GET'])
 def get_favorites(user_id):
-    """获取用户的收藏列表"""
+    """获取用户的收藏列表（按收藏时间排序的材料摘要）"""
     try:
-        with open('data/favorites.json', 'r', encoding='utf-8') as f:
-            favorites_data = json.load(f)
-        
-        # 如果用户ID不存在，则返回空列表
-        user_favorites = favorites_data.get(user_id, [])
-        
-        # 如果只是ID列表，则获取完整的材料信息
-        if user_favorites and isinstance(user_favorites[0], str):
-            with open('data/materials.json', 'r', encoding='utf-8') as f:
-                materials = json.load(f)
-            
-            # 获取收藏的完整材料信息
-            favorite_materials = [m for m in materials if m['id'] in user_favorites]
-            return jsonify(favorite_materials)
-        else:
-            return jsonify(user_favorites)
+        catalog = get_catalog()
+        favorite_materials = []
+        for material_id, data in get_favorites_store().list(user_id):
+            # 通过材料目录按ID查找；旧数据中直接保存了完整的材料信息
+            material = catalog.get(material_id) or data
+            if material is not None:
+                favorite_materials.append(material)
+        return jsonify(favorite_materials)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -38,23 +31,8 @@ def add_favorite():
         if not user_id or not material_id:
             return jsonify({"error": "缺少必要参数"}), 400
         
-        # 读取收藏数据
-        try:
-            with open('data/favorites.json', 'r', encoding='utf-8') as f:
-                favorites_data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            favorites_data = {}
-        
-        # 添加到收藏
-        if user_id not in favorites_data:
-            favorites_data[user_id] = []
-        
-        if material_id not in favorites_data[user_id]:
-            favorites_data[user_id].append(material_id)
-        
-        # 保存收藏数据
-        with open('data/favorites.json', 'w', encoding='utf-8') as f:
-            json.dump(favorites_data, f, ensure_ascii=False)
+        # 只写入这一条记录，已收藏时不重复添加
+        get_favorites_store().add(user_id, material_id)
         
         return jsonify({"success": True, "message": "添加收藏成功"})
     except Exception as e:
@@ -71,17 +49,8 @@ def remove_favorite():
         if not user_id or not material_id:
             return jsonify({"error": "缺少必要参数"}), 400
         
-        # 读取收藏数据
-        with open('data/favorites.json', 'r', encoding='utf-8') as f:
-            favorites_data = json.load(f)
-        
         # 从收藏中移除
-        if user_id in favorites_data and material_id in favorites_data[user_id]:
-            favorites_data[user_id].remove(material_id)
-        
-        # 保存收藏数据
-        with open('data/favorites.json', 'w', encoding='utf-8') as f:
-            json.dump(favorites_data, f, ensure_ascii=False)
+        get_favorites_store().remove(user_id, material_id)
         
         return jsonify({"success": True, "message": "移除收藏成功"})
     except Exception as e:
@@ -89,21 +58,33 @@ def remove_favorite():
 
 @favorites_bp.route('/check', methods=['POST'])
 def check_favorite():
-    """检查材料是否已收藏"""
+    """
+    检查材料是否已收藏
+
+    传入material_id时返回{"is_favorited": bool}；传入material_ids列表时一次检查多个材料，
+    返回{"favorites": {材料ID: bool}, "bitmap": [bool, ...]}，bitmap与material_ids顺序一致。
+    """
     try:
         data = request.json
         user_id = data.get('user_id')
-        material_id = data.get('material_id')
+        material_ids = data.get('material_ids')
+        
+        if material_ids is not None:
+            if not user_id or not isinstance(material_ids, list):
+                return jsonify({"error": "缺少必要参数"}), 400
+            material_ids = [str(material_id) for material_id in material_ids]
+            favorited = get_favorites_store().contains_many(user_id, material_ids)
+            return jsonify({
+                "favorites": {material_id: material_id in favorited for material_id in material_ids},
+                "bitmap": [material_id in favorited for material_id in material_ids]
+            })
         
+        material_id = data.get('material_id')
         if not user_id or not material_id:
             return jsonify({"error": "缺少必要参数"}), 400
         
-        # 读取收藏数据
-        with open('data/favorites.json', 'r', encoding='utf-8') as f:
-            favorites_data = json.load(f)
-        
         # 检查是否已收藏
-        is_favorited = user_id in favorites_data and material_id in favorites_data[user_id]
+        is_favorited = get_favorites_store().contains(user_id, material_id)
         
         return jsonify({"is_favorited": is_favorited})
     except Exception as e:
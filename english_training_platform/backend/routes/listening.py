@@ -1,10 +1,34 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 import json
-import os
 import random
 import traceback
-from services.deepseek import evaluate_listening_level, generate_learning_feedback
-from services.material_manager import get_materials_by_difficulty, get_materials_by_topic
+from services.deepseek import evaluate_listening_level, generate_learning_feedback, stream_learning_feedback
+from services.material_manager import get_materials_by_difficulty, get_materials_by_topic, filter_materials
+from services.material_manager import get_material_by_id as find_material_by_id
+from services.assessment import (
+    DEFAULT_ASSESSMENT_SIZE,
+    DEFAULT_DIFFICULTIES,
+    MAX_ASSESSMENT_SIZE,
+    build_assessment,
+    parse_section_quotas,
+)
+from services.file_utils import file_signature
+from services.http_cache import conditional_json
+from services.material_catalog import get_catalog
+from services.material_db import get_material_db
+from services.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+    iter_json_array,
+    parse_fields,
+    project,
+)
+from services.question_table import DEFAULT_DRILL_SIZE, MAX_DRILL_SIZE, build_drill, get_question_table
+from services.search_index import get_search_index
+from services.similarity_index import DEFAULT_SIMILAR_COUNT, MAX_SIMILAR_COUNT, get_similarity_index
+from services.transcript_store import get_material_store, get_transcript_store
 
 listening_bp = Blueprint('listening', __name__)
 
@@ -13,42 +37,102 @@ def log_debug(message):
     """记录调试信息"""
     print(f"[DEBUG] {message}")
 
+def catalog_data_signatures():
+    """材料列表、筛选和单个材料接口所依赖数据文件的签名"""
+    material_db = get_material_db()
+    if material_db:
+        return {material_db.db_path: file_signature(material_db.db_path)}
+    return get_catalog().file_signatures()
+
 @listening_bp.route('/materials', methods=['GET'])
+@conditional_json(catalog_data_signatures)
 def get_listening_materials():
-    """获取所有听力材料"""
+    """
+    获取所有听力材料（包含题目的完整记录）
+
+    无论是否配置了SQLite材料库，返回的都是材料目录中的材料（index.json中的材料加上后端材料），
+    顺序与目录一致。
+
+    参数：
+        fields: 只返回指定字段，如id,title,difficulty,topics
+        limit/cursor: 分页，返回{"items": [...], "next_cursor": ...}；不分页时返回全部材料
+        stream: 为1时逐条流式输出全部材料（全量导出用，不经过响应缓存和压缩）
+    """
     try:
-        with open('data/materials.json', 'r', encoding='utf-8') as f:
-            materials = json.load(f)
-        return jsonify(materials)
+        fields = parse_fields(request.args.get('fields'))
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit', type=int)
+        try:
+            after_id = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        material_db = get_material_db()
+        if limit is None and cursor is None:
+            if material_db:
+                records = material_db.iter_materials(detail=True)
+            else:
+                records = get_catalog().iter_details()
+            if request.args.get('stream') == '1':
+                # 全量导出：逐条编码输出，不在内存中构建完整的JSON字符串
+                return Response(iter_json_array(records, fields), mimetype='application/json')
+            # 每个数据版本只生成一次，之后由响应缓存返回预先压缩的版本
+            return jsonify([project(material, fields) for material in records])
+
+        limit = min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+        # 多取一条用于判断是否还有下一页
+        if material_db:
+            materials = material_db.list_materials(limit=limit + 1, detail=True, after_id=after_id)
+        else:
+            materials = list(get_catalog().iter_details(after_id=after_id, limit=limit + 1))
+
+        items = [project(material, fields) for material in materials[:limit]]
+        next_cursor = encode_cursor(materials[limit - 1]['id']) if len(materials) > limit else None
+        return jsonify({"items": items, "next_cursor": next_cursor})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @listening_bp.route('/materials/topic/<topic>', methods=['GET'])
+@conditional_json(catalog_data_signatures)
 def get_materials_by_topic_route(topic):
-    """根据话题获取听力材料"""
+    """根据话题获取听力材料，可通过difficulty参数同时按难度筛选"""
     try:
-        materials = get_materials_by_topic(topic)
+        difficulty = request.args.get('difficulty')
+        if difficulty:
+            materials = filter_materials(difficulty=difficulty, topic=topic)
+        else:
+            materials = get_materials_by_topic(topic)
         return jsonify(materials)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @listening_bp.route('/materials/difficulty/<difficulty>', methods=['GET'])
+@conditional_json(catalog_data_signatures)
 def get_materials_by_difficulty_route(difficulty):
-    """根据难度获取听力材料"""
+    """根据难度获取听力材料，可通过topic参数同时按话题筛选"""
     try:
-        materials = get_materials_by_difficulty(difficulty)
+        topic = request.args.get('topic')
+        if topic:
+            materials = filter_materials(difficulty=difficulty, topic=topic)
+        else:
+            materials = get_materials_by_difficulty(difficulty)
         return jsonify(materials)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @listening_bp.route('/material/<material_id>', methods=['GET'])
+@conditional_json(catalog_data_signatures)
 def get_material_by_id(material_id):
     """根据ID获取单个听力材料"""
     try:
-        with open('data/materials.json', 'r', encoding='utf-8') as f:
-            materials = json.load(f)
+        material_db = get_material_db()
+        if material_db:
+            material = material_db.get_material(material_id, detail=True)
+            if material:
+                return jsonify(material)
+            return jsonify({"error": "找不到指定材料"}), 404
         
-        material = next((m for m in materials if m['id'] == material_id), None)
+        material = find_material_by_id(material_id)
         if material:
             return jsonify(material)
         else:
@@ -56,30 +140,122 @@ def get_material_by_id(material_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@listening_bp.route('/assessment', methods=['GET'])
-def get_assessment_questions():
-    """获取听力评估试题"""
+@listening_bp.route('/material/<material_id>/similar', methods=['GET'])
+def get_similar_materials(material_id):
+    """获取与指定材料内容最相似的材料（按原文和题目的TF-IDF余弦相似度排序），k为返回数量"""
     try:
-        # 从材料库中随机选择不同难度的试题组成评估
-        with open('data/materials.json', 'r', encoding='utf-8') as f:
-            materials = json.load(f)
-        
-        # 确保至少有4种难度的材料
-        difficulties = ["CET4", "CET6", "IELTS", "TOEFL"]
-        assessment_materials = []
-        
-        for difficulty in difficulties:
-            matching_materials = [m for m in materials if m['difficulty'] == difficulty]
-            if matching_materials:
-                assessment_materials.append(random.choice(matching_materials))
+        k = request.args.get('k', type=int)
+        k = min(max(k if k is not None else DEFAULT_SIMILAR_COUNT, 1), MAX_SIMILAR_COUNT)
+        similar = get_similarity_index().similar(material_id, k=k)
+        if similar is None:
+            return jsonify({"error": "找不到指定材料"}), 404
+
+        catalog = get_catalog()
+        materials = []
+        for similar_id, score in similar:
+            material = catalog.get(similar_id)
+            if material is not None:
+                materials.append({**material, "similarity": round(score, 4)})
+        return jsonify({"material_id": material_id, "materials": materials})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@listening_bp.route('/search', methods=['GET'])
+def search_materials():
+    """在听力原文段落和题目中进行全文检索（BM25排序）"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "缺少q参数"}), 400
         
-        # 如果没有足够的难度材料，则随机补充
-        while len(assessment_materials) < 4 and materials:
-            random_material = random.choice(materials)
-            if random_material not in assessment_materials:
-                assessment_materials.append(random_material)
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+        kind = request.args.get('type')
+        if kind and kind not in ('passage', 'question'):
+            return jsonify({"error": "type参数只能是passage或question"}), 400
         
-        return jsonify(assessment_materials)
+        total, results = get_search_index().search(query, limit=limit, kind=kind,
+                                                   material_id=request.args.get('material_id'))
+        return jsonify({"query": query, "total": total, "results": results})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@listening_bp.route('/assessment', methods=['GET'])
+def get_assessment_questions():
+    """
+    获取听力评估试题
+
+    每种难度抽取一份材料组成评估，不足时随机补充。查询参数均为可选：
+        seed: 随机种子，相同的种子得到相同的评估；未指定时随机生成，并通过X-Assessment-Seed响应头返回
+        count: 材料数量（默认4）
+        difficulties: 分层的难度列表，如CET4,CET6
+        sections: 每份材料各部分保留的题目数量，如A:2,B:1,C:1
+    """
+    try:
+        seed = request.args.get('seed', type=int)
+        if seed is None:
+            seed = random.getrandbits(32)
+        count = request.args.get('count', type=int)
+        count = min(max(count if count is not None else DEFAULT_ASSESSMENT_SIZE, 1), MAX_ASSESSMENT_SIZE)
+        difficulties = request.args.get('difficulties')
+        difficulties = ([item.strip() for item in difficulties.split(',') if item.strip()]
+                        if difficulties else DEFAULT_DIFFICULTIES)
+        try:
+            section_quotas = parse_section_quotas(request.args.get('sections'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # 从材料目录加载时构建的抽样池中分层抽取
+        assessment_materials = build_assessment(get_catalog(), seed, size=count, difficulties=difficulties,
+                                                section_quotas=section_quotas)
+        response = jsonify(assessment_materials)
+        response.headers['X-Assessment-Seed'] = str(seed)
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@listening_bp.route('/drill', methods=['GET', 'POST'])
+def get_drill_questions():
+    """
+    跨材料组成专项练习题
+
+    参数（GET查询参数或POST的JSON，均为可选）：
+        section: 部分，如A、B、C
+        difficulty: 难度，如CET6
+        topic: 话题
+        count: 题目数量（默认20）
+        seed: 随机种子，未指定时随机生成
+        exclude: 需要排除的题目，"材料ID:题目ID"或材料ID（排除整份材料）；GET时以逗号分隔
+
+    没有任何题目符合section/difficulty/topic条件时返回404。
+    """
+    try:
+        if request.method == 'POST':
+            params = request.get_json(silent=True) or {}
+            exclude = params.get('exclude') or []
+            if not isinstance(exclude, list):
+                return jsonify({"error": "exclude必须是列表"}), 400
+        else:
+            params = request.args
+            exclude = [item.strip() for item in (params.get('exclude') or '').split(',') if item.strip()]
+
+        try:
+            count = int(params.get('count') or DEFAULT_DRILL_SIZE)
+            seed = int(params['seed']) if params.get('seed') not in (None, '') else random.getrandbits(32)
+        except (TypeError, ValueError):
+            return jsonify({"error": "count和seed必须是整数"}), 400
+        count = min(max(count, 1), MAX_DRILL_SIZE)
+
+        table = get_question_table()
+        filters = {key: params.get(key) for key in ('section', 'difficulty', 'topic') if params.get(key)}
+        candidates = table.select(**filters)
+        if not len(candidates):
+            return jsonify({"error": "没有符合条件的题目", "filters": filters}), 404
+        rows = table.sample(candidates, count, seed, exclude=table.exclusion_rows(exclude))
+        return jsonify({
+            "seed": seed,
+            "total": int(len(candidates)),
+            "questions": build_drill(table, rows, get_catalog())
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -106,122 +282,124 @@ def evaluate_assessment():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def parse_feedback_request():
+    """
+    读取学习反馈请求中的材料ID和答题数据
+    
+    Returns:
+        tuple: (material_id, user_answers, 错误响应)，参数有误时前两项为None
+    """
+    data = request.json
+    
+    if not data:
+        log_debug("请求数据为空")
+        return None, None, (jsonify({"error": "请求数据为空"}), 400)
+        
+    log_debug(f"接收到的请求数据: {json.dumps(data, ensure_ascii=False)}")
+    
+    material_id = data.get('material_id')
+    user_answers = data.get('answers', [])
+    
+    if not material_id:
+        log_debug("缺少material_id参数")
+        return None, None, (jsonify({"error": "缺少material_id参数"}), 400)
+        
+    if not user_answers:
+        log_debug("缺少answers参数")
+        return None, None, (jsonify({"error": "缺少answers参数"}), 400)
+    
+    log_debug(f"处理material_id: {material_id}, 用户答案数量: {len(user_answers)}")
+    return material_id, user_answers, None
+
+def load_feedback_material(material_id, user_answers):
+    """
+    查找生成学习反馈所需的材料和听力原文
+    
+    Returns:
+        tuple: (材料，找不到时为根据答题数据构建的模拟材料, 听力原文或None)
+    """
+    # 定义难度级别映射
+    difficulty_map = {
+        'CET4': 'CET4',
+        'cet4': 'CET4',
+        'CET6': 'CET6', 
+        'cet6': 'CET6',
+        'IELTS': 'IELTS',
+        'ielts': 'IELTS', 
+        'TOEFL': 'TOEFL',
+        'toefl': 'TOEFL'
+    }
+    
+    # 从ID中提取难度级别前缀
+    difficulty_prefix = material_id.split('_')[0].lower()
+    difficulty = difficulty_map.get(difficulty_prefix, 'CET4')
+    log_debug(f"从material_id中提取的难度: {difficulty}")
+    
+    # 候选目录：难度目录优先，其次是与材料ID同名的真题目录
+    directories = [difficulty]
+    if material_id != difficulty:
+        directories.append(material_id)
+    
+    # 获取材料内容：优先查询SQLite材料库，否则按目录缓存查找
+    material_db = get_material_db()
+    material, material_source = None, None
+    if material_db:
+        material = material_db.get_material(material_id, detail=True)
+        material_source = 'SQLite材料库'
+    if not material:
+        material, material_dir = get_material_store().get(material_id, directories)
+        material_source = f"{material_dir}/materials.json"
+    if material:
+        log_debug(f"在{material_source}中找到了材料: {material_id}")
+    else:
+        # 如果在材料目录中找不到，从材料目录缓存中获取
+        material = find_material_by_id(material_id)
+        if material:
+            log_debug(f"在材料目录中找到了材料: {material_id}")
+    
+    # 如果仍然找不到材料，创建模拟材料
+    if not material:
+        log_debug(f"找不到指定材料: {material_id}，创建模拟材料")
+        material = {
+            "id": material_id,
+            "title": f"听力材料 ({material_id})",
+            "difficulty": difficulty,
+            "topic": ["一般话题"],
+            "questions": [{"question": q["question"], "answer": q["correct_answer"]} for q in user_answers]
+        }
+    
+    # 获取听力原文数据
+    transcript = material_db.get_transcript(material_id) if material_db else None
+    if not transcript:
+        transcript = get_transcript_store().get_transcript(material_id, directories)
+    if transcript:
+        log_debug(f"找到了听力原文: {material_id}")
+    else:
+        log_debug(f"未找到听力原文: {material_id}")
+    return material, transcript
+
+def mark_mock_feedback(feedback):
+    """备用数据生成的反馈加上is_mock_data标记和友好提示"""
+    if 'background' in feedback:
+        # 判断是否是备用数据
+        if any(keyword in feedback.get('background', '') for keyword in ['相关领域的发展趋势', '请多听此类材料']):
+            feedback['is_mock_data'] = True
+            feedback['background'] = "【系统提示：由于网络原因，本次反馈由系统自动生成，仅供参考】\n" + feedback['background']
+    return feedback
+
+def sse_event(event, data):
+    """编码一条server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @listening_bp.route('/feedback', methods=['POST'])
 def get_learning_feedback():
     """根据用户答题情况生成学习反馈"""
     try:
         log_debug("接收到获取学习反馈的请求")
-        data = request.json
-        
-        if not data:
-            log_debug("请求数据为空")
-            return jsonify({"error": "请求数据为空"}), 400
-            
-        log_debug(f"接收到的请求数据: {json.dumps(data, ensure_ascii=False)}")
-        
-        material_id = data.get('material_id')
-        user_answers = data.get('answers', [])
-        
-        if not material_id:
-            log_debug("缺少material_id参数")
-            return jsonify({"error": "缺少material_id参数"}), 400
-            
-        if not user_answers:
-            log_debug("缺少answers参数")
-            return jsonify({"error": "缺少answers参数"}), 400
-        
-        log_debug(f"处理material_id: {material_id}, 用户答案数量: {len(user_answers)}")
-        
-        # 定义难度级别映射
-        difficulty_map = {
-            'CET4': 'CET4',
-            'cet4': 'CET4',
-            'CET6': 'CET6', 
-            'cet6': 'CET6',
-            'IELTS': 'IELTS',
-            'ielts': 'IELTS', 
-            'TOEFL': 'TOEFL',
-            'toefl': 'TOEFL'
-        }
-        
-        # 从ID中提取难度级别前缀
-        difficulty_prefix = material_id.split('_')[0].lower()
-        difficulty = difficulty_map.get(difficulty_prefix, 'CET4')
-        log_debug(f"从material_id中提取的难度: {difficulty}")
-        
-        # 定义基础路径
-        base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-        materials_base_path = os.path.join(base_path, 'frontend', 'public', 'materials')
-        log_debug(f"材料基础路径: {materials_base_path}")
-        
-        # 获取材料内容
-        material = None
-        materials_path = os.path.join(materials_base_path, difficulty, 'materials.json')
-        log_debug(f"尝试从以下路径读取材料: {materials_path}")
-        
-        if os.path.exists(materials_path):
-            try:
-                with open(materials_path, 'r', encoding='utf-8') as f:
-                    materials_data = json.load(f)
-                if 'materials' in materials_data:
-                    material = next((m for m in materials_data['materials'] if m['id'] == material_id), None)
-                    if material:
-                        log_debug(f"在材料文件中找到了材料: {material_id}")
-                    else:
-                        log_debug(f"在材料文件中未找到材料: {material_id}")
-            except Exception as e:
-                log_debug(f"读取材料文件出错: {str(e)}")
-        else:
-            log_debug(f"材料文件不存在: {materials_path}")
-            
-        # 如果在指定难度文件中找不到，尝试从data/materials.json获取
-        if not material:
-            try:
-                materials_json_path = os.path.join(base_path, 'data', 'materials.json')
-                log_debug(f"尝试从以下路径读取材料: {materials_json_path}")
-                
-                if os.path.exists(materials_json_path):
-                    with open(materials_json_path, 'r', encoding='utf-8') as f:
-                        materials = json.load(f)
-                    material = next((m for m in materials if m['id'] == material_id), None)
-                    if material:
-                        log_debug(f"在data/materials.json中找到了材料: {material_id}")
-                else:
-                    log_debug(f"文件不存在: {materials_json_path}")
-            except Exception as e:
-                log_debug(f"从主材料文件读取失败: {str(e)}")
-        
-        # 如果仍然找不到材料，创建模拟材料
-        if not material:
-            log_debug(f"找不到指定材料: {material_id}，创建模拟材料")
-            material = {
-                "id": material_id,
-                "title": f"听力材料 ({material_id})",
-                "difficulty": difficulty,
-                "topic": ["一般话题"],
-                "questions": [{"question": q["question"], "answer": q["correct_answer"]} for q in user_answers]
-            }
-        
-        # 获取听力原文数据
-        transcript = None
-        transcripts_path = os.path.join(materials_base_path, difficulty, 'transcripts.json')
-        log_debug(f"尝试从以下路径读取听力原文: {transcripts_path}")
-        
-        if os.path.exists(transcripts_path):
-            try:
-                with open(transcripts_path, 'r', encoding='utf-8') as f:
-                    transcripts_data = json.load(f)
-                
-                if 'transcripts' in transcripts_data:
-                    transcript = next((t for t in transcripts_data['transcripts'] if t['id'] == material_id), None)
-                    if transcript:
-                        log_debug(f"找到了听力原文: {material_id}")
-                    else:
-                        log_debug(f"在transcripts.json中未找到原文: {material_id}")
-            except Exception as e:
-                log_debug(f"读取听力原文出错: {str(e)}")
-        else:
-            log_debug(f"听力原文文件不存在: {transcripts_path}")
+        material_id, user_answers, error = parse_feedback_request()
+        if error:
+            return error
+        material, transcript = load_feedback_material(material_id, user_answers)
         
         # 调用DeepSeek API生成学习反馈
         log_debug("调用DeepSeek API生成学习反馈")
@@ -237,19 +415,47 @@ def get_learning_feedback():
             log_debug("成功生成备用反馈")
             
         # 添加友好提示
-        if 'background' in feedback:
-            # 判断是否是备用数据
-            if any(keyword in feedback.get('background', '') for keyword in ['相关领域的发展趋势', '请多听此类材料']):
-                feedback['is_mock_data'] = True
-                feedback['background'] = "【系统提示：由于网络原因，本次反馈由系统自动生成，仅供参考】\n" + feedback['background']
-        
-        return jsonify(feedback)
+        return jsonify(mark_mock_feedback(feedback))
     except Exception as e:
         error_trace = traceback.format_exc()
         log_debug(f"获取学习反馈失败: {str(e)}")
         log_debug(f"错误堆栈: {error_trace}")
         return jsonify({"error": str(e)}), 500
 
+@listening_bp.route('/feedback/stream', methods=['POST'])
+def stream_learning_feedback_route():
+    """
+    以server-sent events流式返回学习反馈（请求参数与/feedback相同）
+    
+    vocabulary、expressions、background、structure各部分生成完毕即推送同名事件，每道错题的分析推送一个
+    mistake事件（{"question_id", "analysis"}），最后推送complete事件，数据为与/feedback相同的完整反馈；
+    出错时推送error事件。
+    """
+    try:
+        log_debug("接收到流式获取学习反馈的请求")
+        material_id, user_answers, error = parse_feedback_request()
+        if error:
+            return error
+        material, transcript = load_feedback_material(material_id, user_answers)
+    except Exception as e:
+        log_debug(f"获取学习反馈失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    
+    def generate():
+        try:
+            for event, data in stream_learning_feedback(material, user_answers, transcript):
+                if event == 'complete':
+                    data = mark_mock_feedback(data)
+                yield sse_event(event, data)
+        except Exception as e:
+            log_debug(f"流式生成学习反馈失败: {str(e)}")
+            log_debug(f"错误堆栈: {traceback.format_exc()}")
+            yield sse_event('error', {"error": str(e)})
+    
+    # 关闭反向代理的缓冲，每个事件立即送达客户端
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
 @listening_bp.route('/advanced/<current_level>', methods=['GET'])
 def get_advanced_materials(current_level):
     """获取进阶难度的听力材料"""
@@ -0,0 +1,176 @@
+"""
+听力评估抽样
+从材料目录加载时预先构建的抽样池（每种难度一个材料ID元组）中分层抽取评估材料：
+每种难度抽取一份，不足时从全部材料中补充；没有题目的材料不参与抽样。抽样使用稀疏的Fisher-Yates洗牌，
+只访问被抽中的位置，耗时与抽取数量成正比，语料很少时也不会反复重试。
+
+相同的随机种子和相同版本的材料目录总是得到相同的评估，便于复现。
+"""
+
+import random
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence
+
+from services.material_catalog import MaterialCatalog, MaterialIndex, normalize_difficulty
+
+# 默认的分层难度，每种难度抽取一份材料
+DEFAULT_DIFFICULTIES = ('CET4', 'CET6', 'IELTS', 'TOEFL')
+
+# 默认的评估材料数量及上限
+DEFAULT_ASSESSMENT_SIZE = 4
+MAX_ASSESSMENT_SIZE = 20
+
+
+def parse_section_quotas(value: Optional[str]) -> Optional[Dict[str, int]]:
+    """
+    解析部分(section)配额参数，如"A:2,B:1,C:1"
+
+    Returns:
+        dict: 规范化的部分标识 -> 每份材料保留的题目数量，未指定时返回None
+
+    Raises:
+        ValueError: 参数格式无效
+    """
+    if not value:
+        return None
+    quotas: Dict[str, int] = {}
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        section, separator, count = item.partition(':')
+        section = section.strip().upper()
+        if not separator or not section or not count.strip().isdigit():
+            raise ValueError(f"无效的sections参数: {value}，格式应为A:2,B:1")
+        quotas[section] = int(count)
+    return quotas or None
+
+
+def sample_ids(pool: Sequence[str], k: int, rng: random.Random, exclude: Collection[str] = (),
+               accept: Optional[Callable[[str], bool]] = None) -> List[str]:
+    """
+    从抽样池中不放回地抽取最多k个ID
+
+    使用稀疏的Fisher-Yates洗牌：只记录被交换过的位置，不复制抽样池。
+
+    Args:
+        pool: 抽样池
+        k: 抽取数量
+        rng: 随机数生成器
+        exclude: 需要跳过的ID（如已经被其他分层抽中的材料）
+        accept: 可选的筛选条件，返回False的ID会被跳过
+
+    Returns:
+        list: 抽中的ID，池中符合条件的ID不足k个时全部返回
+    """
+    n = len(pool)
+    swapped: Dict[int, int] = {}
+    results: List[str] = []
+    for i in range(n):
+        if len(results) >= k:
+            break
+        j = rng.randrange(i, n)
+        picked = swapped.get(j, j)
+        swapped[j] = swapped.get(i, i)
+        material_id = pool[picked]
+        if material_id in exclude or (accept is not None and not accept(material_id)):
+            continue
+        results.append(material_id)
+    return results
+
+
+def stratified_sample(index: MaterialIndex, rng: random.Random, size: int = DEFAULT_ASSESSMENT_SIZE,
+                      difficulties: Sequence[str] = DEFAULT_DIFFICULTIES,
+                      accept: Optional[Callable[[str], bool]] = None) -> List[str]:
+    """
+    分层抽样：每种难度抽取一份材料，不足size份时从全部材料中补充
+
+    Args:
+        index: 材料索引
+        rng: 随机数生成器
+        size: 评估材料数量
+        difficulties: 分层的难度列表
+        accept: 可选的筛选条件
+
+    Returns:
+        list: 材料ID列表，先按难度顺序排列，再是补充的材料
+    """
+    chosen: List[str] = []
+    for difficulty in difficulties:
+        if len(chosen) >= size:
+            break
+        pool = index.pools.get(normalize_difficulty(difficulty), ())
+        chosen.extend(sample_ids(pool, 1, rng, exclude=chosen, accept=accept))
+
+    if len(chosen) < size:
+        chosen.extend(sample_ids(index.all_ids, size - len(chosen), rng, exclude=set(chosen), accept=accept))
+    return chosen
+
+
+def has_questions(material: Dict[str, Any]) -> bool:
+    """材料摘要中的题目数量是否大于0"""
+    return bool(material.get('question_count'))
+
+
+def has_sections(material: Dict[str, Any], sections: Collection[str]) -> bool:
+    """材料摘要中是否包含所有指定部分的题目"""
+    section_counts = material.get('section_counts') or {}
+    return all(section_counts.get(section) for section in sections)
+
+
+def apply_section_quotas(material: Dict[str, Any], quotas: Dict[str, int], rng: random.Random) -> Dict[str, Any]:
+    """
+    按部分配额从材料中抽取题目，保持题目原有顺序
+
+    Args:
+        material: 完整材料
+        quotas: 部分标识 -> 保留的题目数量
+        rng: 随机数生成器
+
+    Returns:
+        dict: 只包含被抽中题目的材料副本
+    """
+    by_section: Dict[str, List[int]] = {}
+    questions = material.get('questions') or []
+    for position, question in enumerate(questions):
+        if isinstance(question, dict):
+            by_section.setdefault(str(question.get('section') or '').upper(), []).append(position)
+
+    kept = []
+    for section, count in quotas.items():
+        positions = by_section.get(section, [])
+        kept.extend(positions if count >= len(positions) else rng.sample(positions, count))
+    return {**material, "questions": [questions[position] for position in sorted(kept)]}
+
+
+def build_assessment(catalog: MaterialCatalog, seed: int, size: int = DEFAULT_ASSESSMENT_SIZE,
+                     difficulties: Sequence[str] = DEFAULT_DIFFICULTIES,
+                     section_quotas: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    """
+    生成一份听力评估
+
+    Args:
+        catalog: 材料目录
+        seed: 随机种子
+        size: 评估材料数量
+        difficulties: 分层的难度列表
+        section_quotas: 可选，每份材料各部分保留的题目数量；指定后只抽取包含这些部分的材料
+
+    Returns:
+        list: 完整的评估材料（包含题目）
+    """
+    rng = random.Random(seed)
+    index = catalog.index()
+    sections = [section for section, count in (section_quotas or {}).items() if count > 0]
+
+    def accept(material_id: str) -> bool:
+        material = index.get(material_id) or {}
+        return has_questions(material) and has_sections(material, sections)
+
+    materials = []
+    for material_id in stratified_sample(index, rng, size=size, difficulties=difficulties, accept=accept):
+        material = catalog.get_detail(material_id)
+        if material is None or not material.get('questions'):
+            continue
+        materials.append(apply_section_quotas(material, section_quotas, rng) if section_quotas else material)
+    return materials
+
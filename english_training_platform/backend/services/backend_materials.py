@@ -0,0 +1,221 @@
+"""
+后端材料存储
+通过接口添加/修改/删除的材料保存在data/materials.json中。每次修改只向变更日志
+（data/materials.changes.jsonl）追加一行记录，日志达到一定长度后再压缩合并回
+materials.json。压缩时先写临时文件再重命名，进程崩溃不会留下写了一半的文件。
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.file_utils import FileSignature, atomic_write_json, file_signature
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，只使用进程内锁
+    fcntl = None
+
+# 后端材料数据文件（相对于后端运行目录）
+BACKEND_MATERIALS_PATH = 'data/materials.json'
+
+# 变更日志超过该条数时自动压缩
+DEFAULT_COMPACT_THRESHOLD = 200
+
+
+class BackendMaterialStore:
+    """
+    基于变更日志的后端材料存储
+
+    日志中每行是一条幂等的操作：{"op": "put", "material": {...}} 或 {"op": "delete", "id": "..."}。
+    读取时先加载materials.json，再按顺序重放日志；最后一行如果因崩溃写了一半会被忽略。
+    """
+
+    def __init__(self, path: str = BACKEND_MATERIALS_PATH, log_path: Optional[str] = None,
+                 compact_threshold: int = DEFAULT_COMPACT_THRESHOLD):
+        self.path = path
+        self.log_path = log_path or f"{os.path.splitext(path)[0]}.changes.jsonl"
+        self.lock_path = f"{self.log_path}.lock"
+        self.compact_threshold = compact_threshold
+
+        self._lock = threading.RLock()
+        self._materials: Dict[str, Dict[str, Any]] = {}
+        self._signatures: Dict[str, FileSignature] = {}
+        self._log_entries = 0
+        # (材料字典, ID列表, ID -> 位置)，材料字典替换后重建，用于游标分页
+        self._order: Optional[Tuple[Dict[str, Dict[str, Any]], List[str], Dict[str, int]]] = None
+
+    def file_signatures(self) -> Dict[str, FileSignature]:
+        """获取当前内存数据对应的文件签名"""
+        return dict(self._signatures)
+
+    def _current_signatures(self) -> Dict[str, FileSignature]:
+        return {self.path: file_signature(self.path), self.log_path: file_signature(self.log_path)}
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的文件锁（多个gunicorn worker同时写入时使用）"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def materials(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取所有后端材料
+
+        Returns:
+            dict: 材料ID -> 材料（按添加顺序，共享对象，调用方不应修改）
+        """
+        with self._lock:
+            if self._current_signatures() != self._signatures:
+                self._load()
+            return self._materials
+
+    def page(self, after_id: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        按添加顺序分页获取材料
+
+        Args:
+            after_id: 游标，从该ID之后开始；为None时从第一条开始
+            limit: 返回数量上限（可选）
+
+        Returns:
+            list: 材料列表，after_id不存在时返回空列表
+        """
+        materials = self.materials()
+        order = self._order
+        if order is None or order[0] is not materials:
+            ids = list(materials)
+            order = (materials, ids, {material_id: position for position, material_id in enumerate(ids)})
+            self._order = order
+        _, ids, positions = order
+
+        start = 0
+        if after_id is not None:
+            if after_id not in positions:
+                return []
+            start = positions[after_id] + 1
+        end = len(ids) if limit is None else start + limit
+        return [materials[material_id] for material_id in ids[start:end]]
+
+    def _load(self):
+        """加载materials.json并重放变更日志"""
+        # 先记录签名再读取：读取期间文件若有变化，下次访问时会重新加载
+        signatures = self._current_signatures()
+        materials: Dict[str, Dict[str, Any]] = {}
+
+        if signatures[self.path] is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    base = json.load(f)
+                for material in base or []:
+                    if isinstance(material, dict) and 'id' in material:
+                        materials.setdefault(material['id'], material)
+            except Exception as e:
+                print(f"读取后端材料文件失败: {self.path}, 错误: {str(e)}")
+
+        log_entries = 0
+        if signatures[self.log_path] is not None:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 崩溃时未写完的最后一行
+                        print(f"跳过无效的变更日志记录: {line[:100]}")
+                        continue
+                    try:
+                        self._apply(materials, entry)
+                    except ValueError as e:
+                        # 旧版本可能写入过缺少ID的记录，跳过而不是让整个仓库无法加载
+                        print(f"跳过无效的变更日志记录: {str(e)}")
+                        continue
+                    log_entries += 1
+
+        self._materials = materials
+        self._signatures = signatures
+        self._log_entries = log_entries
+
+    @staticmethod
+    def _apply(materials: Dict[str, Dict[str, Any]], entry: Dict[str, Any]):
+        """在材料字典上应用一条日志记录；记录缺少材料ID时抛出ValueError"""
+        if entry.get('op') == 'put':
+            material = entry.get('material')
+            if not isinstance(material, dict) or not material.get('id'):
+                raise ValueError('put记录缺少材料ID')
+            materials[material['id']] = material
+        elif entry.get('op') == 'delete':
+            if not entry.get('id'):
+                raise ValueError('delete记录缺少材料ID')
+            materials.pop(entry['id'], None)
+
+    def _append(self, entry: Dict[str, Any]):
+        """追加一条日志记录并应用到内存"""
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            with self._file_lock():
+                # 持有文件锁期间其他进程无法写入；先同步其他进程已追加的记录
+                if self._current_signatures() != self._signatures:
+                    self._load()
+
+                # 写时复制，正在遍历旧字典的读取方不受影响；先在副本上应用，无效的记录不会写入日志
+                materials = dict(self._materials)
+                self._apply(materials, entry)
+
+                os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                self._materials = materials
+                self._log_entries += 1
+                self._signatures = self._current_signatures()
+
+            if self._log_entries >= self.compact_threshold:
+                self.compact()
+
+    def put(self, material: Dict[str, Any]):
+        """新增或整体替换一个材料"""
+        self._append({"op": "put", "material": material})
+
+    def delete(self, material_id: str):
+        """删除一个材料"""
+        self._append({"op": "delete", "id": material_id})
+
+    def compact(self):
+        """将变更日志合并回materials.json，然后清空日志"""
+        with self._lock, self._file_lock():
+            # 在文件锁内重新加载，包含其他进程刚追加的记录
+            self._load()
+            atomic_write_json(self.path, list(self._materials.values()), indent=2)
+            # 如果在这里崩溃，日志会在新的materials.json上重放一遍，操作是幂等的
+            with open(self.log_path, 'w', encoding='utf-8') as f:
+                f.flush()
+                os.fsync(f.fileno())
+            self._log_entries = 0
+            self._signatures = self._current_signatures()
+            print(f"后端材料变更日志已压缩，共{len(self._materials)}个材料")
+
+
+_backend_store: Optional[BackendMaterialStore] = None
+_backend_store_lock = threading.Lock()
+
+
+def get_backend_store() -> BackendMaterialStore:
+    """获取进程内共享的后端材料存储"""
+    global _backend_store
+    if _backend_store is None:
+        with _backend_store_lock:
+            if _backend_store is None:
+                _backend_store = BackendMaterialStore()
+    return _backend_store
@@ -4,14 +4,19 @@ DeepSeek API集成模块
 """
 
 # 导入子模块中的所有函数
-from .deepseek.api_client import call_deepseek_api, generate_mock_response
+from .deepseek.api_client import acall_deepseek_api, call_deepseek_api, generate_mock_response, stream_deepseek_api
 from .deepseek.listening_assessment import (
+    aevaluate_listening_level,
+    agenerate_learning_feedback,
     evaluate_listening_level,
     generate_learning_feedback,
     generate_mock_feedback,
-    log_debug
+    log_debug,
+    stream_learning_feedback
 )
 from .deepseek.speaking_tasks import (
+    aevaluate_speaking,
+    agenerate_speaking_tasks,
     generate_speaking_tasks,
     evaluate_speaking,
     generate_default_speaking_tasks
@@ -19,11 +24,18 @@ from .deepseek.speaking_tasks import (
 
 # 提供向后兼容性，这样其他模块导入时不需要修改
 __all__ = [
+    'acall_deepseek_api',
     'call_deepseek_api',
     'generate_mock_response',
+    'stream_deepseek_api',
+    'aevaluate_listening_level',
+    'agenerate_learning_feedback',
     'evaluate_listening_level',
     'generate_learning_feedback',
     'generate_mock_feedback',
+    'stream_learning_feedback',
+    'agenerate_speaking_tasks',
+    'aevaluate_speaking',
     'generate_speaking_tasks',
     'evaluate_speaking',
     'generate_default_speaking_tasks',
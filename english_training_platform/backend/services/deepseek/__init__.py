@@ -2,6 +2,19 @@
 将DeepSeek API客户端和各功能模块导出，使其可以从主模块导入。
 """
 
-from .api_client import call_deepseek_api, generate_mock_response
-from .listening_assessment import evaluate_listening_level, generate_learning_feedback, generate_mock_feedback
-from .speaking_tasks import generate_speaking_tasks, evaluate_speaking, generate_default_speaking_tasks 
\ No newline at end of file
+from .api_client import acall_deepseek_api, call_deepseek_api, generate_mock_response, stream_deepseek_api
+from .listening_assessment import (
+    aevaluate_listening_level,
+    agenerate_learning_feedback,
+    evaluate_listening_level,
+    generate_learning_feedback,
+    generate_mock_feedback,
+    stream_learning_feedback,
+)
+from .speaking_tasks import (
+    aevaluate_speaking,
+    agenerate_speaking_tasks,
+    evaluate_speaking,
+    generate_default_speaking_tasks,
+    generate_speaking_tasks,
+) 
\ No newline at end of file
@@ -1,24 +1,29 @@
+import asyncio
 import os
 import json
-import requests
 import time
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+
+from .http_client import REQUEST_ERRORS, TIMEOUT_ERRORS, get_async_http_client, get_http_client
+from .response_cache import ResponseCache, cache_key, get_response_cache
+from .retry_policy import CircuitBreaker, RetryPolicy, get_circuit_breaker, get_retry_policy, retry_after_seconds
+from .single_flight import get_single_flight, get_worker_lock
 
 # 这里假设DeepSeek API密钥存储在环境变量中
 # 在实际部署时应该从环境变量或配置文件中获取
 DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY', 'sk-fe2a5d1ec6bc40abaa01867fba5a2c18')
-DEEPSEEK_API_ENDPOINT = "https://api.deepseek.com/v1/chat/completions"  # 假设的API端点
 
-def call_deepseek_api(prompt: str, system_prompt: Optional[str] = None) -> Dict[str, Any]:
+# API地址、连接池和超时设置见http_client；重试次数、时间预算、退避和熔断设置见retry_policy
+
+# 标记模拟响应的字段：上游不可用时返回的模拟响应带有此标记，调用方据此判断不必再重试
+FALLBACK_KEY = "fallback"
+
+def build_request(prompt: str, system_prompt: Optional[str] = None) -> Tuple[Dict[str, str], Dict[str, Any]]:
     """
-    调用DeepSeek API
+    构建DeepSeek API请求
     
-    Args:
-        prompt (str): 向DeepSeek发送的提示词
-        system_prompt (str, optional): 系统提示词
-        
     Returns:
-        dict: DeepSeek API的响应
+        tuple: (请求头, 请求体)
     """
     headers = {
         "Content-Type": "application/json",
@@ -36,91 +41,379 @@ def call_deepseek_api(prompt: str, system_prompt: Optional[str] = None) -> Dict[
         "max_tokens": 2000,
         "temperature": 0.7
     }
+    return headers, data
+
+def check_response(response, retry: int, max_retries: int) -> Optional[Dict[str, Any]]:
+    """
+    检查一次API响应
+    
+    Returns:
+        dict: 解析后的响应；响应不可用（需要重试）时返回None
+    """
+    # 检查HTTP状态码
+    if response.status_code != 200:
+        print(f"DeepSeek API返回非200状态码: {response.status_code}, 响应: {response.text[:200]}")
+        return None
+    
+    # 检查响应内容是否为空
+    if not response.text.strip():
+        print(f"收到空响应 (尝试 {retry+1}/{max_retries})")
+        return None
+    
+    # 尝试解析JSON
+    try:
+        result = response.json()
+    except json.JSONDecodeError as e:
+        print(f"解析JSON失败 (尝试 {retry+1}/{max_retries}): {str(e)}")
+        return None
+    
+    # 验证响应格式是否正确
+    if not result or "choices" not in result or not result["choices"]:
+        print(f"响应格式不符合预期 (尝试 {retry+1}/{max_retries})")
+        return None
+    return result
+
+def handle_response(response, retry: int, policy: RetryPolicy, breaker: CircuitBreaker) -> Tuple[Optional[Dict[str, Any]], bool, Optional[float]]:
+    """
+    处理一次API响应并更新熔断器
+    
+    Returns:
+        tuple: (解析后的响应, 是否值得重试, 上游要求的等待秒数)；成功时响应不为None
+    """
+    result = check_response(response, retry, policy.max_attempts)
+    if result is not None:
+        breaker.record_success()
+        return result, False, None
+    if response.status_code != 200 and not policy.is_retryable_status(response.status_code):
+        # 请求本身有问题（参数错误、认证失败等），重试也不会成功；上游是可达的，不计入熔断
+        print(f"状态码{response.status_code}不可重试")
+        breaker.record_success()
+        return None, False, None
+    breaker.record_failure()
+    return None, True, retry_after_seconds(response)
+
+def next_delay(retry: int, policy: RetryPolicy, deadline: float, retry_after: Optional[float]) -> Optional[float]:
+    """
+    第retry次尝试失败后的等待时间
+    
+    Returns:
+        float: 等待秒数；已用完尝试次数或剩余时间预算不够再等待一次时返回None
+    """
+    if retry >= policy.max_attempts - 1:
+        return None
+    delay = policy.backoff(retry, retry_after)
+    if delay >= policy.remaining(deadline):
+        print("剩余时间预算不足，不再重试")
+        return None
+    return delay
+
+def fallback_response(prompt: str) -> Dict[str, Any]:
+    """上游不可用时返回的模拟响应（带有FALLBACK_KEY标记，不缓存）"""
+    response = generate_mock_response(prompt)
+    response[FALLBACK_KEY] = True
+    return response
+
+def is_fallback_response(response: Dict[str, Any]) -> bool:
+    """响应是否为上游不可用时返回的模拟响应"""
+    return bool(response.get(FALLBACK_KEY))
+
+def lookup_cache(data: Dict[str, Any], prompt: str, system_prompt: Optional[str], cache_ttl: Optional[float],
+                 refresh: bool = False) -> Tuple[Optional[ResponseCache], Optional[str], Optional[Dict[str, Any]]]:
+    """
+    查询响应缓存
     
-    # 设置最大重试次数和超时时间
-    max_retries = 3
-    timeout_seconds = 180  # 增加到180秒
-    retry_delay = 3  # 每次重试前等待的秒数
+    Returns:
+        tuple: (缓存, 缓存键, 命中的响应)；cache_ttl为0或缓存关闭时缓存为None，refresh为True时不查询（命中的响应为None）。
+            缓存键总是计算，合并相同的请求时也用它作为键
+    """
+    key = cache_key(data["model"], system_prompt, prompt, data["temperature"])
+    cache = get_response_cache() if cache_ttl != 0 else None
+    if cache is None:
+        return None, key, None
+    if refresh:
+        return cache, key, None
+    cached = cache.get(key)
+    if cached is not None:
+        print(f"命中DeepSeek响应缓存: {prompt[:100]}...")
+    return cache, key, cached
+
+def store_cache(cache: Optional[ResponseCache], key: Optional[str], result: Dict[str, Any], cache_ttl: Optional[float]):
+    """缓存成功的响应（内容为空的响应不缓存，调用方重试时不会反复拿到它）"""
+    if cache is None:
+        return
+    content = result["choices"][0].get("message", {}).get("content")
+    if isinstance(content, str) and content.strip():
+        cache.put(key, result, cache_ttl)
+
+def request_deepseek(prompt: str, headers: Dict[str, str], data: Dict[str, Any], cache: Optional[ResponseCache],
+                     key: str, cache_ttl: Optional[float]) -> Dict[str, Any]:
+    """
+    按重试策略请求上游（不查询缓存），成功的响应写入缓存
     
-    for retry in range(max_retries):
+    重试遵循retry_policy：所有尝试和等待共用一个时间预算，每次尝试的超时不超过剩余预算；
+    熔断期间不请求上游，直接返回模拟响应。
+    """
+    policy = get_retry_policy()
+    breaker = get_circuit_breaker()
+    deadline = policy.start()
+    for retry in range(policy.max_attempts):
+        if not breaker.allow_request():
+            print("DeepSeek API熔断中，直接返回模拟响应")
+            break
+        
+        retryable, retry_after = True, None
         try:
-            print(f"发送请求到DeepSeek API: {prompt[:100]}... (尝试 {retry+1}/{max_retries})")
-            response = requests.post(DEEPSEEK_API_ENDPOINT, headers=headers, json=data, timeout=timeout_seconds)
-            
-            # 检查HTTP状态码
-            if response.status_code != 200:
-                print(f"DeepSeek API返回非200状态码: {response.status_code}, 响应: {response.text[:200]}")
-                if retry < max_retries - 1:
-                    print(f"等待 {retry_delay} 秒后重试...")
-                    time.sleep(retry_delay)
-                    continue
-                else:
-                    print("所有重试均失败，返回模拟响应")
-                    return generate_mock_response(prompt)
-            
-            # 检查响应内容是否为空
-            if not response.text.strip():
-                print(f"收到空响应 (尝试 {retry+1}/{max_retries})")
-                if retry < max_retries - 1:
-                    print(f"等待 {retry_delay} 秒后重试...")
-                    time.sleep(retry_delay)
-                    continue
-                else:
-                    print("所有重试均失败，返回模拟响应")
-                    return generate_mock_response(prompt)
-            
-            # 尝试解析JSON
-            try:
-                result = response.json()
-                # 验证响应格式是否正确
-                if not result or "choices" not in result or not result["choices"]:
-                    print(f"响应格式不符合预期 (尝试 {retry+1}/{max_retries})")
-                    if retry < max_retries - 1:
-                        print(f"等待 {retry_delay} 秒后重试...")
-                        time.sleep(retry_delay)
-                        continue
-                    else:
-                        return generate_mock_response(prompt)
+            print(f"发送请求到DeepSeek API: {prompt[:100]}... (尝试 {retry+1}/{policy.max_attempts})")
+            # 使用进程内共享的长连接池，避免每次调用都重新建立连接
+            response = get_http_client().post(data, headers=headers, timeout=policy.remaining(deadline))
+            result, retryable, retry_after = handle_response(response, retry, policy, breaker)
+            if result is not None:
+                store_cache(cache, key, result, cache_ttl)
                 return result
-            except json.JSONDecodeError as e:
-                print(f"解析JSON失败 (尝试 {retry+1}/{max_retries}): {str(e)}")
-                if retry < max_retries - 1:
-                    print(f"等待 {retry_delay} 秒后重试...")
-                    time.sleep(retry_delay)
-                    continue
+        except TIMEOUT_ERRORS as e:
+            print(f"请求超时 (尝试 {retry+1}/{policy.max_attempts}): {str(e)}")
+            breaker.record_failure()
+        except REQUEST_ERRORS as e:
+            print(f"请求异常 (尝试 {retry+1}/{policy.max_attempts}): {str(e)}")
+            breaker.record_failure()
+        except Exception as e:
+            print(f"未知错误 (尝试 {retry+1}/{policy.max_attempts}): {str(e)}")
+            breaker.record_failure()
+        except BaseException:
+            # 调用被取消，没有得到结果，不能让熔断器一直等待这次探测
+            breaker.release_probe()
+            raise
+        
+        delay = next_delay(retry, policy, deadline, retry_after) if retryable else None
+        if delay is None:
+            break
+        print(f"等待 {delay:.2f} 秒后重试...")
+        time.sleep(delay)
+    
+    # 上游不可用时返回模拟响应
+    print("DeepSeek API调用失败，返回模拟响应")
+    return fallback_response(prompt)
+
+async def arequest_deepseek(prompt: str, headers: Dict[str, str], data: Dict[str, Any], cache: Optional[ResponseCache],
+                            key: str, cache_ttl: Optional[float]) -> Dict[str, Any]:
+    """request_deepseek的异步版本，等待响应和重试间隔时不占用线程"""
+    policy = get_retry_policy()
+    breaker = get_circuit_breaker()
+    deadline = policy.start()
+    for retry in range(policy.max_attempts):
+        if not breaker.allow_request():
+            print("DeepSeek API熔断中，直接返回模拟响应")
+            break
+        
+        retryable, retry_after = True, None
+        try:
+            print(f"发送异步请求到DeepSeek API: {prompt[:100]}... (尝试 {retry+1}/{policy.max_attempts})")
+            response = await get_async_http_client().post(data, headers=headers, timeout=policy.remaining(deadline))
+            result, retryable, retry_after = handle_response(response, retry, policy, breaker)
+            if result is not None:
+                store_cache(cache, key, result, cache_ttl)
+                return result
+        except TIMEOUT_ERRORS as e:
+            print(f"请求超时 (尝试 {retry+1}/{policy.max_attempts}): {str(e)}")
+            breaker.record_failure()
+        except REQUEST_ERRORS as e:
+            print(f"请求异常 (尝试 {retry+1}/{policy.max_attempts}): {str(e)}")
+            breaker.record_failure()
+        except Exception as e:
+            print(f"未知错误 (尝试 {retry+1}/{policy.max_attempts}): {str(e)}")
+            breaker.record_failure()
+        except BaseException:
+            # 调用被取消，没有得到结果，不能让熔断器一直等待这次探测
+            breaker.release_probe()
+            raise
+        
+        delay = next_delay(retry, policy, deadline, retry_after) if retryable else None
+        if delay is None:
+            break
+        print(f"等待 {delay:.2f} 秒后重试...")
+        await asyncio.sleep(delay)
+    
+    print("DeepSeek API调用失败，返回模拟响应")
+    return fallback_response(prompt)
+
+def request_across_workers(prompt: str, headers: Dict[str, str], data: Dict[str, Any], cache: Optional[ResponseCache],
+                           key: str, cache_ttl: Optional[float]) -> Dict[str, Any]:
+    """
+    请求上游；开启跨worker合并时先获取键对应的文件锁
+    
+    等待过其他worker说明它刚完成了相同的请求，先从共享的响应缓存中读取。
+    """
+    lock = get_worker_lock() if cache is not None else None
+    if lock is None:
+        return request_deepseek(prompt, headers, data, cache, key, cache_ttl)
+    with lock.hold(key, get_retry_policy().deadline) as waited:
+        cached = cache.get(key) if waited else None
+        if cached is not None:
+            print(f"其他worker已完成相同的请求，使用缓存的响应: {prompt[:100]}...")
+            return cached
+        return request_deepseek(prompt, headers, data, cache, key, cache_ttl)
+
+async def arequest_across_workers(prompt: str, headers: Dict[str, str], data: Dict[str, Any], cache: Optional[ResponseCache],
+                                  key: str, cache_ttl: Optional[float]) -> Dict[str, Any]:
+    """request_across_workers的异步版本"""
+    lock = get_worker_lock() if cache is not None else None
+    if lock is None:
+        return await arequest_deepseek(prompt, headers, data, cache, key, cache_ttl)
+    async with lock.ahold(key, get_retry_policy().deadline) as waited:
+        cached = cache.get(key) if waited else None
+        if cached is not None:
+            print(f"其他worker已完成相同的请求，使用缓存的响应: {prompt[:100]}...")
+            return cached
+        return await arequest_deepseek(prompt, headers, data, cache, key, cache_ttl)
+
+def call_deepseek_api(prompt: str, system_prompt: Optional[str] = None, cache_ttl: Optional[float] = None,
+                      refresh: bool = False) -> Dict[str, Any]:
+    """
+    调用DeepSeek API
+    
+    依次查询响应缓存、合并进行中的相同请求（见single_flight），最后按retry_policy请求上游。
+    
+    Args:
+        prompt (str): 向DeepSeek发送的提示词
+        system_prompt (str, optional): 系统提示词
+        cache_ttl (float, optional): 响应缓存的有效期（秒），默认使用缓存的默认TTL，为0时不使用缓存
+        refresh (bool): 为True时不读取缓存（调用方无法解析缓存的响应时使用），新的响应仍然写入缓存
+        
+    Returns:
+        dict: DeepSeek API的响应；上游不可用时返回模拟响应（带有FALLBACK_KEY标记，不缓存）
+    """
+    headers, data = build_request(prompt, system_prompt)
+    cache, key, cached = lookup_cache(data, prompt, system_prompt, cache_ttl, refresh)
+    if cached is not None:
+        return cached
+    
+    flight = get_single_flight()
+    if flight is None or refresh or cache_ttl == 0:
+        # 调用方需要新生成的响应，不与其他调用合并
+        return request_deepseek(prompt, headers, data, cache, key, cache_ttl)
+    return flight.do(key, lambda: request_across_workers(prompt, headers, data, cache, key, cache_ttl))
+
+async def acall_deepseek_api(prompt: str, system_prompt: Optional[str] = None, cache_ttl: Optional[float] = None,
+                             refresh: bool = False) -> Dict[str, Any]:
+    """
+    调用DeepSeek API（异步版本）
+    
+    等待响应和重试间隔时不占用线程，同一进程可以同时进行大量调用。参数、返回值和处理流程与call_deepseek_api相同，
+    同步和异步的相同请求也会合并。
+    """
+    headers, data = build_request(prompt, system_prompt)
+    cache, key, cached = lookup_cache(data, prompt, system_prompt, cache_ttl, refresh)
+    if cached is not None:
+        return cached
+    
+    flight = get_single_flight()
+    if flight is None or refresh or cache_ttl == 0:
+        return await arequest_deepseek(prompt, headers, data, cache, key, cache_ttl)
+    return await flight.ado(key, lambda: arequest_across_workers(prompt, headers, data, cache, key, cache_ttl))
+
+def response_content(response: Dict[str, Any]) -> str:
+    """响应中模型生成的文本"""
+    return response["choices"][0].get("message", {}).get("content") or ""
+
+def iter_stream_content(lines: Iterator[str]) -> Iterator[str]:
+    """
+    解析流式响应（server-sent events），逐段产出模型生成的文本
+    
+    忽略空行、注释行（如": keep-alive"）和无法解析的数据行，收到"data: [DONE]"时结束。
+    """
+    for line in lines:
+        if not line or not line.startswith('data:'):
+            continue
+        payload = line[5:].strip()
+        if payload == '[DONE]':
+            return
+        try:
+            chunk = json.loads(payload)
+        except json.JSONDecodeError:
+            continue
+        choices = chunk.get("choices") or []
+        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+        if delta:
+            yield delta
+
+def stream_deepseek_api(prompt: str, system_prompt: Optional[str] = None, cache_ttl: Optional[float] = None) -> Iterator[str]:
+    """
+    以流式方式调用DeepSeek API，模型每生成一段文本就产出一段
+    
+    缓存命中或上游不可用（模拟响应）时一次产出全部内容。重试遵循retry_policy，但只发生在收到第一段内容之前；
+    开始产出之后连接中断时直接结束，调用方按不完整的内容处理。完整的内容按普通响应的格式写入缓存，
+    与call_deepseek_api共用。
+    
+    Args:
+        prompt (str): 向DeepSeek发送的提示词
+        system_prompt (str, optional): 系统提示词
+        cache_ttl (float, optional): 响应缓存的有效期（秒），含义与call_deepseek_api相同
+        
+    Yields:
+        str: 模型生成的文本片段
+    """
+    headers, data = build_request(prompt, system_prompt)
+    cache, key, cached = lookup_cache(data, prompt, system_prompt, cache_ttl)
+    if cached is not None:
+        yield response_content(cached)
+        return
+    data["stream"] = True
+    
+    policy = get_retry_policy()
+    breaker = get_circuit_breaker()
+    deadline = policy.start()
+    for retry in range(policy.max_attempts):
+        if not breaker.allow_request():
+            print("DeepSeek API熔断中，直接返回模拟响应")
+            break
+        
+        retryable, retry_after = True, None
+        parts: List[str] = []
+        try:
+            print(f"发送流式请求到DeepSeek API: {prompt[:100]}... (尝试 {retry+1}/{policy.max_attempts})")
+            with get_http_client().stream(data, headers=headers, timeout=policy.remaining(deadline)) as (response, lines):
+                if response.status_code != 200:
+                    _, retryable, retry_after = handle_response(response, retry, policy, breaker)
                 else:
-                    return generate_mock_response(prompt)
-                    
-        except requests.exceptions.Timeout as e:
-            print(f"请求超时 (尝试 {retry+1}/{max_retries}): {str(e)}")
-            if retry < max_retries - 1:
-                print(f"等待 {retry_delay} 秒后重试...")
-                time.sleep(retry_delay)
-                continue
-            else:
-                print("所有重试均已失败，返回模拟响应")
-                return generate_mock_response(prompt)
-                
-        except requests.RequestException as e:
-            print(f"请求异常 (尝试 {retry+1}/{max_retries}): {str(e)}")
-            if retry < max_retries - 1:
-                print(f"等待 {retry_delay} 秒后重试...")
-                time.sleep(retry_delay)
-                continue
-            else:
-                return generate_mock_response(prompt)
-                
+                    for delta in iter_stream_content(lines):
+                        parts.append(delta)
+                        yield delta
+                    if parts:
+                        breaker.record_success()
+                        store_cache(cache, key, {"choices": [{"message": {"role": "assistant", "content": "".join(parts)}}]},
+                                    cache_ttl)
+                        return
+                    print(f"收到空的流式响应 (尝试 {retry+1}/{policy.max_attempts})")
+                    breaker.record_failure()
+        except TIMEOUT_ERRORS as e:
+            print(f"请求超时 (尝试 {retry+1}/{policy.max_attempts}): {str(e)}")
+            breaker.record_failure()
+        except REQUEST_ERRORS as e:
+            print(f"请求异常 (尝试 {retry+1}/{policy.max_attempts}): {str(e)}")
+            breaker.record_failure()
         except Exception as e:
-            print(f"未知错误 (尝试 {retry+1}/{max_retries}): {str(e)}")
-            if retry < max_retries - 1:
-                print(f"等待 {retry_delay} 秒后重试...")
-                time.sleep(retry_delay)
-                continue
+            print(f"未知错误 (尝试 {retry+1}/{policy.max_attempts}): {str(e)}")
+            breaker.record_failure()
+        except BaseException:
+            # 客户端断开（GeneratorExit）：已经收到内容说明上游可用，否则不计入成功或失败
+            if parts:
+                breaker.record_success()
             else:
-                return generate_mock_response(prompt)
+                breaker.release_probe()
+            raise
+        
+        if parts:
+            # 已经产出的内容无法撤回，不再重试
+            print("流式响应中断，已产出部分内容")
+            return
+        delay = next_delay(retry, policy, deadline, retry_after) if retryable else None
+        if delay is None:
+            break
+        print(f"等待 {delay:.2f} 秒后重试...")
+        time.sleep(delay)
     
-    # 如果所有重试都失败，返回模拟响应
-    return generate_mock_response(prompt)
+    print("DeepSeek API调用失败，返回模拟响应")
+    yield response_content(fallback_response(prompt))
 
 def generate_mock_response(prompt: str) -> Dict[str, Any]:
     """生成模拟响应（用于开发测试）"""
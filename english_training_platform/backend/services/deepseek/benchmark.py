@@ -0,0 +1,160 @@
+"""
+DeepSeek HTTP客户端的基准测试
+在本地启动一个模拟chat/completions接口的服务，分别用每次调用新建连接的requests.post
+和共享的长连接池发送相同数量的请求，比较每次调用的额外开销和新建连接的数量。
+提供证书和私钥时使用HTTPS，此时每个新连接还需要一次TLS握手，差距更接近线上情况。
+
+用法：
+    python -m services.deepseek.benchmark
+    python -m services.deepseek.benchmark --calls 500 --concurrency 8
+    python -m services.deepseek.benchmark --tls-cert cert.pem --tls-key key.pem
+"""
+
+import argparse
+import json
+import socket
+import ssl
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+from .http_client import DeepSeekHTTPClient
+
+STUB_RESPONSE = json.dumps({
+    "choices": [{"message": {"role": "assistant", "content": json.dumps({"response": "ok"})}}]
+}).encode('utf-8')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """返回固定响应的chat/completions接口，支持HTTP/1.1长连接"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # 响应头和响应体分两次写入，关闭Nagle算法，避免长连接上与延迟确认叠加出40ms的等待
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(STUB_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(STUB_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """模拟服务，加大监听队列以承受大量并发连接"""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def start_stub_server(tls_cert: Optional[str] = None, tls_key: Optional[str] = None) -> ThreadingHTTPServer:
+    """在随机端口上启动模拟服务（后台线程）"""
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+    server.connections = 0
+    server.stats_lock = threading.Lock()
+    if tls_cert:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(tls_cert, tls_key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_calls(call: Callable[[], object], calls: int, concurrency: int) -> List[float]:
+    """并发执行calls次调用，返回每次调用的耗时（毫秒）"""
+    def timed(_):
+        start = time.perf_counter()
+        call()
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(timed, range(calls)))
+
+
+def summarize(latencies: List[float], elapsed: float, connections: int) -> Dict[str, float]:
+    """汇总耗时分布"""
+    ordered = sorted(latencies)
+    return {
+        "mean_ms": statistics.mean(ordered),
+        "p50_ms": ordered[len(ordered) // 2],
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "calls_per_second": len(ordered) / elapsed,
+        "connections": connections
+    }
+
+
+def benchmark(calls: int = 200, concurrency: int = 4, tls_cert: Optional[str] = None,
+              tls_key: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    分别测量每次新建连接和使用连接池的调用开销
+
+    Returns:
+        dict: {"per_call": 汇总, "pooled": 汇总}
+    """
+    server = start_stub_server(tls_cert, tls_key)
+    scheme = 'https' if tls_cert else 'http'
+    endpoint = f"{scheme}://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    payload = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "ping"}]}
+    headers = {"Content-Type": "application/json", "Authorization": "Bearer benchmark"}
+    # 自签名证书不做校验
+    verify = False if tls_cert else True
+    if tls_cert:
+        requests.packages.urllib3.disable_warnings()
+
+    def per_call():
+        requests.post(endpoint, headers=headers, json=payload, timeout=(10, 180), verify=verify).json()
+
+    client = DeepSeekHTTPClient(endpoint=endpoint, pool_size=concurrency, http2=False, verify=verify)
+
+    def pooled():
+        client.post(payload, headers=headers).json()
+
+    results = {}
+    try:
+        for name, call in (("per_call", per_call), ("pooled", pooled)):
+            # 预热，排除导入和首次解析的开销
+            call()
+            server.connections = 0
+            start = time.perf_counter()
+            latencies = run_calls(call, calls, concurrency)
+            results[name] = summarize(latencies, time.perf_counter() - start, server.connections)
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较DeepSeek HTTP客户端每次调用的连接开销')
+    parser.add_argument('--calls', type=int, default=200, help='每种方式的调用次数')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发线程数（同时作为连接池大小）')
+    parser.add_argument('--tls-cert', default=None, help='模拟服务使用的证书，提供时使用HTTPS')
+    parser.add_argument('--tls-key', default=None, help='证书对应的私钥')
+    args = parser.parse_args()
+
+    results = benchmark(args.calls, args.concurrency, args.tls_cert, args.tls_key)
+    print(f"{'方式':<10}{'平均(ms)':>10}{'P50(ms)':>10}{'P95(ms)':>10}{'调用/秒':>10}{'新建连接':>10}")
+    for name, stats in results.items():
+        print(f"{name:<10}{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+              f"{stats['calls_per_second']:>10.0f}{stats['connections']:>10}")
+    saved = results['per_call']['mean_ms'] - results['pooled']['mean_ms']
+    print(f"连接池每次调用节省 {saved:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
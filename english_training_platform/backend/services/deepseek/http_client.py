@@ -0,0 +1,237 @@
+"""
+DeepSeek API的HTTP连接池
+所有大模型调用（学习反馈、口语任务、水平评估和推荐智能体）共用一个进程内的HTTP客户端，
+连接保持长连接并在调用之间复用，只有第一次调用需要建立TCP连接和TLS握手。
+连接池大小按worker的并发线程数设置；连接超时和读取超时分开配置，
+连接不上时很快失败，生成长文本时仍有足够的读取时间。
+
+安装了httpx和h2时使用HTTP/2（多个并发请求复用同一条连接），否则使用requests的
+HTTP/1.1长连接池。异步客户端基于httpx.AsyncClient，运行在一个后台事件循环线程中：
+调用方可以在任意事件循环（包括Flask为每个异步视图创建的临时事件循环）中等待结果，
+所有进行中的请求共用一个线程和一个连接池，连接也不会随调用方的事件循环关闭而失效。
+可通过环境变量调整：
+    DEEPSEEK_API_ENDPOINT     API地址
+    DEEPSEEK_POOL_SIZE        连接池大小，默认16
+    DEEPSEEK_ASYNC_POOL_SIZE  异步客户端的连接数上限，默认100（等待响应不占用线程，可以比同步连接池大得多）
+    DEEPSEEK_CONNECT_TIMEOUT  连接超时（秒），默认10
+    DEEPSEEK_READ_TIMEOUT     读取超时（秒），默认180
+    DEEPSEEK_HTTP2            设置为0时不使用HTTP/2
+"""
+
+import asyncio
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # httpx需要h2才能使用HTTP/2
+except ImportError:
+    h2 = None
+
+DEFAULT_API_ENDPOINT = "https://api.deepseek.com/v1/chat/completions"
+DEFAULT_POOL_SIZE = 16
+DEFAULT_ASYNC_POOL_SIZE = 100
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 180.0
+
+# 两种实现的超时和请求异常，调用方据此决定是否重试
+TIMEOUT_ERRORS = (requests.exceptions.Timeout,) + ((httpx.TimeoutException,) if httpx else ())
+REQUEST_ERRORS = (requests.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+
+def http2_available() -> bool:
+    """当前环境是否可以使用HTTP/2"""
+    return httpx is not None and h2 is not None and os.environ.get('DEEPSEEK_HTTP2', '1') != '0'
+
+
+class DeepSeekHTTPClient:
+    """
+    线程安全的DeepSeek HTTP客户端
+
+    requests.Session和httpx.Client的连接池都是线程安全的，多个请求线程可以共用一个实例。
+    """
+
+    def __init__(self, endpoint: Optional[str] = None, pool_size: Optional[int] = None,
+                 connect_timeout: Optional[float] = None, read_timeout: Optional[float] = None,
+                 http2: Optional[bool] = None, verify: bool = True):
+        self.endpoint = endpoint or os.environ.get('DEEPSEEK_API_ENDPOINT', DEFAULT_API_ENDPOINT)
+        self.pool_size = pool_size or int(os.environ.get('DEEPSEEK_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self.connect_timeout = connect_timeout or float(os.environ.get('DEEPSEEK_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT))
+        self.read_timeout = read_timeout or float(os.environ.get('DEEPSEEK_READ_TIMEOUT', DEFAULT_READ_TIMEOUT))
+        self.http2 = http2_available() if http2 is None else (http2 and httpx is not None and h2 is not None)
+        self.verify = verify
+
+        if self.http2:
+            self._client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                verify=verify
+            )
+        else:
+            session = requests.Session()
+            # 连接池满时不阻塞，超出的请求使用临时连接
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=False)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._client = session
+
+    def timeouts(self, timeout: Optional[float] = None) -> Tuple[float, float]:
+        """(连接超时, 读取超时)，指定timeout时两者都不超过它（调用方剩余的时间预算）"""
+        if timeout is None:
+            return self.connect_timeout, self.read_timeout
+        timeout = max(timeout, 0.001)
+        return min(self.connect_timeout, timeout), min(self.read_timeout, timeout)
+
+    def post(self, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None):
+        """
+        向API地址发送JSON请求
+
+        Args:
+            timeout: 本次请求的超时上限（秒），默认使用连接超时和读取超时
+
+        Returns:
+            响应对象（requests.Response或httpx.Response，都有status_code、text和json()）
+        """
+        connect_timeout, read_timeout = self.timeouts(timeout)
+        if self.http2:
+            return self._client.post(self.endpoint, headers=headers, json=data,
+                                     timeout=httpx.Timeout(read_timeout, connect=connect_timeout))
+        return self._client.post(self.endpoint, headers=headers, json=data,
+                                 timeout=(connect_timeout, read_timeout), verify=self.verify)
+
+    @contextmanager
+    def stream(self, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None):
+        """
+        以流式方式发送JSON请求（请求体中需要设置"stream": true）
+
+        状态码不是200时先读完响应体，调用方可以直接使用text。读取超时作用于相邻两段数据之间的间隔。
+
+        Yields:
+            tuple: (响应对象, 逐行产出响应体文本的迭代器)
+        """
+        connect_timeout, read_timeout = self.timeouts(timeout)
+        if self.http2:
+            with self._client.stream('POST', self.endpoint, headers=headers, json=data,
+                                     timeout=httpx.Timeout(read_timeout, connect=connect_timeout)) as response:
+                if response.status_code != 200:
+                    response.read()
+                yield response, response.iter_lines()
+            return
+        response = self._client.post(self.endpoint, headers=headers, json=data, stream=True,
+                                     timeout=(connect_timeout, read_timeout), verify=self.verify)
+        try:
+            # text/event-stream没有声明字符集时requests默认按ISO-8859-1解码
+            response.encoding = 'utf-8'
+            yield response, response.iter_lines(decode_unicode=True)
+        finally:
+            response.close()
+
+    def close(self):
+        """关闭连接池中的所有连接"""
+        self._client.close()
+
+
+class AsyncDeepSeekHTTPClient:
+    """
+    DeepSeek异步HTTP客户端
+
+    请求在客户端自己的后台事件循环中执行，调用方的事件循环只等待结果；
+    调用方取消等待时，后台的请求也会被取消。未安装httpx时退化为在线程池中调用同步客户端。
+    """
+
+    def __init__(self, endpoint: Optional[str] = None, pool_size: Optional[int] = None,
+                 connect_timeout: Optional[float] = None, read_timeout: Optional[float] = None,
+                 http2: Optional[bool] = None, verify: bool = True):
+        self._sync = DeepSeekHTTPClient(endpoint, pool_size, connect_timeout, read_timeout, http2=False, verify=verify)
+        self.endpoint = self._sync.endpoint
+        self.pool_size = pool_size or int(os.environ.get('DEEPSEEK_ASYNC_POOL_SIZE', DEFAULT_ASYNC_POOL_SIZE))
+        self.http2 = http2_available() if http2 is None else (http2 and httpx is not None and h2 is not None)
+        self.verify = verify
+        self._client = None
+        self._loop = None
+        if httpx is not None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name='deepseek-async-client', daemon=True).start()
+
+    async def _post(self, data: Dict[str, Any], headers: Optional[Dict[str, str]], timeout: Optional[float]):
+        """在后台事件循环中发送请求"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                timeout=httpx.Timeout(self._sync.read_timeout, connect=self._sync.connect_timeout),
+                verify=self.verify
+            )
+        connect_timeout, read_timeout = self._sync.timeouts(timeout)
+        return await self._client.post(self.endpoint, headers=headers, json=data,
+                                       timeout=httpx.Timeout(read_timeout, connect=connect_timeout))
+
+    async def post(self, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None):
+        """
+        向API地址发送JSON请求
+
+        Args:
+            timeout: 本次请求的超时上限（秒），默认使用连接超时和读取超时
+
+        Returns:
+            响应对象（httpx.Response或requests.Response，都有status_code、text和json()）
+        """
+        if self._loop is None:
+            return await asyncio.get_running_loop().run_in_executor(None, self._sync.post, data, headers, timeout)
+        future = asyncio.run_coroutine_threadsafe(self._post(data, headers, timeout), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        """关闭连接池并停止后台事件循环"""
+        if self._loop is not None:
+            if self._client is not None:
+                asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._sync.close()
+
+
+_http_client: Optional[DeepSeekHTTPClient] = None
+_http_client_pid: Optional[int] = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> DeepSeekHTTPClient:
+    """
+    获取进程内共享的HTTP客户端（首次调用时创建）
+
+    fork出的子进程不能继续使用父进程的连接，检测到进程号变化时重新创建。
+    """
+    global _http_client, _http_client_pid
+    pid = os.getpid()
+    if _http_client is None or _http_client_pid != pid:
+        with _http_client_lock:
+            if _http_client is None or _http_client_pid != pid:
+                _http_client = DeepSeekHTTPClient()
+                _http_client_pid = pid
+    return _http_client
+
+
+_async_http_client: Optional[AsyncDeepSeekHTTPClient] = None
+_async_http_client_pid: Optional[int] = None
+
+
+def get_async_http_client() -> AsyncDeepSeekHTTPClient:
+    """获取进程内共享的异步HTTP客户端（首次调用时创建，fork后重新创建）"""
+    global _async_http_client, _async_http_client_pid
+    pid = os.getpid()
+    if _async_http_client is None or _async_http_client_pid != pid:
+        with _http_client_lock:
+            if _async_http_client is None or _async_http_client_pid != pid:
+                _async_http_client = AsyncDeepSeekHTTPClient()
+                _async_http_client_pid = pid
+    return _async_http_client
@@ -1,24 +1,28 @@
 import json
 import time
-from typing import Dict, List, Any, Optional
-from .api_client import call_deepseek_api
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+from services.material_catalog import get_catalog
+from .api_client import acall_deepseek_api, call_deepseek_api, is_fallback_response, stream_deepseek_api
+from .stream_parser import IncrementalJSONParser
+
+# 响应缓存的有效期（秒）：相同的答题数据和材料得到的评估与反馈在一周内直接复用
+LEVEL_CACHE_TTL = 7 * 24 * 3600
+FEEDBACK_CACHE_TTL = 7 * 24 * 3600
+
+# 学习反馈中流式产出的字段（错题分析逐题产出）
+FEEDBACK_FIELDS = ('vocabulary', 'expressions', 'background', 'structure')
 
 def log_debug(message):
     """记录调试信息"""
     print(f"[DEBUG][{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}")
 
-def evaluate_listening_level(user_answers: List[Dict[str, Any]]) -> Dict[str, Any]:
+def build_level_prompt(user_answers: List[Dict[str, Any]]) -> Tuple[str, str]:
     """
-    评估用户的听力水平
+    构建听力水平评估的提示词
     
-    Args:
-        user_answers: 用户答题数据
-        
     Returns:
-        dict: 评估结果，包含难度等级和推荐材料
+        tuple: (提示词, 系统提示词)
     """
-    log_debug(f"开始评估听力水平，答题数据数量: {len(user_answers)}")
-    
     prompt = f"""
     根据以下用户的听力答题数据，评估其英语听力水平，并推荐适合的难度等级（CET4、CET6、IELTS、TOEFL）。
     输出JSON格式，包含难度等级、推荐材料ID和分析。
@@ -28,9 +32,10 @@ def evaluate_listening_level(user_answers: List[Dict[str, Any]]) -> Dict[str, An
     """
     
     system_prompt = "你是一个专业的英语听力水平评估助手，请根据用户的答题情况给出客观评价和合适的难度推荐。"
-    
-    response = call_deepseek_api(prompt, system_prompt)
-    
+    return prompt, system_prompt
+
+def parse_level_response(response: Dict[str, Any]) -> Dict[str, Any]:
+    """解析听力水平评估的响应，无法解析时返回默认结果"""
     try:
         content = response["choices"][0]["message"]["content"]
         # 尝试解析JSON
@@ -49,20 +54,34 @@ def evaluate_listening_level(user_answers: List[Dict[str, Any]]) -> Dict[str, An
             "analysis": "无法获取完整分析，建议从基础难度开始训练。"
         }
 
-def generate_learning_feedback(material: Dict[str, Any], user_answers: List[Dict[str, Any]], transcript: Dict[str, Any] = None) -> Dict[str, Any]:
+def evaluate_listening_level(user_answers: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    生成学习反馈
+    评估用户的听力水平
     
     Args:
-        material: 听力材料数据
         user_answers: 用户答题数据
-        transcript: 听力原文数据（可选）
         
     Returns:
-        dict: 学习反馈，包含重要单词、表达、背景知识、听力结构分析和针对错题的详细解释
+        dict: 评估结果，包含难度等级和推荐材料
     """
-    log_debug(f"开始生成学习反馈，材料ID: {material.get('id', '未知')}")
+    log_debug(f"开始评估听力水平，答题数据数量: {len(user_answers)}")
+    prompt, system_prompt = build_level_prompt(user_answers)
+    return parse_level_response(call_deepseek_api(prompt, system_prompt, cache_ttl=LEVEL_CACHE_TTL))
+
+async def aevaluate_listening_level(user_answers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """评估用户的听力水平（异步版本）"""
+    log_debug(f"开始评估听力水平，答题数据数量: {len(user_answers)}")
+    prompt, system_prompt = build_level_prompt(user_answers)
+    return parse_level_response(await acall_deepseek_api(prompt, system_prompt, cache_ttl=LEVEL_CACHE_TTL))
+
+def build_feedback_prompt(material: Dict[str, Any], user_answers: List[Dict[str, Any]],
+                          transcript: Dict[str, Any] = None) -> Tuple[str, str]:
+    """
+    构建学习反馈的提示词
     
+    Returns:
+        tuple: (提示词, 系统提示词)
+    """
     # 准备提示词
     prompt_parts = [
         "作为英语听力学习助手，请根据以下信息为用户生成详细的学习反馈。",
@@ -138,107 +157,195 @@ def generate_learning_feedback(material: Dict[str, Any], user_answers: List[Dict
     "5": "这道题的关键在于... 听力中明确说到... 提高这方面能力可以..."
   }
 }"""
+    return prompt, system_prompt
+
+def format_mistake_analysis(analysis: Any) -> Any:
+    """将JSON格式的错题分析整理为自然语言的点评，其他内容原样返回"""
+    # 检查是否是JSON格式的字符串
+    if isinstance(analysis, str) and (analysis.startswith('{') or '"key_information"' in analysis or '"why_wrong"' in analysis or '"suggestion"' in analysis):
+        try:
+            # 尝试解析JSON
+            analysis_data = json.loads(analysis) if analysis.startswith('{') else {"content": analysis}
+
+            # 构建人性化的错题分析文本
+            formatted_text = ""
+
+            # 添加错误原因
+            if "why_wrong" in analysis_data:
+                formatted_text += f"{analysis_data['why_wrong']}\n\n"
+
+            # 添加关键信息
+            if "key_information" in analysis_data:
+                formatted_text += f"听力中的关键信息：{analysis_data['key_information']}\n\n"
+
+            # 添加建议
+            if "suggestion" in analysis_data:
+                formatted_text += f"提升建议：{analysis_data['suggestion']}"
+
+            # 如果没有成功提取结构化内容，则使用原始文本
+            if not formatted_text and "content" in analysis_data:
+                formatted_text = analysis_data["content"]
+            elif not formatted_text:
+                formatted_text = analysis
+
+            return formatted_text
+        except Exception as e:
+            log_debug(f"解析错题分析失败: {str(e)}")
+    return analysis
+
+def parse_feedback_response(response: Dict[str, Any], material: Dict[str, Any],
+                            user_answers: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    解析学习反馈的响应，补全缺失的字段
+    
+    Returns:
+        dict: 学习反馈（内容无法解析时为模拟反馈）；响应为空需要重试时返回None
+    """
+    error_questions = [a for a in user_answers if not a.get('is_correct', True)]
+    
+    if not response or "choices" not in response or not response["choices"]:
+        log_debug("DeepSeek API返回的响应为空或格式不正确")
+        return None
+
+    content = response["choices"][0]["message"]["content"]
+
+    # 确保内容不为空
+    if not content or not content.strip():
+        log_debug("DeepSeek API返回的内容为空")
+        return None
+
+    # 尝试解析JSON
+    try:
+        # 清理可能的非JSON前缀和后缀
+        content = content.strip()
+        # 查找第一个 { 和最后一个 }
+        start_idx = content.find('{')
+        end_idx = content.rfind('}') + 1
+
+        if start_idx >= 0 and end_idx > start_idx:
+            # 提取JSON部分
+            json_content = content[start_idx:end_idx]
+            result = json.loads(json_content)
+        else:
+            # 如果找不到JSON标记，尝试直接解析
+            result = json.loads(content)
+
+        # 确保结果包含所有需要的字段
+        required_fields = ['vocabulary', 'expressions', 'background', 'structure']
+        missing_fields = [field for field in required_fields if field not in result or not result[field]]
+
+        if missing_fields:
+            log_debug(f"响应缺少必要字段: {', '.join(missing_fields)}")
+            # 补充缺失的字段
+            mock_data = generate_mock_feedback(material, user_answers)
+            for field in missing_fields:
+                result[field] = mock_data[field]
+
+        # 如果没有错题分析字段但有错题，添加错题分析
+        if error_questions and ('mistakes_analysis' not in result or not result['mistakes_analysis']):
+            log_debug("响应缺少错题分析，添加模拟分析")
+            mock_data = generate_mock_feedback(material, user_answers)
+            result['mistakes_analysis'] = mock_data['mistakes_analysis']
+
+        # 处理错题分析格式，使其更加人性化
+        if 'mistakes_analysis' in result and isinstance(result['mistakes_analysis'], dict):
+            processed_analysis = {}
+            for question_id, analysis in result['mistakes_analysis'].items():
+                processed_analysis[question_id] = format_mistake_analysis(analysis)
+
+        result['mistakes_analysis'] = processed_analysis
+        return result
+    except Exception as e:
+        log_debug(f"解析DeepSeek响应出错: {str(e)}")
+        return generate_mock_feedback(material, user_answers)
+
+def generate_learning_feedback(material: Dict[str, Any], user_answers: List[Dict[str, Any]], transcript: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    生成学习反馈
+    
+    Args:
+        material: 听力材料数据
+        user_answers: 用户答题数据
+        transcript: 听力原文数据（可选）
+        
+    Returns:
+        dict: 学习反馈，包含重要单词、表达、背景知识、听力结构分析和针对错题的详细解释
+    """
+    log_debug(f"开始生成学习反馈，材料ID: {material.get('id', '未知')}")
+    prompt, system_prompt = build_feedback_prompt(material, user_answers, transcript)
     
     max_attempts = 2
     for attempt in range(max_attempts):
         try:
             log_debug(f"生成学习反馈 (尝试 {attempt+1}/{max_attempts})")
-            response = call_deepseek_api(prompt, system_prompt)
-            
-            if not response or "choices" not in response or not response["choices"]:
-                log_debug("DeepSeek API返回的响应为空或格式不正确")
-                if attempt < max_attempts - 1:
-                    continue
-                return generate_mock_feedback(material, user_answers)
-            
-            content = response["choices"][0]["message"]["content"]
-            
-            # 确保内容不为空
-            if not content or not content.strip():
-                log_debug("DeepSeek API返回的内容为空")
-                if attempt < max_attempts - 1:
-                    continue
-                return generate_mock_feedback(material, user_answers)
-            
-            # 尝试解析JSON
-            try:
-                # 清理可能的非JSON前缀和后缀
-                content = content.strip()
-                # 查找第一个 { 和最后一个 }
-                start_idx = content.find('{')
-                end_idx = content.rfind('}') + 1
-                
-                if start_idx >= 0 and end_idx > start_idx:
-                    # 提取JSON部分
-                    json_content = content[start_idx:end_idx]
-                    result = json.loads(json_content)
-                else:
-                    # 如果找不到JSON标记，尝试直接解析
-                    result = json.loads(content)
-                
-                # 确保结果包含所有需要的字段
-                required_fields = ['vocabulary', 'expressions', 'background', 'structure']
-                missing_fields = [field for field in required_fields if field not in result or not result[field]]
-                
-                if missing_fields:
-                    log_debug(f"响应缺少必要字段: {', '.join(missing_fields)}")
-                    # 补充缺失的字段
-                    mock_data = generate_mock_feedback(material, user_answers)
-                    for field in missing_fields:
-                        result[field] = mock_data[field]
-                    
-                # 如果没有错题分析字段但有错题，添加错题分析
-                if error_questions and ('mistakes_analysis' not in result or not result['mistakes_analysis']):
-                    log_debug("响应缺少错题分析，添加模拟分析")
-                    mock_data = generate_mock_feedback(material, user_answers)
-                    result['mistakes_analysis'] = mock_data['mistakes_analysis']
-                
-                # 处理错题分析格式，使其更加人性化
-                if 'mistakes_analysis' in result and isinstance(result['mistakes_analysis'], dict):
-                    processed_analysis = {}
-                    for question_id, analysis in result['mistakes_analysis'].items():
-                        # 检查是否是JSON格式的字符串
-                        if isinstance(analysis, str) and (analysis.startswith('{') or '"key_information"' in analysis or '"why_wrong"' in analysis or '"suggestion"' in analysis):
-                            try:
-                                # 尝试解析JSON
-                                analysis_data = json.loads(analysis) if analysis.startswith('{') else {"content": analysis}
-                                
-                                # 构建人性化的错题分析文本
-                                formatted_text = ""
-                                
-                                # 添加错误原因
-                                if "why_wrong" in analysis_data:
-                                    formatted_text += f"{analysis_data['why_wrong']}\n\n"
-                                
-                                # 添加关键信息
-                                if "key_information" in analysis_data:
-                                    formatted_text += f"听力中的关键信息：{analysis_data['key_information']}\n\n"
-                                
-                                # 添加建议
-                                if "suggestion" in analysis_data:
-                                    formatted_text += f"提升建议：{analysis_data['suggestion']}"
-                                
-                                # 如果没有成功提取结构化内容，则使用原始文本
-                                if not formatted_text and "content" in analysis_data:
-                                    formatted_text = analysis_data["content"]
-                                elif not formatted_text:
-                                    formatted_text = analysis
-                                
-                                processed_analysis[question_id] = formatted_text
-                            except Exception as e:
-                                log_debug(f"解析错题分析失败: {str(e)}")
-                                processed_analysis[question_id] = analysis
-                        else:
-                            processed_analysis[question_id] = analysis
-                
-                result['mistakes_analysis'] = processed_analysis
+            # 重试时跳过缓存，重新生成一次无法解析的响应
+            response = call_deepseek_api(prompt, system_prompt, cache_ttl=FEEDBACK_CACHE_TTL, refresh=attempt > 0)
+            result = parse_feedback_response(response, material, user_answers)
+            if result is not None:
+                return result
+            if is_fallback_response(response):
+                # 上游不可用时api_client已经用完了时间预算，不再重复调用
+                break
+        except Exception as e:
+            log_debug(f"生成学习反馈时出错: {str(e)}")
+            return generate_mock_feedback(material, user_answers)
+    return generate_mock_feedback(material, user_answers)
+
+async def agenerate_learning_feedback(material: Dict[str, Any], user_answers: List[Dict[str, Any]], transcript: Dict[str, Any] = None) -> Dict[str, Any]:
+    """生成学习反馈（异步版本），参数和返回值与generate_learning_feedback相同"""
+    log_debug(f"开始生成学习反馈，材料ID: {material.get('id', '未知')}")
+    prompt, system_prompt = build_feedback_prompt(material, user_answers, transcript)
+    
+    max_attempts = 2
+    for attempt in range(max_attempts):
+        try:
+            log_debug(f"生成学习反馈 (尝试 {attempt+1}/{max_attempts})")
+            # 重试时跳过缓存，重新生成一次无法解析的响应
+            response = await acall_deepseek_api(prompt, system_prompt, cache_ttl=FEEDBACK_CACHE_TTL, refresh=attempt > 0)
+            result = parse_feedback_response(response, material, user_answers)
+            if result is not None:
                 return result
-            except Exception as e:
-                log_debug(f"解析DeepSeek响应出错: {str(e)}")
-                return generate_mock_feedback(material, user_answers)
+            if is_fallback_response(response):
+                # 上游不可用时api_client已经用完了时间预算，不再重复调用
+                break
         except Exception as e:
             log_debug(f"生成学习反馈时出错: {str(e)}")
             return generate_mock_feedback(material, user_answers)
+    return generate_mock_feedback(material, user_answers)
+
+def stream_learning_feedback(material: Dict[str, Any], user_answers: List[Dict[str, Any]],
+                             transcript: Dict[str, Any] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    以流式方式生成学习反馈，每个部分生成完毕就立即产出
+    
+    Args:
+        material: 听力材料数据
+        user_answers: 用户答题数据
+        transcript: 听力原文数据（可选）
+        
+    Yields:
+        tuple: (事件名, 数据)，依次为
+            vocabulary/expressions/background/structure: 对应字段的内容（按模型生成的顺序）
+            mistake: {"question_id": 题号, "analysis": 该题的分析}，每道错题一个事件
+            complete: 完整的学习反馈（与generate_learning_feedback的返回值相同，缺失的字段已补全），最后产出
+    """
+    log_debug(f"开始流式生成学习反馈，材料ID: {material.get('id', '未知')}")
+    prompt, system_prompt = build_feedback_prompt(material, user_answers, transcript)
+    
+    parser = IncrementalJSONParser(expand=('mistakes_analysis',))
+    parts = []
+    for delta in stream_deepseek_api(prompt, system_prompt, cache_ttl=FEEDBACK_CACHE_TTL):
+        parts.append(delta)
+        for path, value in parser.feed(delta):
+            if path[0] == 'mistakes_analysis':
+                yield 'mistake', {"question_id": path[1], "analysis": format_mistake_analysis(value)}
+            elif path[0] in FEEDBACK_FIELDS and value:
+                yield path[0], value
+    
+    # 以完整内容的解析结果为准，补全流式过程中缺失或无法解析的部分
+    response = {"choices": [{"message": {"content": "".join(parts)}}]}
+    result = parse_feedback_response(response, material, user_answers)
+    yield 'complete', result if result is not None else generate_mock_feedback(material, user_answers)
 
 def generate_mock_feedback(material: Dict[str, Any], user_answers: List[Dict[str, Any]]) -> Dict[str, Any]:
     """生成模拟的学习反馈（当API调用失败时使用）"""
@@ -278,6 +385,13 @@ def generate_mock_feedback(material: Dict[str, Any], user_answers: List[Dict[str
         background = "该材料探讨了最新科技发展趋势及其对社会的影响，特别是人工智能和自动化领域的进展。"
         structure = "讲座从技术定义开始，然后介绍历史发展，接着分析当前应用，最后展望未来发展方向。"
     
+    # 有离线统计的词汇画像时，使用材料中实际出现的生僻词
+    profile = material.get('lexical_profile')
+    if not profile and material.get('id'):
+        profile = (get_catalog().get(material['id']) or {}).get('lexical_profile')
+    if profile and profile.get('rare_words'):
+        vocabulary = profile['rare_words'][:5]
+    
     return {
         "vocabulary": vocabulary,
         "expressions": expressions,
@@ -0,0 +1,236 @@
+"""
+DeepSeek响应缓存
+完全相同的请求（模型、系统提示词、提示词和temperature都相同）直接返回之前的响应，
+不再调用API。缓存分两级：
+    内存：进程内的LRU，命中时只需要一次字典查找和JSON解析
+    磁盘：SQLite数据库（WAL模式），多个gunicorn worker共享，重启后仍然有效
+每条缓存有自己的过期时间（由调用方按场景指定TTL），两级缓存都按占用的字节数淘汰最久未使用的条目。
+
+可通过环境变量调整：
+    LLM_CACHE                 设置为0时关闭缓存
+    LLM_CACHE_PATH            磁盘缓存路径，默认data/llm_cache.db
+    LLM_CACHE_TTL             默认TTL（秒），默认1天
+    LLM_CACHE_MEMORY_BYTES    内存缓存上限，默认16MB
+    LLM_CACHE_DISK_BYTES      磁盘缓存上限，默认256MB
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_CACHE_PATH = 'data/llm_cache.db'
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MEMORY_BYTES = 16 * 1024 * 1024
+DEFAULT_DISK_BYTES = 256 * 1024 * 1024
+
+# 超出上限时淘汰到上限的这一比例，避免每次写入都触发淘汰
+EVICTION_TARGET = 0.9
+
+# 等待其他连接释放写锁的最长时间（秒）
+DEFAULT_BUSY_TIMEOUT = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def cache_key(model: str, system_prompt: Optional[str], prompt: str, temperature: float) -> str:
+    """请求的缓存键（SHA-256）"""
+    payload = json.dumps([model, system_prompt or '', prompt, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    两级LRU响应缓存
+
+    内存层由锁保护；磁盘层每个线程持有自己的SQLite连接。
+    """
+
+    def __init__(self, db_path: Optional[str] = DEFAULT_CACHE_PATH, default_ttl: float = DEFAULT_TTL,
+                 max_memory_bytes: int = DEFAULT_MEMORY_BYTES, max_disk_bytes: int = DEFAULT_DISK_BYTES):
+        self.db_path = db_path
+        self.default_ttl = default_ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        # 缓存键 -> (过期时间, 响应JSON)
+        self._memory: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._memory_bytes = 0
+        self._local = threading.local()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0}
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if not self.db_path:
+            return None
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=DEFAULT_BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _remember(self, key: str, expires_at: float, body: str):
+        """放入内存层，超出上限时淘汰最久未使用的条目"""
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous[1])
+            self._memory[key] = (expires_at, body)
+            self._memory_bytes += len(body)
+            if self._memory_bytes > self.max_memory_bytes:
+                target = self.max_memory_bytes * EVICTION_TARGET
+                while self._memory and self._memory_bytes > target:
+                    _, (_, evicted) = self._memory.popitem(last=False)
+                    self._memory_bytes -= len(evicted)
+                    self._stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        查询缓存
+
+        Returns:
+            dict: 缓存的响应（每次返回新的副本），未命中或已过期时返回None
+        """
+        now = time.time()
+        expired = False
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return json.loads(entry[1])
+                del self._memory[key]
+                self._memory_bytes -= len(entry[1])
+                self._stats["expired"] += 1
+                expired = True
+
+        conn = self._connection()
+        row = None
+        if conn is not None:
+            try:
+                row = conn.execute("SELECT body, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] <= now:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    if not expired:
+                        self._count("expired")
+                    row = None
+                elif row is not None:
+                    conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            except sqlite3.Error as e:
+                print(f"读取响应缓存失败: {str(e)}")
+                row = None
+
+        if row is None:
+            self._count("misses")
+            return None
+        self._count("disk_hits")
+        self._remember(key, row[1], row[0])
+        return json.loads(row[0])
+
+    def put(self, key: str, response: Dict[str, Any], ttl: Optional[float] = None):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            response: API响应
+            ttl: 有效期（秒），默认使用default_ttl
+        """
+        now = time.time()
+        expires_at = now + (self.default_ttl if ttl is None else ttl)
+        body = json.dumps(response, ensure_ascii=False)
+        self._remember(key, expires_at, body)
+        self._count("stores")
+
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, size, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, body, len(body.encode('utf-8')), expires_at, now)
+            )
+            self._evict_disk(conn, now)
+        except sqlite3.Error as e:
+            print(f"写入响应缓存失败: {str(e)}")
+
+    def _evict_disk(self, conn: sqlite3.Connection, now: float):
+        """删除过期条目，超出上限时按最久未使用的顺序淘汰"""
+        conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        total, = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_disk_bytes:
+            return
+        excess = total - self.max_disk_bytes * EVICTION_TARGET
+        keys = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self._count("evictions", len(keys))
+
+    def stats(self) -> Dict[str, Any]:
+        """命中、未命中、写入和淘汰次数，以及内存层的占用"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        conn = self._connection()
+        if conn is not None:
+            conn.execute("DELETE FROM responses")
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_pid: Optional[int] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """获取进程内共享的响应缓存，设置LLM_CACHE=0时返回None"""
+    global _response_cache, _response_cache_pid
+    if os.environ.get('LLM_CACHE', '1') == '0':
+        return None
+    pid = os.getpid()
+    if _response_cache is None or _response_cache_pid != pid:
+        with _response_cache_lock:
+            if _response_cache is None or _response_cache_pid != pid:
+                _response_cache = ResponseCache(
+                    os.environ.get('LLM_CACHE_PATH', DEFAULT_CACHE_PATH),
+                    default_ttl=float(os.environ.get('LLM_CACHE_TTL', DEFAULT_TTL)),
+                    max_memory_bytes=int(os.environ.get('LLM_CACHE_MEMORY_BYTES', DEFAULT_MEMORY_BYTES)),
+                    max_disk_bytes=int(os.environ.get('LLM_CACHE_DISK_BYTES', DEFAULT_DISK_BYTES))
+                )
+                _response_cache_pid = pid
+    return _response_cache
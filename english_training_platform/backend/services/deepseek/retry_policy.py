@@ -0,0 +1,179 @@
+"""
+DeepSeek API的重试策略和熔断器
+每次调用有一个总的时间预算（deadline）：每次尝试的超时不超过剩余预算，预算不足以再等待一次
+退避时直接放弃。重试间隔按指数增长并加入随机抖动（full jitter），避免大量请求同时重试；
+只有超时、连接错误、429和5xx等暂时性错误才重试，其他4xx直接放弃。
+
+熔断器统计连续的暂时性失败：达到阈值后进入打开状态，期间所有调用不再请求上游，直接返回
+模拟响应；冷却时间过后放行一个探测请求，成功则恢复，失败则继续熔断。探测请求被取消（协程取消、
+SSE客户端断开）时释放探测名额；超过冷却时间仍未结束的探测也不再阻止新的探测。熔断器在进程内共享。
+
+可通过环境变量调整：
+    DEEPSEEK_DEADLINE            每次调用的总时间预算（秒），默认120
+    DEEPSEEK_MAX_ATTEMPTS        最多尝试次数，默认3
+    DEEPSEEK_BACKOFF_BASE        第一次重试前的最长等待（秒），默认0.5，之后每次翻倍
+    DEEPSEEK_BACKOFF_MAX         单次等待的上限（秒），默认8
+    DEEPSEEK_BREAKER_THRESHOLD   触发熔断的连续失败次数，默认5
+    DEEPSEEK_BREAKER_COOLDOWN    熔断的冷却时间（秒），默认30
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_DEADLINE = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 8.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 30.0
+
+# 可以重试的HTTP状态码：请求超时、限流和服务端错误
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class RetryPolicy:
+    """重试策略：最多尝试次数、总时间预算和带抖动的指数退避"""
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS, deadline: float = DEFAULT_DEADLINE,
+                 backoff_base: float = DEFAULT_BACKOFF_BASE, backoff_max: float = DEFAULT_BACKOFF_MAX,
+                 retryable_statuses=RETRYABLE_STATUSES):
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retryable_statuses = frozenset(retryable_statuses)
+
+    def start(self) -> float:
+        """开始一次调用，返回截止时刻（time.monotonic()时间）"""
+        return time.monotonic() + self.deadline
+
+    @staticmethod
+    def remaining(deadline: float) -> float:
+        """距离截止时刻的剩余秒数"""
+        return deadline - time.monotonic()
+
+    def is_retryable_status(self, status_code: int) -> bool:
+        """HTTP状态码是否属于暂时性错误"""
+        return status_code in self.retryable_statuses
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        第attempt次尝试（从0开始）失败后的等待时间
+
+        在[0, min(上限, 基数*2^attempt)]中均匀随机；上游通过Retry-After指定了等待时间时取两者的较大值。
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+def retry_after_seconds(response) -> Optional[float]:
+    """读取响应的Retry-After头（只支持秒数形式）"""
+    value = response.headers.get('Retry-After') if getattr(response, 'headers', None) is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    线程安全的熔断器
+
+    closed: 正常放行；open: 拒绝所有请求直到冷却结束；half_open: 只放行一个探测请求，
+    探测请求超过冷却时间仍没有结果时再放行一个。
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_BREAKER_THRESHOLD, cooldown: float = DEFAULT_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._rejected = 0
+
+    def allow_request(self) -> bool:
+        """当前是否可以请求上游"""
+        with self._lock:
+            if self._state == 'closed':
+                return True
+            if self._state == 'open' and time.monotonic() - self._opened_at >= self.cooldown:
+                self._state = 'half_open'
+                self._probing = False
+            now = time.monotonic()
+            if self._state == 'half_open' and (not self._probing or now - self._probe_started >= self.cooldown):
+                self._probing = True
+                self._probe_started = now
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self):
+        """上游正常响应（包括不可重试的4xx，说明上游是可达的）"""
+        with self._lock:
+            if self._state != 'closed':
+                print("DeepSeek API已恢复，关闭熔断")
+            self._state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """一次暂时性失败"""
+        with self._lock:
+            self._failures += 1
+            if self._state == 'half_open' or self._failures >= self.failure_threshold:
+                if self._state != 'open':
+                    print(f"DeepSeek API连续失败{self._failures}次，熔断{self.cooldown:.0f}秒")
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release_probe(self):
+        """请求没有结果就结束了（被取消），不计入成功或失败；如果它是探测请求，允许下一个请求继续探测"""
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        """当前状态、连续失败次数和熔断期间拒绝的调用次数"""
+        with self._lock:
+            return {"state": self._state, "consecutive_failures": self._failures, "rejected": self._rejected}
+
+
+_retry_policy: Optional[RetryPolicy] = None
+_circuit_breaker: Optional[CircuitBreaker] = None
+_lock = threading.Lock()
+
+
+def get_retry_policy() -> RetryPolicy:
+    """获取进程内共享的重试策略"""
+    global _retry_policy
+    if _retry_policy is None:
+        with _lock:
+            if _retry_policy is None:
+                _retry_policy = RetryPolicy(
+                    max_attempts=int(os.environ.get('DEEPSEEK_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)),
+                    deadline=float(os.environ.get('DEEPSEEK_DEADLINE', DEFAULT_DEADLINE)),
+                    backoff_base=float(os.environ.get('DEEPSEEK_BACKOFF_BASE', DEFAULT_BACKOFF_BASE)),
+                    backoff_max=float(os.environ.get('DEEPSEEK_BACKOFF_MAX', DEFAULT_BACKOFF_MAX))
+                )
+    return _retry_policy
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """获取进程内共享的熔断器"""
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        with _lock:
+            if _circuit_breaker is None:
+                _circuit_breaker = CircuitBreaker(
+                    failure_threshold=int(os.environ.get('DEEPSEEK_BREAKER_THRESHOLD', DEFAULT_BREAKER_THRESHOLD)),
+                    cooldown=float(os.environ.get('DEEPSEEK_BREAKER_COOLDOWN', DEFAULT_BREAKER_COOLDOWN))
+                )
+    return _circuit_breaker
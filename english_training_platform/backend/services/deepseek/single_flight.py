@@ -0,0 +1,217 @@
+"""
+合并进行中的相同DeepSeek请求（single flight）
+一个班的学生同时完成同一套题时，会在短时间内发出大量提示词完全相同的请求。同一个键（即响应缓存的键）
+同时只有一个调用方（leader）真正请求上游，其余调用方等待它的结果并各自得到一份副本。
+同步和异步调用方共用同一个进行中的调用：结果放在concurrent.futures.Future中，线程可以直接等待，
+协程通过asyncio.wrap_future等待，不阻塞事件循环。
+
+跨worker合并是可选的：设置LLM_SINGLE_FLIGHT_DIR后，leader在请求上游前还要获取该目录下以键命名的
+文件锁（fcntl.flock）。其他worker拿不到锁时等待锁释放，然后从共享的SQLite响应缓存中读取结果。
+因此跨worker合并需要开启响应缓存；Windows上没有fcntl，只在进程内合并。
+
+可通过环境变量调整：
+    LLM_SINGLE_FLIGHT       设置为0时不合并请求
+    LLM_SINGLE_FLIGHT_DIR   锁文件目录（如data/llm_locks），设置后跨worker合并
+"""
+
+import asyncio
+import copy
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .retry_policy import get_retry_policy
+
+# 等待其他worker释放文件锁时的轮询间隔（秒）
+LOCK_POLL_INTERVAL = 0.05
+
+# 等待leader时在其时间预算之外额外等待的秒数
+WAIT_MARGIN = 5.0
+
+
+class LeaderAbandoned(Exception):
+    """leader没有完成调用（例如协程被取消），等待者需要自己请求"""
+
+
+class SingleFlight:
+    """
+    进程内的请求合并
+
+    等待者最多等待wait_timeout秒，超时或leader失败时自己执行调用。
+    """
+
+    def __init__(self, wait_timeout: float):
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._stats = {"leaders": 0, "coalesced": 0}
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """返回(进行中的调用, 是否为leader)"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self._stats["leaders"] += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future, result: Any = None, error: Optional[BaseException] = None):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is None:
+            # 保存一份副本，leader之后修改自己的结果不会影响等待者
+            future.set_result(copy.deepcopy(result))
+        else:
+            future.set_exception(error if isinstance(error, Exception) else LeaderAbandoned())
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """执行fn，同一个键的并发调用只执行一次"""
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                return copy.deepcopy(future.result(timeout=self.wait_timeout))
+            except (FutureTimeoutError, Exception) as e:
+                print(f"等待相同请求的结果失败，单独请求: {type(e).__name__}")
+                return fn()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """do的异步版本，fn返回可等待对象"""
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                # shield：等待超时或被取消时不能取消共享的调用
+                result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.wait_timeout)
+                return copy.deepcopy(result)
+            except (asyncio.TimeoutError, Exception) as e:
+                print(f"等待相同请求的结果失败，单独请求: {type(e).__name__}")
+                return await fn()
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """真正执行的调用次数、合并掉的调用次数和当前进行中的调用数"""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+class WorkerLock:
+    """
+    基于文件锁的跨进程互斥，每个键一个锁文件
+
+    锁文件在持有者释放前删除，目录中不会积累锁文件。删除与其他进程打开文件之间的竞争
+    最多导致两个worker同时请求（少合并一次），不影响正确性。
+    """
+
+    def __init__(self, lock_dir: str):
+        self.lock_dir = lock_dir
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.lock_dir, f"{key}.lock")
+
+    def _try_lock(self, fd: int) -> bool:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _release(self, path: str, fd: int, locked: bool):
+        if locked:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    @contextmanager
+    def hold(self, key: str, timeout: float):
+        """
+        持有键对应的锁
+
+        Yields:
+            bool: 是否等待过其他worker（此时应先检查缓存）；等待超时时不持有锁直接继续
+        """
+        path = self._path(key)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        locked = self._try_lock(fd)
+        waited = not locked
+        deadline = time.monotonic() + timeout
+        while not locked and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            locked = self._try_lock(fd)
+        try:
+            yield waited
+        finally:
+            self._release(path, fd, locked)
+
+    @asynccontextmanager
+    async def ahold(self, key: str, timeout: float):
+        """hold的异步版本，等待锁时不阻塞事件循环"""
+        path = self._path(key)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        locked = self._try_lock(fd)
+        waited = not locked
+        deadline = time.monotonic() + timeout
+        while not locked and time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            locked = self._try_lock(fd)
+        try:
+            yield waited
+        finally:
+            self._release(path, fd, locked)
+
+
+_single_flight: Optional[SingleFlight] = None
+_worker_lock: Optional[WorkerLock] = None
+_lock = threading.Lock()
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """获取进程内共享的请求合并器，设置LLM_SINGLE_FLIGHT=0时返回None"""
+    global _single_flight
+    if os.environ.get('LLM_SINGLE_FLIGHT', '1') == '0':
+        return None
+    if _single_flight is None:
+        with _lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight(get_retry_policy().deadline + WAIT_MARGIN)
+    return _single_flight
+
+
+def get_worker_lock() -> Optional[WorkerLock]:
+    """获取跨worker的文件锁，未设置LLM_SINGLE_FLIGHT_DIR或没有fcntl时返回None"""
+    global _worker_lock
+    lock_dir = os.environ.get('LLM_SINGLE_FLIGHT_DIR')
+    if not lock_dir or fcntl is None:
+        return None
+    if _worker_lock is None:
+        with _lock:
+            if _worker_lock is None:
+                _worker_lock = WorkerLock(lock_dir)
+    return _worker_lock
@@ -1,26 +1,24 @@
 import json
 import time
-from typing import Dict, List, Any, Optional
-from .api_client import call_deepseek_api
+from typing import Dict, List, Any, Optional, Tuple
+from .api_client import acall_deepseek_api, call_deepseek_api, is_fallback_response
+
+# 响应缓存的有效期（秒）：提示词中包含完整的材料，材料修改后自然不会命中旧的口语任务
+SPEAKING_TASKS_CACHE_TTL = 30 * 24 * 3600
+SPEAKING_EVALUATION_CACHE_TTL = 24 * 3600
 
 def log_debug(message):
     """记录调试信息"""
     print(f"[DEBUG][{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}")
 
-def generate_speaking_tasks(material: Dict[str, Any], user_answers: List[Dict[str, Any]] = None, score: int = None) -> Dict[str, Any]:
+def build_speaking_tasks_prompt(material: Dict[str, Any], user_answers: List[Dict[str, Any]] = None,
+                                score: int = None) -> Tuple[str, str]:
     """
-    基于听力材料生成口语任务
+    构建口语任务的提示词
     
-    Args:
-        material: 听力材料数据
-        user_answers: 用户的答题情况，包含正确和错误的回答
-        score: 用户的得分
-        
     Returns:
-        dict: 口语任务，包含复述、总结和细节问题等
+        tuple: (提示词, 系统提示词)
     """
-    log_debug(f"开始生成口语任务，材料ID: {material.get('id', '未知')}")
-    
     # 如果有用户答题数据，则针对错误点生成更有针对性的口语任务
     if user_answers and isinstance(user_answers, list) and len(user_answers) > 0:
         log_debug(f"基于用户答题情况生成针对性口语任务，得分: {score}")
@@ -78,137 +76,178 @@ def generate_speaking_tasks(material: Dict[str, Any], user_answers: List[Dict[st
         
         system_prompt = "你是一个专业的英语口语教练，请严格按照JSON格式要求，设计与材料内容紧密相关、由浅入深的口语练习题目。"
     
+    return prompt, system_prompt
+
+def parse_speaking_tasks_response(response: Dict[str, Any], retry: int = 0, max_retries: int = 1) -> Optional[Dict[str, Any]]:
+    """
+    解析口语任务的响应，兼容各种非标准的返回格式
+    
+    Args:
+        response: DeepSeek API的响应
+        retry: 当前的尝试次数（用于日志）
+        max_retries: 最大尝试次数（用于日志）
+        
+    Returns:
+        dict: 口语任务；响应无法使用（需要重试或使用默认任务）时返回None
+    """
+    if not response or "choices" not in response or not response["choices"]:
+        log_debug(f"API响应格式不正确 (尝试 {retry+1}/{max_retries})")
+        return None
+
+    content = response["choices"][0]["message"]["content"]
+
+    # 记录实际返回的内容(前100字符)，用于调试
+    log_debug(f"API返回内容预览: {content[:100]}...")
+
+    # 验证内容
+    if not content or not content.strip():
+        log_debug(f"API响应内容为空 (尝试 {retry+1}/{max_retries})")
+        return None
+
+    # 尝试解析JSON
+    try:
+        # 清理可能的非JSON前缀和后缀
+        content = content.strip()
+
+        # 手动构建问题列表的方法
+        if "questions" not in content.lower() and "\"prompt\"" in content:
+            log_debug("未找到questions字段但发现prompt字段，尝试手动构建问题列表")
+
+            # 尝试提取问题
+            questions = []
+            # 寻找包含prompt和reference的部分
+            import re
+            pattern = r'["\'](type|prompt|reference)["\']\s*:\s*["\']([^"\']+)["\']'
+            matches = re.findall(pattern, content)
+
+            # 重组问题
+            current_q = {}
+            for key, value in matches:
+                current_q[key] = value
+                if len(current_q) == 3:  # 有type, prompt和reference就是一个完整问题
+                    questions.append(current_q)
+                    current_q = {}
+
+            if questions:
+                return {"questions": questions}
+
+        # 查找第一个 { 和最后一个 }
+        start_idx = content.find('{')
+        end_idx = content.rfind('}') + 1
+
+        if start_idx >= 0 and end_idx > start_idx:
+            # 提取JSON部分
+            json_content = content[start_idx:end_idx]
+            result = json.loads(json_content)
+        else:
+            # 如果找不到JSON标记，尝试直接解析
+            result = json.loads(content)
+
+        # 检查是否包含questions字段，或者尝试适配其他可能的字段名
+        if "questions" not in result:
+            # 尝试常见的替代字段名
+            alternative_fields = ["speaking_tasks", "tasks", "oral_practice", "exercises", "items"]
+            for field in alternative_fields:
+                if field in result and isinstance(result[field], list):
+                    log_debug(f"找到替代字段: {field}，将其映射到questions")
+                    result["questions"] = result[field]
+                    break
+
+        # 尝试从其他字段构建questions
+        if "questions" not in result:
+            # 检查是否直接是一个问题列表
+            if isinstance(result, list) and len(result) > 0:
+                if all(isinstance(item, dict) for item in result):
+                    log_debug("API返回直接是问题列表，将其包装到questions字段")
+                    return {"questions": result}
+
+            # 检查是否有题目相关字段但没有按预期格式
+            questions_data = []
+            for key, value in result.items():
+                if isinstance(value, dict) and "prompt" in value:
+                    q_type = value.get("type", "retell")
+                    questions_data.append({
+                        "type": q_type,
+                        "prompt": value["prompt"],
+                        "reference": value.get("reference", "Reference answer not provided")
+                    })
+
+            if questions_data:
+                log_debug(f"从非标准格式中构建了{len(questions_data)}个问题")
+                return {"questions": questions_data}
+
+        # 验证结果包含questions字段
+        if "questions" not in result or not result["questions"]:
+            log_debug(f"API响应缺少questions字段 (尝试 {retry+1}/{max_retries})")
+            log_debug(f"API响应内容: {content}")
+            return None
+
+        # 成功解析
+        log_debug(f"成功生成口语任务，共{len(result['questions'])}个问题")
+        return result
+
+    except json.JSONDecodeError as e:
+        log_debug(f"解析JSON失败 (尝试 {retry+1}/{max_retries}): {str(e)}")
+        log_debug(f"JSON内容: {content}")
+        return None
+
+def generate_speaking_tasks(material: Dict[str, Any], user_answers: List[Dict[str, Any]] = None, score: int = None) -> Dict[str, Any]:
+    """
+    基于听力材料生成口语任务
+    
+    Args:
+        material: 听力材料数据
+        user_answers: 用户的答题情况，包含正确和错误的回答
+        score: 用户的得分
+        
+    Returns:
+        dict: 口语任务，包含复述、总结和细节问题等
+    """
+    log_debug(f"开始生成口语任务，材料ID: {material.get('id', '未知')}")
+    prompt, system_prompt = build_speaking_tasks_prompt(material, user_answers, score)
+    
     # 设置最大重试次数
     max_retries = 2
     
     for retry in range(max_retries):
         try:
             log_debug(f"调用DeepSeek API生成口语任务 (尝试 {retry+1}/{max_retries})")
-            response = call_deepseek_api(prompt, system_prompt)
-            
-            if not response or "choices" not in response or not response["choices"]:
-                log_debug(f"API响应格式不正确 (尝试 {retry+1}/{max_retries})")
-                if retry < max_retries - 1:
-                    continue
-                else:
-                    return generate_default_speaking_tasks(material, user_answers, score)
-            
-            content = response["choices"][0]["message"]["content"]
-            
-            # 记录实际返回的内容(前100字符)，用于调试
-            log_debug(f"API返回内容预览: {content[:100]}...")
-            
-            # 验证内容
-            if not content or not content.strip():
-                log_debug(f"API响应内容为空 (尝试 {retry+1}/{max_retries})")
-                if retry < max_retries - 1:
-                    continue
-                else:
-                    return generate_default_speaking_tasks(material, user_answers, score)
-            
-            # 尝试解析JSON
-            try:
-                # 清理可能的非JSON前缀和后缀
-                content = content.strip()
-                
-                # 手动构建问题列表的方法
-                if "questions" not in content.lower() and "\"prompt\"" in content:
-                    log_debug("未找到questions字段但发现prompt字段，尝试手动构建问题列表")
-                    
-                    # 尝试提取问题
-                    questions = []
-                    # 寻找包含prompt和reference的部分
-                    import re
-                    pattern = r'["\'](type|prompt|reference)["\']\s*:\s*["\']([^"\']+)["\']'
-                    matches = re.findall(pattern, content)
-                    
-                    # 重组问题
-                    current_q = {}
-                    for key, value in matches:
-                        current_q[key] = value
-                        if len(current_q) == 3:  # 有type, prompt和reference就是一个完整问题
-                            questions.append(current_q)
-                            current_q = {}
-                    
-                    if questions:
-                        return {"questions": questions}
-                
-                # 查找第一个 { 和最后一个 }
-                start_idx = content.find('{')
-                end_idx = content.rfind('}') + 1
-                
-                if start_idx >= 0 and end_idx > start_idx:
-                    # 提取JSON部分
-                    json_content = content[start_idx:end_idx]
-                    result = json.loads(json_content)
-                else:
-                    # 如果找不到JSON标记，尝试直接解析
-                    result = json.loads(content)
-                
-                # 检查是否包含questions字段，或者尝试适配其他可能的字段名
-                if "questions" not in result:
-                    # 尝试常见的替代字段名
-                    alternative_fields = ["speaking_tasks", "tasks", "oral_practice", "exercises", "items"]
-                    for field in alternative_fields:
-                        if field in result and isinstance(result[field], list):
-                            log_debug(f"找到替代字段: {field}，将其映射到questions")
-                            result["questions"] = result[field]
-                            break
-                
-                # 尝试从其他字段构建questions
-                if "questions" not in result:
-                    # 检查是否直接是一个问题列表
-                    if isinstance(result, list) and len(result) > 0:
-                        if all(isinstance(item, dict) for item in result):
-                            log_debug("API返回直接是问题列表，将其包装到questions字段")
-                            return {"questions": result}
-                    
-                    # 检查是否有题目相关字段但没有按预期格式
-                    questions_data = []
-                    for key, value in result.items():
-                        if isinstance(value, dict) and "prompt" in value:
-                            q_type = value.get("type", "retell")
-                            questions_data.append({
-                                "type": q_type,
-                                "prompt": value["prompt"],
-                                "reference": value.get("reference", "Reference answer not provided")
-                            })
-                    
-                    if questions_data:
-                        log_debug(f"从非标准格式中构建了{len(questions_data)}个问题")
-                        return {"questions": questions_data}
-                
-                # 验证结果包含questions字段
-                if "questions" not in result or not result["questions"]:
-                    log_debug(f"API响应缺少questions字段 (尝试 {retry+1}/{max_retries})")
-                    log_debug(f"API响应内容: {content}")
-                    if retry < max_retries - 1:
-                        continue
-                    else:
-                        return generate_default_speaking_tasks(material, user_answers, score)
-                
-                # 成功解析
-                log_debug(f"成功生成口语任务，共{len(result['questions'])}个问题")
+            # 重试时跳过缓存，重新生成一次无法解析的响应
+            response = call_deepseek_api(prompt, system_prompt, cache_ttl=SPEAKING_TASKS_CACHE_TTL, refresh=retry > 0)
+            result = parse_speaking_tasks_response(response, retry, max_retries)
+            if result is not None:
                 return result
-                
-            except json.JSONDecodeError as e:
-                log_debug(f"解析JSON失败 (尝试 {retry+1}/{max_retries}): {str(e)}")
-                log_debug(f"JSON内容: {content}")
-                if retry < max_retries - 1:
-                    continue
-                else:
-                    return generate_default_speaking_tasks(material, user_answers, score)
-        
+            if is_fallback_response(response):
+                # 上游不可用时api_client已经用完了时间预算，不再重复调用
+                break
         except Exception as e:
             log_debug(f"生成口语任务时出错 (尝试 {retry+1}/{max_retries}): {str(e)}")
-            if retry < max_retries - 1:
-                continue
-            else:
-                return generate_default_speaking_tasks(material, user_answers, score)
     
     # 如果所有尝试都失败
     return generate_default_speaking_tasks(material, user_answers, score)
 
+async def agenerate_speaking_tasks(material: Dict[str, Any], user_answers: List[Dict[str, Any]] = None, score: int = None) -> Dict[str, Any]:
+    """基于听力材料生成口语任务（异步版本），参数和返回值与generate_speaking_tasks相同"""
+    log_debug(f"开始生成口语任务，材料ID: {material.get('id', '未知')}")
+    prompt, system_prompt = build_speaking_tasks_prompt(material, user_answers, score)
+    
+    max_retries = 2
+    for retry in range(max_retries):
+        try:
+            log_debug(f"调用DeepSeek API生成口语任务 (尝试 {retry+1}/{max_retries})")
+            # 重试时跳过缓存，重新生成一次无法解析的响应
+            response = await acall_deepseek_api(prompt, system_prompt, cache_ttl=SPEAKING_TASKS_CACHE_TTL, refresh=retry > 0)
+            result = parse_speaking_tasks_response(response, retry, max_retries)
+            if result is not None:
+                return result
+            if is_fallback_response(response):
+                # 上游不可用时api_client已经用完了时间预算，不再重复调用
+                break
+        except Exception as e:
+            log_debug(f"生成口语任务时出错 (尝试 {retry+1}/{max_retries}): {str(e)}")
+    
+    return generate_default_speaking_tasks(material, user_answers, score)
+
 def generate_default_speaking_tasks(material: Dict[str, Any], user_answers: List[Dict[str, Any]] = None, score: int = None) -> Dict[str, Any]:
     """
     生成默认的口语任务，当API调用失败时使用
@@ -317,20 +356,13 @@ def generate_default_speaking_tasks(material: Dict[str, Any], user_answers: List
         "questions": questions
     }
 
-def evaluate_speaking(audio_data: str, question: str, reference_answer: Optional[str] = None) -> Dict[str, Any]:
+def build_speaking_evaluation_prompt(audio_data: str, question: str, reference_answer: Optional[str] = None) -> Tuple[str, str]:
     """
-    评估用户的口语
+    构建口语评估的提示词
     
-    Args:
-        audio_data: 音频数据（Base64编码）
-        question: 口语问题
-        reference_answer: 参考答案（可选）
-        
     Returns:
-        dict: 评估结果，包含发音、流利度和内容准确性评价
+        tuple: (提示词, 系统提示词)
     """
-    log_debug(f"开始评估口语回答，问题: {question[:30]}...")
-    
     # 在实际项目中，需要处理音频数据，可能需要转录为文本
     # 这里假设已经有了转录文本，简化处理
     # 在实际项目中可以考虑使用DeepSeek的语音识别API或其他服务
@@ -350,8 +382,10 @@ def evaluate_speaking(audio_data: str, question: str, reference_answer: Optional
         prompt += f"\n参考答案：{reference_answer}"
     
     system_prompt = "你是一个专业的英语口语评估师，请对用户的口语表现给出客观、全面的评价，并提供有针对性的改进建议。"
-    
-    response = call_deepseek_api(prompt, system_prompt)
+    return prompt, system_prompt
+
+def parse_speaking_evaluation_response(response: Dict[str, Any]) -> Dict[str, Any]:
+    """解析口语评估的响应，无法解析时返回默认结果"""
     
     try:
         content = response["choices"][0]["message"]["content"]
@@ -376,3 +410,27 @@ def evaluate_speaking(audio_data: str, question: str, reference_answer: Optional
                 "改进建议3"
             ]
         }
+
+def evaluate_speaking(audio_data: str, question: str, reference_answer: Optional[str] = None) -> Dict[str, Any]:
+    """
+    评估用户的口语
+    
+    Args:
+        audio_data: 音频数据（Base64编码）
+        question: 口语问题
+        reference_answer: 参考答案（可选）
+        
+    Returns:
+        dict: 评估结果，包含发音、流利度和内容准确性评价
+    """
+    log_debug(f"开始评估口语回答，问题: {question[:30]}...")
+    prompt, system_prompt = build_speaking_evaluation_prompt(audio_data, question, reference_answer)
+    return parse_speaking_evaluation_response(
+        call_deepseek_api(prompt, system_prompt, cache_ttl=SPEAKING_EVALUATION_CACHE_TTL))
+
+async def aevaluate_speaking(audio_data: str, question: str, reference_answer: Optional[str] = None) -> Dict[str, Any]:
+    """评估用户的口语（异步版本），参数和返回值与evaluate_speaking相同"""
+    log_debug(f"开始评估口语回答，问题: {question[:30]}...")
+    prompt, system_prompt = build_speaking_evaluation_prompt(audio_data, question, reference_answer)
+    return parse_speaking_evaluation_response(
+        await acall_deepseek_api(prompt, system_prompt, cache_ttl=SPEAKING_EVALUATION_CACHE_TTL))
@@ -0,0 +1,141 @@
+"""
+流式响应的增量JSON解析
+模型流式输出一个JSON对象时，每收到一段文本就扫描新增的字符，顶层字段的值一完整就立即产出，
+不必等整个对象生成完毕。对expand中的字段（值为对象），不整体产出，而是每个成员完整时单独产出，
+例如学习反馈的mistakes_analysis中每道错题的分析。
+
+解析是宽容的：第一个 { 之前的内容（如 ```json 代码块标记）和顶层对象结束之后的内容都会被忽略；
+某个值无法解析时跳过该值，不影响后续字段。整体解析仍然以完整响应为准（见parse_feedback_response）。
+"""
+
+import json
+from typing import Any, Iterable, List, Optional, Tuple
+
+# 产出的事件：(字段路径, 值)，顶层字段的路径为(key,)，expand字段的成员为(key, 成员key)
+ParsedValue = Tuple[Tuple[str, ...], Any]
+
+_WHITESPACE = ' \t\r\n'
+
+
+class _Frame:
+    """正在扫描的一层对象或数组"""
+
+    __slots__ = ('kind', 'start', 'key', 'expect_key')
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind
+        self.start = start
+        self.key: Optional[str] = None
+        # 对象中下一个字符串是键还是值
+        self.expect_key = kind == '{'
+
+
+class IncrementalJSONParser:
+    """
+    增量JSON解析器
+
+    用法：
+        parser = IncrementalJSONParser(expand=('mistakes_analysis',))
+        for chunk in chunks:
+            for path, value in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self, expand: Iterable[str] = ()):
+        self.expand = frozenset(expand)
+        self.done = False
+        self._buffer = ''
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._scalar_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[ParsedValue]:
+        """
+        输入新收到的文本
+
+        Returns:
+            list: 本次新完成的值
+        """
+        if self.done or not chunk:
+            return []
+        self._buffer += chunk
+        events: List[ParsedValue] = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer) and not self.done:
+            char = buffer[i]
+            if not self._stack:
+                # 跳过顶层对象之前的内容
+                if char == '{':
+                    self._stack.append(_Frame('{', i))
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._end_string(i + 1, events)
+                i += 1
+                continue
+
+            frame = self._stack[-1]
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in _WHITESPACE or char in ',:':
+                self._end_scalar(i, events)
+                if char == ',' and frame.kind == '{':
+                    frame.expect_key = True
+            elif char in '{[':
+                self._stack.append(_Frame(char, i))
+            elif char in '}]':
+                self._end_scalar(i, events)
+                closed = self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                else:
+                    self._complete(closed.start, i + 1, events)
+            elif self._scalar_start is None:
+                self._scalar_start = i
+            i += 1
+        self._pos = i
+        return events
+
+    def _end_string(self, end: int, events: List[ParsedValue]):
+        frame = self._stack[-1]
+        if frame.kind == '{' and frame.expect_key:
+            try:
+                frame.key = json.loads(self._buffer[self._string_start:end])
+            except ValueError:
+                frame.key = None
+            frame.expect_key = False
+        else:
+            self._complete(self._string_start, end, events)
+
+    def _end_scalar(self, end: int, events: List[ParsedValue]):
+        if self._scalar_start is not None:
+            start, self._scalar_start = self._scalar_start, None
+            self._complete(start, end, events)
+
+    def _complete(self, start: int, end: int, events: List[ParsedValue]):
+        """一个值完整了：如果它是顶层字段或expand字段的成员，解析并产出"""
+        parent = self._stack[-1]
+        if parent.kind != '{' or parent.key is None:
+            return
+        if len(self._stack) == 1 and parent.key not in self.expand:
+            path: Tuple[str, ...] = (parent.key,)
+        elif len(self._stack) == 2 and self._stack[0].key in self.expand:
+            path = (self._stack[0].key, parent.key)
+        else:
+            return
+        try:
+            events.append((path, json.loads(self._buffer[start:end])))
+        except ValueError:
+            pass
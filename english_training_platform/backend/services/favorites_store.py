@@ -0,0 +1,198 @@
+"""
+用户收藏存储
+收藏保存在SQLite数据库中，以(user_id, material_id)为主键，每次添加、移除或查询只涉及
+一行记录。数据库使用WAL模式，多个gunicorn worker可以同时读取，写入由SQLite的锁串行化，
+不会像整体重写favorites.json那样丢失其他worker的更新。
+
+第一次打开数据库时，自动将旧的data/favorites.json导入（只导入一次，原文件保留不动）。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# 收藏数据库和旧的JSON文件（相对于后端运行目录）
+FAVORITES_DB_PATH = 'data/favorites.db'
+LEGACY_FAVORITES_PATH = 'data/favorites.json'
+
+# 批量查询时每条SQL语句绑定的材料ID数量上限（低于SQLite的参数数量限制）
+QUERY_BATCH_SIZE = 500
+
+# 等待其他连接释放写锁的最长时间（秒）
+DEFAULT_BUSY_TIMEOUT = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS favorites (
+    user_id TEXT NOT NULL,
+    material_id TEXT NOT NULL,
+    added_at INTEGER NOT NULL,
+    data TEXT,
+    PRIMARY KEY (user_id, material_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# (材料ID, 旧JSON文件中保存的完整材料)，通过接口添加的收藏只有材料ID
+FavoriteEntry = Tuple[str, Optional[Dict[str, Any]]]
+
+
+class FavoritesStore:
+    """
+    基于SQLite的收藏存储
+
+    每个线程持有自己的连接；建表和导入旧数据在第一次连接时进行，
+    通过写事务保证多个进程同时启动时也只导入一次。
+    """
+
+    def __init__(self, db_path: str = FAVORITES_DB_PATH, legacy_path: Optional[str] = LEGACY_FAVORITES_PATH,
+                 busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+        self.db_path = db_path
+        self.legacy_path = legacy_path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            # isolation_level=None：不使用隐式事务，需要事务时显式BEGIN
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            if not self._initialized:
+                with self._init_lock:
+                    if not self._initialized:
+                        self._initialize(conn)
+                        self._initialized = True
+        return conn
+
+    def _initialize(self, conn: sqlite3.Connection):
+        """建表，并在第一次使用时导入旧的favorites.json"""
+        conn.executescript(SCHEMA)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migrated = conn.execute("SELECT value FROM meta WHERE key = 'legacy_migrated'").fetchone()
+            if migrated is None:
+                count = self._import_legacy(conn)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_migrated', ?)", (str(int(time.time())),))
+                if count:
+                    print(f"已从{self.legacy_path}导入{count}条收藏")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _import_legacy(self, conn: sqlite3.Connection) -> int:
+        """导入旧JSON文件中的收藏（{user_id: [material_id或完整材料, ...]}），保持原有顺序"""
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return 0
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取旧收藏文件失败，跳过导入: {self.legacy_path}, 错误: {str(e)}")
+            return 0
+        if not isinstance(legacy, dict):
+            return 0
+
+        base = time.time_ns()
+        rows = []
+        for user_id, entries in legacy.items():
+            for order, entry in enumerate(entries or []):
+                if isinstance(entry, dict):
+                    if 'id' not in entry:
+                        continue
+                    rows.append((str(user_id), str(entry['id']), base + order, json.dumps(entry, ensure_ascii=False)))
+                else:
+                    rows.append((str(user_id), str(entry), base + order, None))
+        conn.executemany(
+            "INSERT OR IGNORE INTO favorites (user_id, material_id, added_at, data) VALUES (?, ?, ?, ?)", rows
+        )
+        return len(rows)
+
+    def add(self, user_id: str, material_id: str) -> bool:
+        """
+        添加收藏
+
+        Returns:
+            bool: 是否新增了收藏（已收藏时返回False）
+        """
+        cursor = self._connection().execute(
+            "INSERT OR IGNORE INTO favorites (user_id, material_id, added_at) VALUES (?, ?, ?)",
+            (user_id, material_id, time.time_ns())
+        )
+        return cursor.rowcount > 0
+
+    def remove(self, user_id: str, material_id: str) -> bool:
+        """
+        移除收藏
+
+        Returns:
+            bool: 是否移除了收藏（未收藏时返回False）
+        """
+        cursor = self._connection().execute(
+            "DELETE FROM favorites WHERE user_id = ? AND material_id = ?", (user_id, material_id)
+        )
+        return cursor.rowcount > 0
+
+    def contains(self, user_id: str, material_id: str) -> bool:
+        """检查材料是否已被用户收藏"""
+        row = self._connection().execute(
+            "SELECT 1 FROM favorites WHERE user_id = ? AND material_id = ?", (user_id, material_id)
+        ).fetchone()
+        return row is not None
+
+    def contains_many(self, user_id: str, material_ids: Iterable[str]) -> Set[str]:
+        """
+        批量检查多个材料是否已被用户收藏
+
+        Returns:
+            set: 其中已收藏的材料ID
+        """
+        material_ids = list(dict.fromkeys(material_ids))
+        favorited: Set[str] = set()
+        conn = self._connection()
+        for start in range(0, len(material_ids), QUERY_BATCH_SIZE):
+            batch = material_ids[start:start + QUERY_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            rows = conn.execute(
+                f"SELECT material_id FROM favorites WHERE user_id = ? AND material_id IN ({placeholders})",
+                [user_id, *batch]
+            )
+            favorited.update(material_id for material_id, in rows)
+        return favorited
+
+    def list(self, user_id: str) -> List[FavoriteEntry]:
+        """
+        按收藏时间列出用户的收藏
+
+        Returns:
+            list: [(材料ID, 旧数据中保存的完整材料或None), ...]
+        """
+        rows = self._connection().execute(
+            "SELECT material_id, data FROM favorites WHERE user_id = ? ORDER BY added_at, material_id", (user_id,)
+        )
+        return [(material_id, json.loads(data) if data else None) for material_id, data in rows]
+
+
+_favorites_store: Optional[FavoritesStore] = None
+_favorites_store_lock = threading.Lock()
+
+
+def get_favorites_store() -> FavoritesStore:
+    """获取进程内共享的收藏存储（可通过环境变量FAVORITES_DB_PATH指定数据库路径）"""
+    global _favorites_store
+    if _favorites_store is None:
+        with _favorites_store_lock:
+            if _favorites_store is None:
+                _favorites_store = FavoritesStore(os.environ.get('FAVORITES_DB_PATH', FAVORITES_DB_PATH))
+    return _favorites_store
@@ -0,0 +1,65 @@
+"""
+文件读写工具
+提供文件变化检测用的签名，以及原子写入文件的方法。
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Optional, Tuple
+
+FileSignature = Optional[Tuple[int, int]]
+
+
+def file_signature(path: str) -> FileSignature:
+    """
+    获取文件签名，用于判断文件是否发生变化
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        (修改时间纳秒, 文件大小)，文件不存在时返回None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def atomic_write_json(path: str, data: Any, **dump_kwargs):
+    """
+    原子写入JSON文件：先写入同目录下的临时文件并落盘，再重命名覆盖目标文件
+
+    Args:
+        path: 目标文件路径
+        data: 要写入的数据
+        dump_kwargs: 传给json.dump的其他参数
+    """
+    with _atomic_open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+
+
+def atomic_write_bytes(path: str, data: bytes):
+    """原子写入二进制文件（方式同atomic_write_json）"""
+    with _atomic_open(path, 'wb') as f:
+        f.write(data)
+
+
+@contextmanager
+def _atomic_open(path: str, mode: str, **open_kwargs):
+    """打开同目录下的临时文件供写入，正常结束后落盘并重命名为目标文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp_path, mode, **open_kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
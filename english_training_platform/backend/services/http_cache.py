@@ -0,0 +1,155 @@
+"""
+材料接口的HTTP条件请求与压缩
+材料数据很少变化。响应体按（请求路径和参数, 数据文件签名）缓存，并在第一次生成时
+预先压缩出gzip/brotli版本；ETag是响应体的内容哈希加上压缩格式（每种编码的字节不同，
+各自有独立的强ETag），多个worker之间一致。
+客户端带If-None-Match或If-Modified-Since且数据未变化时直接返回304。
+"""
+
+import functools
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Response, request
+
+from services.file_utils import FileSignature
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只提供gzip
+    brotli = None
+
+# 小于该字节数的响应体不压缩
+MIN_COMPRESS_SIZE = 1024
+
+# 最多缓存的响应数量（按最近使用淘汰）
+MAX_CACHE_ENTRIES = 512
+
+# 只缓存这些状态码的响应，错误响应每次重新生成
+CACHEABLE_STATUS = (200, 404)
+
+
+class CachedResponse:
+    """一个已生成的响应体及其压缩版本"""
+
+    __slots__ = ('status', 'body', 'etag', 'variants')
+
+    def __init__(self, status: int, body: bytes):
+        self.status = status
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.variants: Dict[str, bytes] = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.variants['gzip'] = gzip.compress(body, compresslevel=6, mtime=0)
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(body, quality=5)
+
+    def choose_encoding(self) -> Optional[str]:
+        """按Accept-Encoding选择压缩格式，优先brotli"""
+        accepted = request.accept_encodings
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepted.quality(encoding) > 0:
+                return encoding
+        return None
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """某种压缩格式的ETag；未压缩的响应体直接使用内容哈希"""
+        return f"{self.etag}-{encoding}" if encoding else self.etag
+
+
+class ResponseCache:
+    """按最近使用淘汰的响应缓存"""
+
+    def __init__(self, max_entries: int = MAX_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[Any, ...], CachedResponse]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[Any, ...]) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple[Any, ...], entry: CachedResponse):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_response_cache = ResponseCache()
+
+
+def get_response_cache() -> ResponseCache:
+    """获取进程内共享的响应缓存"""
+    return _response_cache
+
+
+def _last_modified(signatures: Dict[str, FileSignature]) -> Optional[datetime]:
+    """数据文件中最近的修改时间"""
+    mtimes = [signature[0] for signature in signatures.values() if signature is not None]
+    if not mtimes:
+        return None
+    return datetime.fromtimestamp(max(mtimes) // 1_000_000_000, tz=timezone.utc)
+
+
+def conditional_json(signatures: Callable[[], Dict[str, FileSignature]]):
+    """
+    为返回JSON的视图函数添加ETag/Last-Modified条件请求、缓存和压缩
+
+    Args:
+        signatures: 返回视图所依赖数据文件签名的函数，签名变化时缓存失效
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            current = signatures()
+            version = tuple(sorted(current.items()))
+            key = (request.path, tuple(sorted(request.args.items(multi=True))), version)
+
+            entry = _response_cache.get(key)
+            if entry is None:
+                response = _to_response(view(*args, **kwargs))
+                if response.is_streamed:
+                    # 流式响应不缓存响应体，使用基于数据版本的弱ETag
+                    response.set_etag(hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:32], weak=True)
+                    response.last_modified = _last_modified(current)
+                    response.headers['Cache-Control'] = 'no-cache'
+                    return response.make_conditional(request)
+                if response.status_code not in CACHEABLE_STATUS:
+                    return response
+                entry = CachedResponse(response.status_code, response.get_data())
+                _response_cache.put(key, entry)
+
+            encoding = entry.choose_encoding()
+            response = Response(entry.variants[encoding] if encoding else entry.body,
+                                status=entry.status, mimetype='application/json')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            response.set_etag(entry.etag_for(encoding))
+            response.last_modified = _last_modified(current)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+def _to_response(result: Any) -> Response:
+    """将视图的返回值（响应或(响应, 状态码)）统一为Response对象"""
+    if isinstance(result, tuple):
+        response, status = result
+        response.status_code = status
+        return response
+    return result
@@ -0,0 +1,277 @@
+"""
+材料词汇难度画像
+离线统计每份材料及其每个段落的词汇特征：类符/形符比、生僻词比例（相对于词频表）、
+平均句长、平均音节数和语速估计。结果写入data/lexical_profiles.json，材料目录加载时
+将画像附加到材料摘要的lexical_profile字段，推荐和反馈可以直接使用这些数值。
+
+词频表为纯文本文件，每行一个单词，按出现频率从高到低排列；排名在--common-words之后
+或不在表中的单词视为生僻词。未提供词频表时使用整个语料自身的词频排名，
+此时词频排在后一半的单词视为生僻词。
+
+用法：
+    python -m services.lexical_profile
+    python -m services.lexical_profile --frequency-list data/word_frequency.txt --common-words 3000
+"""
+
+import argparse
+import os
+import re
+import struct
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from services.file_utils import atomic_write_json
+from services.material_catalog import LEXICAL_PROFILES_PATH, get_frontend_materials_path
+from services.material_db import collect_corpus
+
+# 画像文件格式版本
+PROFILE_VERSION = 1
+
+DEFAULT_FREQUENCY_LIST = 'data/word_frequency.txt'
+
+# 词频排名在此之后的单词视为生僻词
+DEFAULT_COMMON_WORDS = 3000
+
+# 使用语料自身的词频时，按词频排在前面的这一比例的单词视为常用词
+# （语料的词汇量通常小于--common-words，固定数量会让所有单词都成为常用词）
+CORPUS_COMMON_SHARE = 0.5
+
+# 每份材料保留的生僻词数量（按生僻程度排序），用于反馈中的词汇建议
+RARE_WORDS_LIMIT = 10
+
+WORD_PATTERN = re.compile(r"[a-z]+(?:'[a-z]+)?")
+SENTENCE_PATTERN = re.compile(r"[^.!?。！？]+")
+VOWEL_GROUP_PATTERN = re.compile(r"[aeiouy]+")
+
+# MPEG音频帧头中的比特率表（kbps），按(MPEG-1, MPEG-2/2.5)区分，只用于Layer III
+MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+
+def tokenize_words(text: str) -> List[str]:
+    """切分出小写的英文单词（忽略数字和中文）"""
+    return WORD_PATTERN.findall(text.lower())
+
+
+def count_syllables(word: str) -> int:
+    """按元音字母组估计单词的音节数，词尾不发音的e不计入"""
+    groups = len(VOWEL_GROUP_PATTERN.findall(word))
+    if word.endswith('e') and not word.endswith(('le', 'ee')) and groups > 1:
+        groups -= 1
+    return max(groups, 1)
+
+
+def load_frequency_ranks(path: str) -> Optional[Dict[str, int]]:
+    """
+    读取词频表
+
+    Returns:
+        dict: 单词 -> 排名（从0开始），文件不存在时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    ranks: Dict[str, int] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            # 兼容“单词 频次”格式，只取第一列
+            fields = line.split()
+            if fields:
+                ranks.setdefault(fields[0].lower(), len(ranks))
+    return ranks
+
+
+def corpus_frequency_ranks(texts: Iterable[str]) -> Dict[str, int]:
+    """使用语料自身的词频排名（没有外部词频表时使用）"""
+    counts = Counter()
+    for text in texts:
+        counts.update(tokenize_words(text))
+    return {word: rank for rank, (word, _) in enumerate(counts.most_common())}
+
+
+def mp3_duration(path: str) -> Optional[float]:
+    """
+    按第一个音频帧的比特率估计MP3时长（秒），对固定码率文件是准确的
+
+    Returns:
+        float: 时长，文件不存在或无法识别时返回None
+    """
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            tag = f.read(10)
+            offset = 0
+            if tag[:3] == b'ID3' and len(tag) == 10:
+                # 跳过ID3v2标签，标签长度是4个7位的字节
+                offset = 10 + ((tag[6] << 21) | (tag[7] << 14) | (tag[8] << 7) | tag[9])
+            f.seek(offset)
+            head = f.read(64 * 1024)
+    except OSError:
+        return None
+
+    for position in range(len(head) - 4):
+        header, = struct.unpack('>I', head[position:position + 4])
+        if header >> 21 != 0x7FF:
+            continue
+        version = (header >> 19) & 0x3
+        layer = (header >> 17) & 0x3
+        bitrate_index = (header >> 12) & 0xF
+        # 只处理Layer III，跳过保留值
+        if layer != 1 or version == 1 or bitrate_index in (0, 15):
+            continue
+        bitrate = MP3_BITRATES[1 if version == 3 else 2][bitrate_index]
+        return (size - offset - position) * 8 / (bitrate * 1000)
+    return None
+
+
+def profile_text(text: str, ranks: Dict[str, int], common_words: int,
+                 duration: Optional[float] = None) -> Dict[str, Any]:
+    """
+    计算一段文本的词汇特征
+
+    Args:
+        text: 文本
+        ranks: 单词 -> 词频排名
+        common_words: 常用词的数量，排名在此之后或不在词频表中的单词为生僻词
+        duration: 对应音频的时长（秒），用于计算语速；未知时为None
+
+    Returns:
+        dict: 词汇特征
+    """
+    words = tokenize_words(text)
+    sentence_lengths = np.fromiter((len(tokenize_words(sentence)) for sentence in SENTENCE_PATTERN.findall(text)),
+                                   dtype=np.int32)
+    sentence_lengths = sentence_lengths[sentence_lengths > 0]
+    if not words:
+        return {"tokens": 0, "types": 0, "type_token_ratio": 0.0, "rare_word_share": 0.0,
+                "words_per_sentence": 0.0, "syllables_per_word": 0.0, "speech_rate_wpm": None}
+
+    unknown = len(ranks)
+    word_ranks = np.fromiter((ranks.get(word, unknown) for word in words), dtype=np.int64, count=len(words))
+    syllables = np.fromiter((count_syllables(word) for word in words), dtype=np.int32, count=len(words))
+    rare = word_ranks >= common_words
+
+    return {
+        "tokens": len(words),
+        "types": len(set(words)),
+        "type_token_ratio": round(len(set(words)) / len(words), 4),
+        "rare_word_share": round(float(rare.mean()), 4),
+        "words_per_sentence": round(float(sentence_lengths.mean()), 2) if len(sentence_lengths) else float(len(words)),
+        "syllables_per_word": round(float(syllables.mean()), 3),
+        "speech_rate_wpm": round(len(words) / duration * 60, 1) if duration else None
+    }
+
+
+def rare_words(text: str, ranks: Dict[str, int], common_words: int, limit: int = RARE_WORDS_LIMIT) -> List[str]:
+    """按生僻程度（词频排名从低到高）列出文本中的生僻词"""
+    unknown = len(ranks)
+    candidates = {word for word in tokenize_words(text) if len(word) > 3 and "'" not in word}
+    ranked = sorted((word for word in candidates if ranks.get(word, unknown) >= common_words),
+                    key=lambda word: (-ranks.get(word, unknown), word))
+    return ranked[:limit]
+
+
+def material_duration(material: Dict[str, Any], source_dir: Optional[str], frontend_path: str) -> Optional[float]:
+    """材料音频的时长：优先使用材料中的duration字段（秒），其次估计音频文件的时长"""
+    if material.get('duration'):
+        try:
+            return float(material['duration'])
+        except (TypeError, ValueError):
+            pass
+    audio_file = material.get('audio_file')
+    if audio_file and source_dir:
+        return mp3_duration(os.path.join(frontend_path, source_dir, os.path.basename(audio_file)))
+    return None
+
+
+def build_profiles(frontend_path: Optional[str] = None, frequency_list: str = DEFAULT_FREQUENCY_LIST,
+                   common_words: int = DEFAULT_COMMON_WORDS) -> Dict[str, Any]:
+    """
+    统计所有材料的词汇画像
+
+    Args:
+        frontend_path: 前端材料目录
+        frequency_list: 词频表路径，不存在时使用语料自身的词频
+        common_words: 常用词数量
+
+    Returns:
+        dict: 画像文件的内容
+    """
+    frontend_path = frontend_path or get_frontend_materials_path()
+    materials, transcripts = collect_corpus(frontend_path)
+    transcripts_by_id = {item['transcript'].get('id'): item['transcript'] for item in transcripts}
+    # 有些目录中原文的ID与材料ID不一致，目录中只有一篇原文时按目录对应
+    transcripts_by_dir: Dict[str, List[Dict[str, Any]]] = {}
+    for item in transcripts:
+        transcripts_by_dir.setdefault(item['source_dir'], []).append(item['transcript'])
+
+    # 每份材料的段落：[(部分, 段落编号, 文本), ...]
+    passages_by_material: Dict[str, List[tuple]] = {}
+    for item in materials:
+        transcript = transcripts_by_id.get(item['detail']['id'])
+        if transcript is None and len(transcripts_by_dir.get(item['source_dir'], [])) == 1:
+            transcript = transcripts_by_dir[item['source_dir']][0]
+        transcript = transcript or {}
+        passages = []
+        for section in transcript.get('sections', []):
+            section_key = str(section.get('section', '')).upper() or None
+            for passage in section.get('passages', []):
+                content = passage.get('content') or ''
+                if content:
+                    passages.append((section_key, passage.get('passage_id'), content))
+        passages_by_material[item['detail']['id']] = passages
+
+    ranks = load_frequency_ranks(frequency_list)
+    source = frequency_list
+    if ranks is None:
+        print(f"未找到词频表 {frequency_list}，使用语料自身的词频排名")
+        # 多个材料共用同一篇原文时只统计一次
+        ranks = corpus_frequency_ranks({content for passages in passages_by_material.values()
+                                        for _, _, content in passages})
+        source = 'corpus'
+        common_words = min(common_words, int(len(ranks) * CORPUS_COMMON_SHARE))
+
+    profiles = {}
+    for item in materials:
+        material = item['detail']
+        passages = passages_by_material.get(material['id'], [])
+        if not passages:
+            continue
+        text = '\n'.join(content for _, _, content in passages)
+        duration = material_duration(material, item['source_dir'], frontend_path)
+        profiles[material['id']] = {
+            **profile_text(text, ranks, common_words, duration),
+            "rare_words": rare_words(text, ranks, common_words),
+            "passages": [{"section": section, "passage_id": passage_id, **profile_text(content, ranks, common_words)}
+                         for section, passage_id, content in passages]
+        }
+
+    return {
+        "version": PROFILE_VERSION,
+        "frequency_list": source,
+        "common_words": common_words,
+        "profiles": profiles
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='统计听力材料的词汇难度画像')
+    parser.add_argument('--materials-dir', default=None, help='前端材料目录，默认自动定位')
+    parser.add_argument('--output', default=LEXICAL_PROFILES_PATH, help='画像文件路径')
+    parser.add_argument('--frequency-list', default=DEFAULT_FREQUENCY_LIST, help='词频表（每行一个单词，按频率降序）')
+    parser.add_argument('--common-words', type=int, default=DEFAULT_COMMON_WORDS, help='常用词数量，其余视为生僻词')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = build_profiles(args.materials_dir, args.frequency_list, args.common_words)
+    atomic_write_json(args.output, data, indent=2)
+    elapsed = time.perf_counter() - start
+    print(f"词汇画像已生成: {args.output}，共{len(data['profiles'])}份材料 ({elapsed:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
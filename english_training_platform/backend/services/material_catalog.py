@@ -0,0 +1,848 @@
+"""
+听力材料目录缓存
+进程内共享的材料目录：首次访问时加载并合并所有材料文件，之后只有当某个文件的
+修改时间或大小发生变化时，才重新解析该文件并重建目录。
+"""
+
+import json
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from services.backend_materials import BACKEND_MATERIALS_PATH, BackendMaterialStore, get_backend_store
+from services.file_utils import FileSignature, file_signature
+
+# 离线统计的材料词汇画像（见services.lexical_profile）
+LEXICAL_PROFILES_PATH = 'data/lexical_profiles.json'
+
+# 两次检查文件状态之间的最小间隔（秒），避免每个请求都执行stat
+DEFAULT_CHECK_INTERVAL = 1.0
+
+
+def normalize_difficulty(difficulty: Any) -> str:
+    """规范化难度标签，如 cet4 -> CET4"""
+    return str(difficulty).strip().upper()
+
+
+def normalize_topic(topic: Any) -> str:
+    """规范化话题标签，用于不区分大小写的匹配"""
+    return str(topic).strip().lower()
+
+
+def get_material_topics(material: Dict[str, Any]) -> List[str]:
+    """获取材料的话题列表（兼容topics和旧的topic字段）"""
+    topics = material.get('topics')
+    if topics is None:
+        topics = material.get('topic', [])
+    if isinstance(topics, str):
+        topics = [topics]
+    return list(topics or [])
+
+
+def get_frontend_materials_path() -> str:
+    """获取前端材料目录的绝对路径"""
+    # 首先尝试从当前项目根目录获取路径
+    frontend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../frontend/public/materials'))
+    if not os.path.exists(frontend_path):
+        # 如果路径不存在，尝试从当前工作目录计算
+        frontend_path = os.path.abspath('frontend/public/materials')
+    return frontend_path
+
+
+# 只在详情中保留的字段；目录常驻内存的摘要记录不包含这些字段
+DETAIL_FIELDS = ('questions', 'transcript', 'vocabulary', 'sections')
+
+# 最多缓存的材料详情数量
+DEFAULT_DETAIL_CACHE_SIZE = 64
+
+# index.json中包含材料记录的列表
+INDEX_MATERIAL_KEYS = ('materials_details', 'latest_materials')
+
+# 材料详情的来源：(文件路径, 列表所在的键, 列表中的位置)，后端材料为('backend', 材料ID)
+DetailSource = Tuple[str, ...]
+
+
+def summarize_material(material: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    生成材料的摘要记录
+
+    去掉题目、原文等详情字段，并统计题目数量和各部分(section)的题目数。
+
+    Args:
+        material: 完整的材料记录
+
+    Returns:
+        dict: 摘要记录（新对象，不修改传入的材料）
+    """
+    summary = {key: value for key, value in material.items() if key not in DETAIL_FIELDS}
+    questions = material.get('questions')
+    if isinstance(questions, list):
+        section_counts: Dict[str, int] = {}
+        for question in questions:
+            section = str(question.get('section') or '').upper() if isinstance(question, dict) else ''
+            if section:
+                section_counts[section] = section_counts.get(section, 0) + 1
+        summary['question_count'] = len(questions)
+        summary['section_counts'] = section_counts
+    return summary
+
+
+class DetailCache:
+    """按最近使用淘汰的材料详情缓存"""
+
+    def __init__(self, max_entries: int = DEFAULT_DETAIL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[Dict[str, Any], Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, material_id: str, summary: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """获取详情；只有缓存时对应的摘要就是当前摘要时才命中"""
+        with self._lock:
+            entry = self._entries.get(material_id)
+            if entry is None or entry[0] is not summary:
+                return None
+            self._entries.move_to_end(material_id)
+            return entry[1]
+
+    def put(self, material_id: str, summary: Dict[str, Any], detail: Dict[str, Any]):
+        with self._lock:
+            self._entries[material_id] = (summary, detail)
+            self._entries.move_to_end(material_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, material_id: str):
+        with self._lock:
+            self._entries.pop(material_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MaterialIndex:
+    """
+    某一版本目录的材料列表及其二级索引
+
+    索引在目录加载时一次性构建：
+    - by_id: 材料ID -> 材料
+    - by_difficulty: 规范化难度 -> 有序的材料ID集合
+    - by_topic: 规范化话题 -> 有序的材料ID集合
+    有序集合使用dict实现，既保持目录顺序，又支持O(1)的成员判断。
+    - pools: 规范化难度 -> 材料ID元组，以及全部材料ID的元组all_ids，
+      用于按下标随机抽样（见services.assessment）
+    """
+
+    def __init__(self, materials: List[Dict[str, Any]]):
+        self.materials = materials
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_difficulty: Dict[str, Dict[str, None]] = {}
+        self.by_topic: Dict[str, Dict[str, None]] = {}
+
+        for material in materials:
+            material_id = material['id']
+            # 重复ID以第一次出现的材料为准，与原先线性查找的结果一致
+            if material_id in self.by_id:
+                continue
+            self.by_id[material_id] = material
+
+            if material.get('difficulty') is not None:
+                key = normalize_difficulty(material['difficulty'])
+                self.by_difficulty.setdefault(key, {})[material_id] = None
+
+            for topic in get_material_topics(material):
+                self.by_topic.setdefault(normalize_topic(topic), {})[material_id] = None
+
+        self._build_pools()
+
+    @classmethod
+    def restore(cls, materials: List[Dict[str, Any]], by_difficulty: Dict[str, Dict[str, None]],
+                by_topic: Dict[str, Dict[str, None]]) -> 'MaterialIndex':
+        """使用快照中已构建好的二级索引恢复，不重新计算"""
+        index = cls.__new__(cls)
+        index.materials = materials
+        index.by_id = {}
+        for material in materials:
+            index.by_id.setdefault(material['id'], material)
+        index.by_difficulty = by_difficulty
+        index.by_topic = by_topic
+        index._build_pools()
+        return index
+
+    def _build_pools(self):
+        """构建抽样池；整体替换，正在抽样的读取方继续使用旧的元组"""
+        self.pools: Dict[str, Tuple[str, ...]] = {key: tuple(members) for key, members in self.by_difficulty.items()}
+        self.all_ids: Tuple[str, ...] = tuple(self.by_id)
+        # 材料ID -> 在all_ids中的位置，用于游标分页
+        self.positions: Dict[str, int] = {material_id: position for position, material_id in enumerate(self.all_ids)}
+
+    def get(self, material_id: str) -> Optional[Dict[str, Any]]:
+        """根据ID获取材料"""
+        return self.by_id.get(material_id)
+
+    def filter(self, difficulty: Optional[str] = None, topic: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        按难度和话题筛选材料，多个条件之间为AND关系
+
+        Args:
+            difficulty: 难度等级（可选）
+            topic: 话题标签（可选）
+
+        Returns:
+            list: 符合条件的材料列表，保持目录顺序
+        """
+        facets = []
+        if difficulty is not None:
+            facets.append(self.by_difficulty.get(normalize_difficulty(difficulty), {}))
+        if topic is not None:
+            facets.append(self.by_topic.get(normalize_topic(topic), {}))
+
+        if not facets:
+            return list(self.materials)
+
+        # 从最小的集合出发，逐个检查是否属于其他集合
+        facets.sort(key=len)
+        smallest, others = facets[0], facets[1:]
+        results = [self.by_id.get(material_id) for material_id in smallest
+                   if all(material_id in other for other in others)]
+        # 并发的删除操作可能让某个ID暂时只存在于集合中
+        return [material for material in results if material is not None]
+
+    @staticmethod
+    def _facet_keys(material: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """获取材料所属的所有(索引名, 键)"""
+        keys = []
+        if material.get('difficulty') is not None:
+            keys.append(('difficulty', normalize_difficulty(material['difficulty'])))
+        for topic in get_material_topics(material):
+            keys.append(('topic', normalize_topic(topic)))
+        return keys
+
+    def _set_membership(self, facet: str, key: str, material_id: str, present: bool, copied: Set[Tuple[str, str]]):
+        """修改某个集合；集合在本次修改中第一次被改动时先复制，旧版本索引的读取方不受影响"""
+        facets = self.by_difficulty if facet == 'difficulty' else self.by_topic
+        members = facets.get(key)
+        if members is None or (facet, key) not in copied:
+            members = dict(members or {})
+            copied.add((facet, key))
+        if present:
+            members[material_id] = None
+        else:
+            members.pop(material_id, None)
+        if members:
+            facets[key] = members
+        else:
+            facets.pop(key, None)
+
+    def with_changes(self, upserts: List[Dict[str, Any]], removes: Iterable[str]) -> 'MaterialIndex':
+        """
+        在副本上批量应用新增/替换和删除，返回新的索引，当前索引保持不变
+
+        副本只复制ID映射和二级索引的外层字典，被修改的集合各复制一次；材料列表和抽样池
+        在全部修改完成后只重建一次。调用方整体替换索引，读取方要么看到旧版本，要么看到新版本。
+
+        Args:
+            upserts: 新增或替换的材料（已存在的ID保持原有位置，新ID追加在末尾）
+            removes: 删除的材料ID
+        """
+        index = MaterialIndex.__new__(MaterialIndex)
+        index.by_id = dict(self.by_id)
+        index.by_difficulty = dict(self.by_difficulty)
+        index.by_topic = dict(self.by_topic)
+        copied: Set[Tuple[str, str]] = set()
+
+        for material_id in removes:
+            old = index.by_id.pop(material_id, None)
+            if old is not None:
+                for facet, key in self._facet_keys(old):
+                    index._set_membership(facet, key, material_id, False, copied)
+
+        for material in upserts:
+            material_id = material['id']
+            old = index.by_id.get(material_id)
+            old_keys = self._facet_keys(old) if old is not None else []
+            new_keys = self._facet_keys(material)
+            for facet, key in old_keys:
+                if (facet, key) not in new_keys:
+                    index._set_membership(facet, key, material_id, False, copied)
+            index.by_id[material_id] = material
+            for facet, key in new_keys:
+                if (facet, key) not in old_keys:
+                    index._set_membership(facet, key, material_id, True, copied)
+
+        index.materials = list(index.by_id.values())
+        index._build_pools()
+        return index
+
+
+class MaterialCatalog:
+    """
+    材料目录
+
+    合并index.json、各材料目录下的materials.json以及后端材料存储，
+    解析结果常驻内存。每个被读取的文件都会记录签名，签名未变化的文件不会被重新解析。
+    后端材料与前端材料ID相同时，后端材料覆盖前端材料。
+
+    常驻内存的只有摘要记录（不含题目、原文等详情字段）；完整的详情通过get_detail
+    按需从来源文件读取，并保存在容量有限的LRU缓存中。存在词汇画像文件时，
+    画像附加在摘要的lexical_profile字段中。
+    """
+
+    def __init__(self, frontend_path: Optional[str] = None,
+                 backend_path: str = BACKEND_MATERIALS_PATH,
+                 check_interval: float = DEFAULT_CHECK_INTERVAL,
+                 detail_cache_size: int = DEFAULT_DETAIL_CACHE_SIZE,
+                 profiles_path: str = LEXICAL_PROFILES_PATH):
+        self.frontend_path = frontend_path
+        self.check_interval = check_interval
+        self.profiles_path = profiles_path
+        if backend_path == BACKEND_MATERIALS_PATH:
+            self.backend_store = get_backend_store()
+        else:
+            self.backend_store = BackendMaterialStore(backend_path)
+
+        self._lock = threading.RLock()
+        # 文件路径 -> (签名, 解析后的JSON数据)；材料文件只缓存其中的摘要记录
+        self._file_cache: Dict[str, Tuple[FileSignature, Any]] = {}
+        # 最近一次构建目录时读取过的文件及其签名
+        self._dependencies: Dict[str, FileSignature] = {}
+        self._index = MaterialIndex([])
+        # 前端材料ID -> 材料，删除后端覆盖的材料时用于恢复前端版本
+        self._frontend_materials: Dict[str, Dict[str, Any]] = {}
+        # 材料ID -> 详情来源
+        self._sources: Dict[str, DetailSource] = {}
+        self._frontend_sources: Dict[str, DetailSource] = {}
+        self._details = DetailCache(detail_cache_size)
+        # 材料ID -> 词汇画像
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._version = 0
+        self._loaded = False
+        self._last_check = 0.0
+
+    @property
+    def version(self) -> int:
+        """目录版本号，每次重建后递增"""
+        self.ensure_fresh()
+        return self._version
+
+    def file_signatures(self) -> Dict[str, FileSignature]:
+        """获取当前目录版本所依赖的文件及其签名"""
+        self.ensure_fresh()
+        return dict(self._dependencies)
+
+    def materials(self) -> List[Dict[str, Any]]:
+        """
+        获取当前目录中的所有材料
+
+        Returns:
+            list: 材料列表（共享对象，调用方不应修改）
+        """
+        return self.index().materials
+
+    def index(self) -> MaterialIndex:
+        """获取当前版本的材料索引"""
+        self.ensure_fresh()
+        return self._index
+
+    def get(self, material_id: str) -> Optional[Dict[str, Any]]:
+        """根据ID获取材料摘要"""
+        return self.index().get(material_id)
+
+    def get_detail(self, material_id: str) -> Optional[Dict[str, Any]]:
+        """
+        根据ID获取包含题目等详情字段的完整材料
+
+        Args:
+            material_id: 材料ID
+
+        Returns:
+            dict: 完整材料（共享对象，调用方不应修改），找不到时返回None
+        """
+        summary = self.get(material_id)
+        if summary is None:
+            return None
+        detail = self._details.get(material_id, summary)
+        if detail is not None:
+            return detail
+
+        record = self._load_detail(self._sources.get(material_id))
+        # 摘要中的字段（如difficulty_id）优先，与目录中看到的保持一致
+        detail = {**record, **summary} if record else summary
+        self._details.put(material_id, summary, detail)
+        return detail
+
+    def iter_details(self, after_id: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        按目录顺序逐个产出完整材料，用于离线编译、全量导出等批量场景
+
+        不经过详情缓存；连续来自同一文件的材料只读取一次该文件。
+
+        Args:
+            after_id: 游标，从该ID之后开始；ID不存在时不产出任何材料
+            limit: 产出数量上限（可选）
+        """
+        index = self.index()
+        sources = self._sources
+        files: Dict[str, Any] = {}
+        ids = index.all_ids
+        if after_id is not None:
+            position = index.positions.get(after_id)
+            if position is None or position >= len(ids) or ids[position] != after_id:
+                # 并发修改时all_ids和positions可能来自不同的版本
+                position = ids.index(after_id) if after_id in ids else None
+            if position is None:
+                return
+            ids = ids[position + 1:]
+        if limit is not None:
+            ids = ids[:limit]
+        for material_id in ids:
+            summary = index.by_id.get(material_id)
+            if summary is None:
+                # 遍历期间被删除的材料
+                continue
+            source = sources.get(summary['id'])
+            if source and source[0] != 'backend' and source[0] not in files:
+                # 只保留最近读取的一个文件
+                files.clear()
+            record = self._load_detail(source, files)
+            yield {**record, **summary} if record else summary
+
+    def _load_detail(self, source: Optional[DetailSource],
+                     files: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        从来源读取完整的材料记录（不经过文件缓存，避免常驻内存）
+
+        Args:
+            source: 详情来源
+            files: 可选，已解析文件的缓存（文件路径 -> 数据），批量读取时复用
+        """
+        if not source:
+            return None
+        if source[0] == 'backend':
+            return self.backend_store.materials().get(source[1])
+
+        path, key, position = source
+        try:
+            if files is not None and path in files:
+                data = files[path]
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if files is not None:
+                    files[path] = data
+            record = data[key][position]
+        except Exception as e:
+            print(f"读取材料详情失败: {path}, 错误: {str(e)}")
+            return None
+        return record if isinstance(record, dict) else None
+
+    def filter(self, difficulty: Optional[str] = None, topic: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按难度和话题筛选材料"""
+        return self.index().filter(difficulty=difficulty, topic=topic)
+
+    def reload_changed(self) -> Set[str]:
+        """
+        立即重新合并材料文件（仅重新解析发生变化的文件），只更新受影响的材料
+
+        摘要或详情来源变化、详情所在文件变化的材料视为受影响；新增的材料追加在末尾，
+        合并后的材料顺序与当前目录不一致时（如index.json调整了顺序）才整体替换索引。
+
+        Returns:
+            set: 受影响的材料ID；目录尚未加载时完整加载并返回全部材料ID
+        """
+        with self._lock:
+            if not self._loaded:
+                self._rebuild()
+                self._last_check = time.monotonic()
+                return set(self._index.by_id)
+
+            old_dependencies = self._dependencies
+            self._dependencies = {}
+            try:
+                materials, sources = self._merge_materials()
+            except Exception as e:
+                print(f"获取材料索引失败: {str(e)}")
+                print(traceback.format_exc())
+                # 保留上一版本的目录
+                self._dependencies = old_dependencies
+                return set()
+            self._last_check = time.monotonic()
+
+            changed_files = {path for path, signature in self._dependencies.items()
+                             if old_dependencies.get(path) != signature}
+            backend_changed = any(path in changed_files for path in self.backend_store.file_signatures())
+            merged: Dict[str, Dict[str, Any]] = {}
+            for material in materials:
+                merged.setdefault(material['id'], material)
+
+            affected = set()
+            for material_id in set(merged) | set(self._index.by_id):
+                source = sources.get(material_id)
+                if (merged.get(material_id) != self._index.by_id.get(material_id)
+                        or source != self._sources.get(material_id)
+                        or (source and (source[0] in changed_files
+                                        or (source[0] == 'backend' and backend_changed)))):
+                    affected.add(material_id)
+
+            if not affected and list(merged) == list(self._index.by_id):
+                return affected
+
+            # 在副本上应用全部变化；合并后的顺序与副本不一致时（如index.json调整了顺序）整体重建
+            index = self._index.with_changes([merged[material_id] for material_id in merged if material_id in affected],
+                                             [material_id for material_id in affected if material_id not in merged])
+            if list(merged) != list(index.by_id):
+                index = MaterialIndex(materials)
+            self._swap(index, sources, affected)
+            print(f"材料目录已更新 (版本 {self._version})，{len(affected)}个材料发生变化")
+            return affected
+
+    def _swap(self, index: MaterialIndex, sources: Dict[str, DetailSource], affected: Iterable[str]):
+        """
+        替换为新版本的索引和详情来源（调用方需持有锁）
+
+        先替换详情来源再替换索引：拿到新索引的读取方一定看到新来源；仍在使用旧索引的读取方
+        即使配上新来源，缓存的详情也以旧摘要为键，不会被新版本命中。
+        """
+        self._sources, self._index = sources, index
+        for material_id in affected:
+            self._details.discard(material_id)
+        self._version += 1
+
+    def apply_backend_change(self, material_id: str):
+        """
+        将后端材料的一次增删改直接应用到内存中的目录，不重新加载文件
+
+        Args:
+            material_id: 发生变化的材料ID
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            backend_material = self.backend_store.materials().get(material_id)
+            sources = dict(self._sources)
+            if backend_material is not None:
+                index = self._index.with_changes([self._with_profile(summarize_material(backend_material))], [])
+                sources[material_id] = ('backend', material_id)
+            elif material_id in self._frontend_materials:
+                index = self._index.with_changes([self._frontend_materials[material_id]], [])
+                sources[material_id] = self._frontend_sources[material_id]
+            else:
+                index = self._index.with_changes([], [material_id])
+                sources.pop(material_id, None)
+            self._swap(index, sources, [material_id])
+            # 本进程写入的文件变化已经应用，不需要再触发重建
+            self._dependencies.update(self.backend_store.file_signatures())
+
+    def export_state(self) -> Dict[str, Any]:
+        """导出当前版本的目录（合并后的材料、二级索引和依赖文件签名），用于生成快照"""
+        with self._lock:
+            self.ensure_fresh()
+            return {
+                "materials": self._index.materials,
+                "by_difficulty": self._index.by_difficulty,
+                "by_topic": self._index.by_topic,
+                "frontend_materials": list(self._frontend_materials.values()),
+                "sources": dict(self._sources),
+                "frontend_sources": dict(self._frontend_sources),
+                "profiles": dict(self._profiles),
+                "dependencies": dict(self._dependencies)
+            }
+
+    def restore_state(self, state: Dict[str, Any]) -> bool:
+        """
+        从快照恢复目录
+
+        Args:
+            state: export_state导出的数据
+
+        Returns:
+            bool: 是否已恢复；快照依赖的文件发生变化时返回False，目录保持不变
+        """
+        dependencies = state['dependencies']
+        if any(file_signature(path) != signature for path, signature in dependencies.items()):
+            return False
+
+        with self._lock:
+            self._index = MaterialIndex.restore(state['materials'], state['by_difficulty'], state['by_topic'])
+            self._frontend_materials = {}
+            for material in state['frontend_materials']:
+                self._frontend_materials.setdefault(material['id'], material)
+            self._sources = dict(state['sources'])
+            self._frontend_sources = dict(state['frontend_sources'])
+            self._profiles = dict(state['profiles'])
+            self._details.clear()
+            self._dependencies = dict(dependencies)
+            self._version += 1
+            self._loaded = True
+            self._last_check = time.monotonic()
+        print(f"材料目录已从快照加载 (版本 {self._version})，共{len(state['materials'])}个有效材料")
+        return True
+
+    def ensure_fresh(self):
+        """在检查间隔到期后校验文件签名，必要时重建目录"""
+        if self._loaded and time.monotonic() - self._last_check < self.check_interval:
+            return
+
+        with self._lock:
+            # 其他线程可能已经完成了检查
+            if self._loaded and time.monotonic() - self._last_check < self.check_interval:
+                return
+            if not self._loaded or self._is_stale():
+                self._rebuild()
+            self._last_check = time.monotonic()
+
+    def _is_stale(self) -> bool:
+        """判断依赖的文件是否有变化（新增、修改或删除）"""
+        return any(file_signature(path) != signature for path, signature in self._dependencies.items())
+
+    def _read_json(self, path: str, summarize: Tuple[str, ...] = ()) -> Any:
+        """
+        读取JSON文件，签名未变化时直接返回缓存的解析结果
+
+        Args:
+            path: 文件路径
+            summarize: 材料列表所在的键，这些列表中只缓存材料的摘要
+
+        Returns:
+            解析后的数据，文件不存在或解析失败时返回None
+        """
+        signature = file_signature(path)
+        self._dependencies[path] = signature
+        if signature is None:
+            self._file_cache.pop(path, None)
+            return None
+
+        cached = self._file_cache.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"读取材料文件失败: {path}, 错误: {str(e)}")
+            self._file_cache.pop(path, None)
+            return None
+
+        if summarize and isinstance(data, dict):
+            # 保持列表中的位置不变，详情按位置回到文件中读取
+            data = dict(data)
+            for key in summarize:
+                if isinstance(data.get(key), list):
+                    data[key] = [summarize_material(material) if isinstance(material, dict) else material
+                                 for material in data[key]]
+        self._file_cache[path] = (signature, data)
+        return data
+
+    def _rebuild(self):
+        """重新合并所有材料文件"""
+        self._dependencies = {}
+        try:
+            materials, sources = self._merge_materials()
+        except Exception as e:
+            print(f"获取材料索引失败: {str(e)}")
+            print(traceback.format_exc())
+            if self._loaded:
+                # 保留上一版本的目录
+                return
+            materials, sources = [], {}
+
+        # 先构建好完整的索引再整体替换，读取方不会看到构建到一半的索引
+        self._index = MaterialIndex(materials)
+        self._sources = sources
+        self._details.clear()
+        self._version += 1
+        self._loaded = True
+        print(f"材料目录已加载 (版本 {self._version})，共{len(materials)}个有效材料")
+
+    def _merge_materials(self) -> Tuple[List[Dict[str, Any]], Dict[str, DetailSource]]:
+        """
+        合并前端材料和后端材料，ID相同时后端材料覆盖前端材料
+
+        Returns:
+            tuple: (材料摘要列表, 材料ID -> 详情来源)
+        """
+        merged: Dict[str, Dict[str, Any]] = {}
+        sources: Dict[str, DetailSource] = {}
+        profiles_data = self._read_json(self.profiles_path)
+        self._profiles = profiles_data.get('profiles', {}) if isinstance(profiles_data, dict) else {}
+
+        for material, source in self._load_frontend_materials():
+            if material['id'] not in merged:
+                merged[material['id']] = self._with_profile(material)
+                sources[material['id']] = source
+        self._frontend_materials = dict(merged)
+        self._frontend_sources = dict(sources)
+
+        backend_materials = self.backend_store.materials()
+        self._dependencies.update(self.backend_store.file_signatures())
+        for material_id, material in backend_materials.items():
+            merged[material_id] = self._with_profile(summarize_material(material))
+            sources[material_id] = ('backend', material_id)
+
+        return list(merged.values()), sources
+
+    def _with_profile(self, summary: Dict[str, Any]) -> Dict[str, Any]:
+        """附加材料的词汇画像（返回新对象，不修改文件缓存中的摘要）"""
+        profile = self._profiles.get(summary['id'])
+        return {**summary, "lexical_profile": profile} if profile else summary
+
+    def _load_frontend_materials(self) -> List[Tuple[Dict[str, Any], DetailSource]]:
+        """按照index.json的各种结构依次尝试获取前端材料摘要及其详情来源"""
+        materials_index: List[Tuple[Dict[str, Any], DetailSource]] = []
+        frontend_path = self.frontend_path or get_frontend_materials_path()
+        index_path = os.path.join(frontend_path, 'index.json')
+        index_data = self._read_json(index_path, summarize=INDEX_MATERIAL_KEYS)
+
+        if index_data is not None:
+            difficulty_paths = self._difficulty_paths(frontend_path, index_data)
+            # 直接使用materials_details数据，这些数据已经包含了完整的材料信息
+            if index_data.get('materials_details'):
+                for position, material in enumerate(index_data['materials_details']):
+                    # 确保每个材料都有id字段
+                    if 'id' not in material:
+                        print(f"警告: 材料缺少id字段: {material}")
+                        continue
+                    materials_index.append(self._with_directory_detail(
+                        frontend_path, material, (index_path, 'materials_details', position), difficulty_paths))
+            else:
+                # 处理difficulties数据
+                for difficulty in index_data.get('difficulties', []):
+                    materials_path = difficulty_paths.get(normalize_difficulty(difficulty['id']))
+                    if not materials_path:
+                        continue
+                    materials_data = self._read_json(materials_path, summarize=('materials',))
+                    if not materials_data:
+                        continue
+
+                    for position, material in enumerate(materials_data.get('materials', [])):
+                        # 确保每个材料都有id字段
+                        if 'id' not in material:
+                            print(f"警告: 材料缺少id字段，添加id: {difficulty['id']}")
+                            material['id'] = difficulty['id']
+
+                        # 添加难度信息
+                        material['difficulty_id'] = difficulty['id']
+                        material['difficulty_name'] = difficulty['name']
+                        materials_index.append((material, (materials_path, 'materials', position)))
+
+            # 如果上面的方法都没有获取到材料，尝试直接从各个材料目录获取
+            if not materials_index:
+                available_ids = index_data.get('available_materials', [])
+                for material_id in available_ids:
+                    material_file = os.path.join(frontend_path, material_id, 'materials.json')
+                    material_data = self._read_json(material_file, summarize=('materials',))
+                    if not material_data:
+                        continue
+
+                    for position, material in enumerate(material_data.get('materials', [])):
+                        if 'id' not in material:
+                            material['id'] = material_id
+                        materials_index.append((material, (material_file, 'materials', position)))
+
+                # 如果仍然没有获取到材料，尝试从latest_materials获取
+                if not materials_index:
+                    for position, material in enumerate(index_data.get('latest_materials', [])):
+                        if 'id' in material and material['id'] in available_ids:
+                            materials_index.append(self._with_directory_detail(
+                                frontend_path, material, (index_path, 'latest_materials', position), difficulty_paths))
+        else:
+            print(f"材料索引文件不存在: {index_path}")
+
+        # 最终验证所有材料都有id字段
+        return [(material, source) for material, source in materials_index if 'id' in material]
+
+    @staticmethod
+    def _difficulty_paths(frontend_path: str, index_data: Dict[str, Any]) -> Dict[str, str]:
+        """index.json中difficulties各条目的ID（规范化后） -> materials.json的绝对路径"""
+        paths: Dict[str, str] = {}
+        for difficulty in index_data.get('difficulties') or []:
+            if not isinstance(difficulty, dict) or not difficulty.get('id') or not difficulty.get('materials_path'):
+                continue
+            relative = str(difficulty['materials_path']).lstrip('/')
+            # materials_path以/materials/开头，相对于前端public目录
+            if relative.startswith('materials/'):
+                relative = relative[len('materials/'):]
+            path = os.path.normpath(os.path.join(frontend_path, relative.replace('/', os.path.sep)))
+            paths.setdefault(normalize_difficulty(difficulty['id']), path)
+        return paths
+
+    def _with_directory_detail(self, frontend_path: str, material: Dict[str, Any], source: DetailSource,
+                               difficulty_paths: Dict[str, str]) -> Tuple[Dict[str, Any], DetailSource]:
+        """
+        index.json中的材料只有标题等信息，题目保存在材料目录的materials.json中。
+        依次在同名目录、difficulties中同ID条目的materials_path（目录名可能与ID不同，如2022_12_02）
+        以及材料难度对应的目录（如CET6/materials.json）中查找；找到记录时以其作为详情来源，并补充题目统计
+        """
+        material_id = str(material['id'])
+        for material_file, fallback_id in self._detail_files(frontend_path, material, difficulty_paths):
+            material_data = self._read_json(material_file, summarize=('materials',))
+            if not isinstance(material_data, dict):
+                continue
+            records = [(position, record) for position, record in enumerate(material_data.get('materials') or [])
+                       if isinstance(record, dict)]
+            match = next(((position, record) for position, record in records
+                          if str(record.get('id', material_id)) == material_id), None)
+            if match is None and len(records) == 1 and (
+                    fallback_id is None or normalize_difficulty(records[0][1].get('id', fallback_id)) == fallback_id):
+                # 目录中只有一份材料，记录的ID写法与index.json不一致（如2022_12_01、CET4）
+                match = records[0]
+            if match is None:
+                continue
+            position, record = match
+            counts = {key: record[key] for key in ('question_count', 'section_counts') if key in record}
+            return {**material, **counts}, (material_file, 'materials', position)
+        return material, source
+
+    @staticmethod
+    def _detail_files(frontend_path: str, material: Dict[str, Any],
+                      difficulty_paths: Dict[str, str]) -> List[Tuple[str, Optional[str]]]:
+        """
+        材料详情可能所在的文件
+
+        Returns:
+            list: [(文件路径, 难度目录ID), ...]；难度目录中只有ID与难度相同的单份记录才能代替找不到的材料，
+                  材料自己的目录中单份记录总可以代替
+        """
+        material_id = str(material['id'])
+        candidates: List[Tuple[str, Optional[str]]] = []
+        if not any(separator in material_id for separator in ('/', '\\', os.sep)) and material_id not in ('.', '..'):
+            candidates.append((os.path.join(frontend_path, material_id, 'materials.json'), None))
+        if normalize_difficulty(material_id) in difficulty_paths:
+            candidates.append((difficulty_paths[normalize_difficulty(material_id)], None))
+        difficulty = normalize_difficulty(material.get('difficulty') or '')
+        if difficulty in difficulty_paths:
+            candidates.append((difficulty_paths[difficulty], difficulty))
+
+        files: List[Tuple[str, Optional[str]]] = []
+        seen = set()
+        for path, fallback_id in candidates:
+            if path not in seen:
+                seen.add(path)
+                files.append((path, fallback_id))
+        return files
+
+    def materials_without_questions(self) -> List[str]:
+        """检查目录中每份材料的详情，返回找不到题目的材料ID"""
+        return [detail['id'] for detail in self.iter_details()
+                if not isinstance(detail.get('questions'), list) or not detail['questions']]
+
+
+_catalog: Optional[MaterialCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> MaterialCatalog:
+    """获取进程内共享的材料目录"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = MaterialCatalog()
+    return _catalog
@@ -0,0 +1,570 @@
+"""
+SQLite材料库
+将前端材料目录（index.json、各目录的materials.json和transcripts.json）以及后端
+data/materials.json编译成单个SQLite文件，包含材料、题目、选项、听力原文段落以及
+FTS5全文索引。部署时只需分发这一个文件，查询时直接走索引，不再逐请求解析JSON。
+
+构建：
+    python -m services.material_db --output data/materials.db
+
+启用：设置环境变量 MATERIALS_DB_PATH 指向构建好的数据库文件。
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.backend_materials import BACKEND_MATERIALS_PATH
+from services.file_utils import file_signature
+from services.material_catalog import (
+    MaterialCatalog,
+    get_frontend_materials_path,
+    get_material_topics,
+    normalize_difficulty,
+    normalize_topic,
+    summarize_material,
+)
+from services.transcript_store import DirectoryRecordStore, TranscriptStore, get_transcript_store
+
+# 数据库结构版本，结构变化时递增
+SCHEMA_VERSION = 1
+
+DEFAULT_DB_PATH = 'data/materials.db'
+
+SCHEMA = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE materials (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    in_catalog INTEGER NOT NULL,
+    title TEXT,
+    difficulty TEXT,
+    source_dir TEXT,
+    question_count INTEGER NOT NULL DEFAULT 0,
+    summary TEXT NOT NULL,
+    detail TEXT NOT NULL
+);
+CREATE INDEX idx_materials_catalog ON materials (in_catalog, position);
+CREATE INDEX idx_materials_difficulty ON materials (difficulty, position);
+
+CREATE TABLE material_topics (
+    topic TEXT NOT NULL,
+    material_id TEXT NOT NULL,
+    PRIMARY KEY (topic, material_id)
+) WITHOUT ROWID;
+
+CREATE TABLE questions (
+    material_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    question_id TEXT,
+    section TEXT,
+    question TEXT,
+    answer TEXT,
+    explanation TEXT,
+    PRIMARY KEY (material_id, position)
+);
+CREATE INDEX idx_questions_section ON questions (section);
+
+CREATE TABLE options (
+    material_id TEXT NOT NULL,
+    question_position INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    text TEXT,
+    PRIMARY KEY (material_id, question_position, label)
+);
+
+CREATE TABLE transcripts (
+    id TEXT PRIMARY KEY,
+    source_dir TEXT,
+    title TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE passages (
+    transcript_id TEXT NOT NULL,
+    section TEXT NOT NULL,
+    passage_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    content TEXT,
+    PRIMARY KEY (transcript_id, section, passage_id)
+);
+
+CREATE VIRTUAL TABLE corpus_fts USING fts5(
+    kind UNINDEXED,
+    material_id UNINDEXED,
+    ref UNINDEXED,
+    body,
+    tokenize = 'unicode61'
+);
+"""
+
+OPTION_PATTERN = re.compile(r'^\s*([A-Za-z])\s*[\.\)）．、]\s*(.*)$', re.S)
+
+
+def split_option(option: Any, position: int) -> Tuple[str, str]:
+    """
+    拆分选项标签和内容，如 "A. Cardboard beds" -> ("A", "Cardboard beds")
+
+    Args:
+        option: 选项文本
+        position: 选项在列表中的位置，无法解析标签时用于推断标签
+
+    Returns:
+        (标签, 内容)
+    """
+    text = str(option)
+    match = OPTION_PATTERN.match(text)
+    if match:
+        return match.group(1).upper(), match.group(2).strip()
+    return chr(ord('A') + position), text.strip()
+
+
+def list_material_directories(frontend_path: str) -> List[str]:
+    """列出材料根目录下的所有子目录（按名称排序）"""
+    if not os.path.isdir(frontend_path):
+        return []
+    return sorted(name for name in os.listdir(frontend_path)
+                  if os.path.isdir(os.path.join(frontend_path, name)))
+
+
+def find_transcript(transcript_id: str, frontend_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """按目录名顺序查找听力原文，与collect_corpus一致取第一份同ID的原文"""
+    directories = list_material_directories(frontend_path or get_frontend_materials_path())
+    return get_transcript_store().get_transcript(transcript_id, directories)
+
+
+def collect_corpus(frontend_path: Optional[str] = None,
+                   backend_path: str = BACKEND_MATERIALS_PATH) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    收集需要编译的材料和听力原文
+
+    目录中的材料（与material_manager返回的一致）排在最前，并用各目录materials.json
+    中同ID的完整记录补充题目等详细内容；只存在于目录文件中的材料追加在后面。
+
+    Args:
+        frontend_path: 前端材料目录
+        backend_path: 后端材料数据文件
+
+    Returns:
+        (材料列表, 听力原文列表)。材料项包含summary、detail和source_dir，
+        听力原文项包含transcript和source_dir
+    """
+    frontend_path = frontend_path or get_frontend_materials_path()
+    catalog = MaterialCatalog(frontend_path=frontend_path, backend_path=backend_path)
+    # 编译时需要同时持有所有目录的记录，不限制目录数量
+    material_store = DirectoryRecordStore('materials.json', 'materials', base_path=frontend_path, max_directories=None)
+    transcript_store = TranscriptStore(base_path=frontend_path, max_directories=None)
+
+    directory_materials: Dict[str, Tuple[Dict[str, Any], str]] = {}
+    transcripts: Dict[str, Dict[str, Any]] = {}
+    for directory in list_material_directories(frontend_path):
+        for material_id, material in material_store.directory_records(directory).items():
+            directory_materials.setdefault(material_id, (material, directory))
+        for transcript_id, transcript in transcript_store.directory_records(directory).items():
+            transcripts.setdefault(transcript_id, {"transcript": transcript, "source_dir": directory})
+
+    materials = []
+    seen = set()
+    for detail in catalog.iter_details():
+        summary = catalog.get(detail['id'])
+        if summary['id'] in seen:
+            continue
+        seen.add(summary['id'])
+        record, directory = directory_materials.get(summary['id'], ({}, None))
+        materials.append({
+            "summary": summary,
+            "detail": {**record, **detail},
+            "source_dir": directory,
+            "in_catalog": True
+        })
+
+    for material_id, (record, directory) in directory_materials.items():
+        if material_id in seen:
+            continue
+        seen.add(material_id)
+        materials.append({
+            "summary": summarize_material(record),
+            "detail": record,
+            "source_dir": directory,
+            "in_catalog": False
+        })
+
+    return materials, list(transcripts.values())
+
+
+def _insert_material(conn: sqlite3.Connection, position: int, item: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    写入一份材料及其话题、题目、选项和全文索引
+
+    Args:
+        conn: 数据库连接
+        position: 材料在目录中的位置
+        item: 包含summary、detail、source_dir和in_catalog的材料项
+
+    Returns:
+        (题目数量, 选项数量)
+    """
+    detail = item['detail']
+    material_id = detail['id']
+    questions = detail.get('questions') or []
+    difficulty = detail.get('difficulty')
+    conn.execute(
+        "INSERT INTO materials (id, position, in_catalog, title, difficulty, source_dir, question_count, summary, detail) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (material_id, position, int(item['in_catalog']), detail.get('title'),
+         normalize_difficulty(difficulty) if difficulty is not None else None,
+         item['source_dir'], len(questions),
+         json.dumps(item['summary'], ensure_ascii=False), json.dumps(detail, ensure_ascii=False))
+    )
+    # 话题以目录中的材料为准
+    for topic in set(normalize_topic(t) for t in get_material_topics(item['summary'])):
+        conn.execute("INSERT INTO material_topics (topic, material_id) VALUES (?, ?)", (topic, material_id))
+    conn.execute("INSERT INTO corpus_fts (kind, material_id, ref, body) VALUES ('material', ?, ?, ?)",
+                 (material_id, material_id, ' '.join(str(part) for part in [detail.get('title', '')] + get_material_topics(detail))))
+
+    option_count = 0
+    for question_position, question in enumerate(questions):
+        option_texts = []
+        for option_position, option in enumerate(question.get('options') or []):
+            label, text = split_option(option, option_position)
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO options (material_id, question_position, label, text) VALUES (?, ?, ?, ?)",
+                (material_id, question_position, label, text)
+            )
+            option_texts.append(text)
+            option_count += cursor.rowcount
+
+        conn.execute(
+            "INSERT INTO questions (material_id, position, question_id, section, question, answer, explanation) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (material_id, question_position, str(question.get('id', question_position + 1)),
+             question.get('section'), question.get('question'), question.get('answer'), question.get('explanation'))
+        )
+        conn.execute("INSERT INTO corpus_fts (kind, material_id, ref, body) VALUES ('question', ?, ?, ?)",
+                     (material_id, str(question_position), '\n'.join([str(question.get('question', ''))] + option_texts)))
+    return len(questions), option_count
+
+
+def _delete_material(conn: sqlite3.Connection, material_id: str):
+    """删除一份材料的所有行（听力原文不属于材料，保留）"""
+    conn.execute("DELETE FROM materials WHERE id = ?", (material_id,))
+    conn.execute("DELETE FROM material_topics WHERE material_id = ?", (material_id,))
+    conn.execute("DELETE FROM questions WHERE material_id = ?", (material_id,))
+    conn.execute("DELETE FROM options WHERE material_id = ?", (material_id,))
+    conn.execute("DELETE FROM corpus_fts WHERE material_id = ? AND kind IN ('material', 'question')", (material_id,))
+
+
+def _insert_transcript(conn: sqlite3.Connection, transcript: Dict[str, Any], source_dir: Optional[str]) -> int:
+    """
+    写入一篇听力原文及其段落和全文索引
+
+    Returns:
+        int: 写入的段落数量
+    """
+    transcript_id = transcript['id']
+    conn.execute("INSERT INTO transcripts (id, source_dir, title, data) VALUES (?, ?, ?, ?)",
+                 (transcript_id, source_dir, transcript.get('title'), json.dumps(transcript, ensure_ascii=False)))
+
+    passage_count = 0
+    position = 0
+    for section in transcript.get('sections', []):
+        section_key = str(section.get('section', '')).upper()
+        for passage in section.get('passages', []):
+            passage_id = str(passage.get('passage_id', position + 1))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO passages (transcript_id, section, passage_id, position, content) VALUES (?, ?, ?, ?, ?)",
+                (transcript_id, section_key, passage_id, position, passage.get('content'))
+            )
+            if cursor.rowcount:
+                conn.execute("INSERT INTO corpus_fts (kind, material_id, ref, body) VALUES ('passage', ?, ?, ?)",
+                             (transcript_id, f"{section_key}:{passage_id}", passage.get('content') or ''))
+                passage_count += 1
+            position += 1
+    return passage_count
+
+
+def _delete_transcript(conn: sqlite3.Connection, transcript_id: str):
+    """删除一篇听力原文的所有行"""
+    conn.execute("DELETE FROM transcripts WHERE id = ?", (transcript_id,))
+    conn.execute("DELETE FROM passages WHERE transcript_id = ?", (transcript_id,))
+    conn.execute("DELETE FROM corpus_fts WHERE material_id = ? AND kind = 'passage'", (transcript_id,))
+
+
+def compile_material_db(db_path: str = DEFAULT_DB_PATH, frontend_path: Optional[str] = None,
+                        backend_path: str = BACKEND_MATERIALS_PATH) -> Dict[str, int]:
+    """
+    编译SQLite材料库
+
+    先写入临时文件，完成后再原子替换目标文件，正在读取旧库的进程不受影响。
+
+    Args:
+        db_path: 输出的数据库文件路径
+        frontend_path: 前端材料目录
+        backend_path: 后端材料数据文件
+
+    Returns:
+        dict: 各类记录的数量统计
+    """
+    materials, transcripts = collect_corpus(frontend_path, backend_path)
+
+    directory = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{db_path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    stats = {"materials": 0, "questions": 0, "options": 0, "transcripts": 0, "passages": 0}
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+        conn.execute("INSERT INTO meta (key, value) VALUES ('built_at', ?)", (str(int(time.time())),))
+
+        for position, item in enumerate(materials):
+            question_count, option_count = _insert_material(conn, position, item)
+            stats["materials"] += 1
+            stats["questions"] += question_count
+            stats["options"] += option_count
+
+        for item in transcripts:
+            stats["passages"] += _insert_transcript(conn, item['transcript'], item['source_dir'])
+            stats["transcripts"] += 1
+
+        conn.commit()
+        conn.execute("INSERT INTO corpus_fts (corpus_fts) VALUES ('optimize')")
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    return stats
+
+
+class MaterialDatabase:
+    """
+    SQLite材料库的访问
+
+    每个线程持有自己的只读连接，查询全部走索引。通过接口增删改的后端材料由apply_material
+    直接写入材料库，与不使用材料库时的材料目录保持一致。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        获取当前线程的只读连接
+
+        重新编译材料库时新文件通过os.replace替换旧文件，已打开的连接仍然指向旧文件；
+        每个连接记录打开时的文件签名，签名变化后关闭旧连接并重新打开。
+        """
+        signature = file_signature(self.db_path)
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.signature != signature:
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True)
+            self._local.conn = conn
+            self._local.signature = signature
+        return conn
+
+    def apply_material(self, material_id: str, summary: Optional[Dict[str, Any]], detail: Optional[Dict[str, Any]]):
+        """
+        将一份材料的增删改写入材料库
+
+        Args:
+            material_id: 材料ID
+            summary: 材料目录中的摘要，材料已被删除时为None
+            detail: 完整材料，材料已被删除时为None
+        """
+        with self._write_lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                row = conn.execute("SELECT position, source_dir FROM materials WHERE id = ?", (material_id,)).fetchone()
+                _delete_material(conn, material_id)
+                if summary is not None and detail is not None:
+                    # 已有的材料保持原来的位置，新材料排在最后
+                    position = row[0] if row else conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM materials").fetchone()[0]
+                    _insert_material(conn, position, {
+                        "summary": summary,
+                        "detail": detail,
+                        "source_dir": row[1] if row else None,
+                        "in_catalog": True
+                    })
+                conn.commit()
+            finally:
+                conn.close()
+
+    def apply_transcript(self, transcript_id: str, transcript: Optional[Dict[str, Any]], source_dir: Optional[str]):
+        """
+        将一篇听力原文的增删改写入材料库
+
+        Args:
+            transcript_id: 听力原文ID
+            transcript: 听力原文，已被删除时为None
+            source_dir: 听力原文所在的材料子目录
+        """
+        with self._write_lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                _delete_transcript(conn, transcript_id)
+                if transcript is not None:
+                    _insert_transcript(conn, transcript, source_dir)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _material_query(self, difficulty: Optional[str], topic: Optional[str]) -> Tuple[str, List[Any]]:
+        """构建按难度/话题筛选目录材料的查询条件"""
+        sql = "FROM materials m"
+        params: List[Any] = []
+        if topic is not None:
+            sql += " JOIN material_topics t ON t.material_id = m.id AND t.topic = ?"
+            params.append(normalize_topic(topic))
+        sql += " WHERE m.in_catalog = 1"
+        if difficulty is not None:
+            sql += " AND m.difficulty = ?"
+            params.append(normalize_difficulty(difficulty))
+        return sql, params
+
+    def list_materials(self, difficulty: Optional[str] = None, topic: Optional[str] = None,
+                       limit: Optional[int] = None, offset: int = 0, detail: bool = False,
+                       after_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        按目录顺序列出材料，支持筛选和分页
+
+        Args:
+            difficulty: 难度等级（可选）
+            topic: 话题标签（可选）
+            limit: 返回数量上限（可选）
+            offset: 跳过的数量
+            detail: 是否返回包含题目的完整记录
+            after_id: 游标，只返回排在该材料之后的材料（可选）
+
+        Returns:
+            list: 材料列表
+        """
+        return list(self.iter_materials(difficulty, topic, limit, offset, detail, after_id))
+
+    def iter_materials(self, difficulty: Optional[str] = None, topic: Optional[str] = None,
+                       limit: Optional[int] = None, offset: int = 0, detail: bool = False,
+                       after_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """逐条读取材料（参数同list_materials），用于流式输出"""
+        column = 'detail' if detail else 'summary'
+        sql, params = self._material_query(difficulty, topic)
+        if after_id is not None:
+            # 游标不存在时子查询为NULL，不返回任何记录
+            sql += " AND m.position > (SELECT position FROM materials WHERE id = ?)"
+            params.append(after_id)
+        sql = f"SELECT m.{column} {sql} ORDER BY m.position LIMIT ? OFFSET ?"
+        params.extend([-1 if limit is None else limit, offset])
+        for row in self._connection().execute(sql, params):
+            yield json.loads(row[0])
+
+    def count_materials(self, difficulty: Optional[str] = None, topic: Optional[str] = None) -> int:
+        """统计符合条件的材料数量"""
+        sql, params = self._material_query(difficulty, topic)
+        return self._connection().execute(f"SELECT COUNT(*) {sql}", params).fetchone()[0]
+
+    def get_material(self, material_id: str, detail: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        根据ID获取材料
+
+        Args:
+            material_id: 材料ID
+            detail: 是否返回包含题目的完整记录（也可以获取不在目录中的材料）
+
+        Returns:
+            dict: 材料，找不到时返回None
+        """
+        if detail:
+            sql = "SELECT detail FROM materials WHERE id = ?"
+        else:
+            sql = "SELECT summary FROM materials WHERE id = ? AND in_catalog = 1"
+        row = self._connection().execute(sql, (material_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_transcript(self, material_id: str) -> Optional[Dict[str, Any]]:
+        """根据材料ID获取完整听力原文"""
+        row = self._connection().execute("SELECT data FROM transcripts WHERE id = ?", (material_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_passage(self, material_id: str, section: str, passage_id: Any) -> Optional[str]:
+        """获取听力原文中单个段落的内容"""
+        row = self._connection().execute(
+            "SELECT content FROM passages WHERE transcript_id = ? AND section = ? AND passage_id = ?",
+            (material_id, str(section).upper(), str(passage_id))
+        ).fetchone()
+        return row[0] if row else None
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        使用FTS5全文索引搜索材料、题目和段落
+
+        Args:
+            query: FTS5查询表达式
+            limit: 返回数量上限
+
+        Returns:
+            list: 搜索结果，按BM25相关度排序
+        """
+        rows = self._connection().execute(
+            "SELECT kind, material_id, ref, bm25(corpus_fts) AS rank FROM corpus_fts "
+            "WHERE corpus_fts MATCH ? ORDER BY rank LIMIT ?",
+            (query, limit)
+        )
+        return [{"kind": kind, "material_id": material_id, "ref": ref, "score": -rank}
+                for kind, material_id, ref, rank in rows]
+
+
+_material_db: Optional[MaterialDatabase] = None
+_material_db_lock = threading.Lock()
+
+
+def get_material_db() -> Optional[MaterialDatabase]:
+    """
+    获取SQLite材料库
+
+    Returns:
+        MaterialDatabase: 设置了MATERIALS_DB_PATH且文件存在时返回，否则返回None
+    """
+    global _material_db
+    db_path = os.environ.get('MATERIALS_DB_PATH')
+    if not db_path or not os.path.exists(db_path):
+        return None
+    if _material_db is None or _material_db.db_path != db_path:
+        with _material_db_lock:
+            if _material_db is None or _material_db.db_path != db_path:
+                _material_db = MaterialDatabase(db_path)
+    return _material_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description='将听力材料编译为SQLite材料库')
+    parser.add_argument('--output', default=DEFAULT_DB_PATH, help='输出的数据库文件路径')
+    parser.add_argument('--materials-dir', default=None, help='前端材料目录，默认自动定位')
+    parser.add_argument('--backend-materials', default=BACKEND_MATERIALS_PATH, help='后端材料数据文件')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = compile_material_db(args.output, args.materials_dir, args.backend_materials)
+    elapsed = time.perf_counter() - start
+    print(f"材料库已生成: {args.output} ({elapsed:.2f}s)")
+    for name, count in stats.items():
+        print(f"  {name}: {count}")
+
+
+if __name__ == '__main__':
+    main()
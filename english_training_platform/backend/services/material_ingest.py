@@ -0,0 +1,670 @@
+"""
+听力试卷文档导入
+解析各试卷目录中的Word文档(.docx)，提取Section A/B/C、段落、题目、选项、答案和听力原文，
+生成materials.json、transcripts.json以及index.json中的条目。
+
+多份试卷在进程池中并行解析。每份文档的内容哈希记录在清单文件中，文档未变化时直接跳过，
+新增一份试卷后重新导入整个目录只需解析这一份。
+
+每份试卷的难度单独确定：依次取清单中记录的难度、已有materials.json中的难度、命令行的--difficulty，
+最后根据文档文件名推断（如“四级”、“CET6”、2022_12_1_4.docx的_4后缀），都没有时为CET4。
+因此--difficulty只作用于还没有难度记录的新试卷，不会改写已导入试卷的难度。
+
+用法：
+    python -m services.material_ingest                  # 为新增的试卷生成JSON文件
+    python -m services.material_ingest --overwrite      # 覆盖手工维护的JSON文件
+    python -m services.material_ingest --difficulty CET6   # 新增试卷的难度
+    python -m services.material_ingest --output-dir /tmp/materials
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.file_utils import atomic_write_json
+from services.material_catalog import get_frontend_materials_path
+from services.material_db import list_material_directories
+
+# 解析逻辑变化时递增，使所有文档重新解析
+PARSER_VERSION = 1
+
+# 记录已导入文档哈希的清单文件（位于输出目录下）
+MANIFEST_FILENAME = '.ingest_manifest.json'
+
+DEFAULT_DIFFICULTY = 'CET4'
+DEFAULT_TOPICS = ['综合', '考试训练']
+
+SECTION_DESCRIPTIONS = {
+    'A': '新闻报道听力',
+    'B': '对话听力',
+    'C': '短文听力'
+}
+
+TRANSCRIPT_SUMMARY = '本听力测试包含三个部分：A部分为新闻报道听力，B部分为对话听力，C部分为短文听力。各部分均有相应的题目和选项。'
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+SECTION_PATTERN = re.compile(r'^Section\s+([A-D])\b', re.I)
+DIRECTIONS_PATTERN = re.compile(r'^Directions\s*[:：]\s*(.*)$', re.I)
+GROUP_PATTERN = re.compile(r'^Questions?\s+(\d+)(?:\s*(?:and|to|-|—)\s*(\d+))?\s+(?:are|is)\s+based', re.I)
+QUESTION_PATTERN = re.compile(r'^Q?(\d{1,2})\s*[\.．:：]\s*(.*)$')
+# 选项标记前不能是字母，避免把USA)之类的文字当成选项
+OPTION_PATTERN = re.compile(r'(?<![A-Za-z])([A-D])\s*[\)）]\s*(.*?)\s*(?=(?<![A-Za-z])[A-D]\s*[\)）]|$)')
+OPTION_START_PATTERN = re.compile(r'^[A-D]\s*[\)）]')
+ANSWER_PATTERN = re.compile(r'^答案\s*[:：]\s*([A-D])')
+TRANSCRIPT_PATTERN = re.compile(r'^原文\s*[:：]\s*(.*)$')
+ANSWER_KEY_ITEM_PATTERN = re.compile(r'(?:^|(?<=\s))(\d{1,2})\s*[\.．]\s*([A-D])(?![\)）\w])')
+# 答案汇总行第一题的题号有时会丢失，如“D 2. B 3. D ...”
+ANSWER_KEY_FIRST_PATTERN = re.compile(r'^([A-D])\s+2\s*[\.．]')
+APPENDIX_HEADER_PATTERN = re.compile(r'^(News Report|Conversation|Passage|Recording)\s+(One|Two|Three|Four|\d+)\b', re.I)
+
+# 从文档文件名推断难度
+DIFFICULTY_HINTS = (
+    (re.compile(r'六级|CET[-_ ]?6|_6$', re.I), 'CET6'),
+    (re.compile(r'四级|CET[-_ ]?4|_4$', re.I), 'CET4'),
+)
+
+CHINESE_MONTHS = ['一', '二', '三', '四', '五', '六', '七', '八', '九', '十', '十一', '十二']
+EXAM_NAMES = {'CET4': '四级', 'CET6': '六级'}
+
+
+def is_lock_file(filename: str) -> bool:
+    """Office打开文档时生成的锁文件（~$开头），不是有效的docx"""
+    return os.path.basename(filename).startswith('~$')
+
+
+def find_paper_document(directory_path: str) -> Optional[str]:
+    """
+    查找试卷目录中的Word文档
+
+    Args:
+        directory_path: 试卷目录
+
+    Returns:
+        str: 文档路径，没有有效文档时返回None
+    """
+    try:
+        names = sorted(os.listdir(directory_path))
+    except OSError:
+        return None
+
+    for name in names:
+        if not name.lower().endswith('.docx') or is_lock_file(name):
+            continue
+        path = os.path.join(directory_path, name)
+        if zipfile.is_zipfile(path):
+            return path
+    return None
+
+
+def infer_difficulty(path: str) -> Optional[str]:
+    """根据文档文件名推断难度，无法推断时返回None"""
+    name = os.path.splitext(os.path.basename(path))[0]
+    for pattern, difficulty in DIFFICULTY_HINTS:
+        if pattern.search(name):
+            return difficulty
+    return None
+
+
+def existing_difficulty(materials_path: str) -> Optional[str]:
+    """已有materials.json中材料的难度"""
+    data = _load_json(materials_path, {})
+    materials = data.get('materials') if isinstance(data, dict) else None
+    if materials and isinstance(materials[0], dict) and materials[0].get('difficulty'):
+        return str(materials[0]['difficulty'])
+    return None
+
+
+def paper_difficulty(path: str, recorded: Optional[Dict[str, Any]], materials_path: str,
+                     default: Optional[str] = None) -> str:
+    """
+    确定一份试卷的难度
+
+    Args:
+        path: 文档路径
+        recorded: 清单中的记录
+        materials_path: 输出的materials.json路径
+        default: 命令行指定的难度，只用于没有难度记录的试卷
+    """
+    return ((recorded or {}).get('difficulty') or existing_difficulty(materials_path) or default
+            or infer_difficulty(path) or DEFAULT_DIFFICULTY)
+
+
+def document_hash(path: str) -> str:
+    """计算文档内容哈希（包含解析器版本）"""
+    digest = hashlib.sha256(f"v{PARSER_VERSION}:".encode('utf-8'))
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_docx_paragraphs(path: str) -> List[str]:
+    """
+    读取docx中的所有段落文本
+
+    Args:
+        path: 文档路径
+
+    Returns:
+        list: 段落文本（已去除首尾空白，空段落保留为空字符串）
+    """
+    with zipfile.ZipFile(path) as archive:
+        root = ET.fromstring(archive.read('word/document.xml'))
+
+    paragraphs = []
+    for paragraph in root.iter(f'{WORD_NAMESPACE}p'):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f'{WORD_NAMESPACE}t':
+                parts.append(node.text or '')
+            elif node.tag == f'{WORD_NAMESPACE}tab':
+                parts.append(' ')
+        text = html.unescape(''.join(parts)).replace('\xa0', ' ')
+        paragraphs.append(text.strip())
+    return paragraphs
+
+
+def parse_options(text: str) -> List[Tuple[str, str]]:
+    """解析一行中的选项，一行中可能有多个选项，如“A) ... C) ...”"""
+    return [(letter, re.sub(r'\s+', ' ', content).strip()) for letter, content in OPTION_PATTERN.findall(text)]
+
+
+class PaperParser:
+    """
+    试卷文档解析器
+
+    支持两种排版：
+    1. 每道题的选项后跟“答案：X”，每组题最后是“原文：...”；
+    2. 题目之后是答案汇总行（1. D 2. B ...），文末按News Report One、Conversation One、
+       Passage One等标题附上听力原文和题干。
+    """
+
+    def __init__(self):
+        self.title = ''
+        self.sections: List[Dict[str, Any]] = []
+        self.groups: List[Dict[str, Any]] = []
+        self.questions: Dict[int, Dict[str, Any]] = {}
+        self.appendix: List[Dict[str, Any]] = []
+        self.mode: Optional[str] = None
+        self.current_question: Optional[Dict[str, Any]] = None
+
+    @property
+    def current_section(self) -> Optional[Dict[str, Any]]:
+        return self.sections[-1] if self.sections else None
+
+    @property
+    def current_group(self) -> Optional[Dict[str, Any]]:
+        return self.groups[-1] if self.groups else None
+
+    def feed(self, line: str):
+        """处理一个段落"""
+        if not line:
+            return
+        if not self.title:
+            self.title = line
+            return
+
+        match = SECTION_PATTERN.match(line)
+        if match and self.mode != 'appendix':
+            self.sections.append({"section": match.group(1).upper(), "introduction": []})
+            self.mode = 'section'
+            return
+
+        match = DIRECTIONS_PATTERN.match(line)
+        if match and self.current_section is not None:
+            self.current_section['introduction'].append(match.group(1))
+            self.mode = 'directions'
+            return
+
+        match = GROUP_PATTERN.match(line)
+        if match:
+            self._start_group(int(match.group(1)), int(match.group(2) or match.group(1)))
+            return
+
+        if self._feed_answer_key(line):
+            return
+
+        match = APPENDIX_HEADER_PATTERN.match(line)
+        if match:
+            self.appendix.append({"content": [], "numbers": []})
+            self.mode = 'appendix'
+            return
+
+        match = ANSWER_PATTERN.match(line)
+        if match:
+            self._assign_answer(match.group(1))
+            return
+
+        match = TRANSCRIPT_PATTERN.match(line)
+        if match and self.current_group is not None:
+            self.mode = 'transcript'
+            if match.group(1):
+                self.current_group['transcript'].append(match.group(1))
+            return
+
+        match = QUESTION_PATTERN.match(line)
+        if match and self._feed_question(int(match.group(1)), match.group(2)):
+            return
+
+        if OPTION_START_PATTERN.match(line) and self.mode == 'questions':
+            self._feed_option_line(line)
+            return
+
+        self._feed_text(line)
+
+    def _start_group(self, first: int, last: int):
+        if self.current_section is None:
+            self.sections.append({"section": 'A', "introduction": []})
+        self.groups.append({
+            "section": self.current_section['section'],
+            "first": first,
+            "last": last,
+            "numbers": [],
+            "transcript": []
+        })
+        self.current_question = None
+        self.mode = 'questions'
+
+    def _feed_answer_key(self, line: str) -> bool:
+        """答案汇总行，如“1. D 2. B 3. D ...”"""
+        items = ANSWER_KEY_ITEM_PATTERN.findall(line)
+        if len(items) < 5:
+            return False
+        first = ANSWER_KEY_FIRST_PATTERN.match(line)
+        if first:
+            items.insert(0, ('1', first.group(1)))
+        for number, answer in items:
+            question = self.questions.get(int(number))
+            if question is not None and not question['answer']:
+                question['answer'] = answer
+        self.mode = 'answer_key'
+        return True
+
+    def _assign_answer(self, answer: str):
+        """“答案：X”对应本组中第一道还没有答案的题"""
+        group = self.current_group
+        if group is None:
+            return
+        for number in group['numbers']:
+            question = self.questions[number]
+            if not question['answer']:
+                question['answer'] = answer
+                return
+
+    def _feed_question(self, number: int, rest: str) -> bool:
+        """处理以题号开头的段落，返回是否已处理"""
+        if OPTION_START_PATTERN.match(rest) and self.current_group is not None:
+            question = self.questions.get(number)
+            if question is None:
+                question = {
+                    "number": number,
+                    "section": self.current_group['section'],
+                    "question": '',
+                    "options": {},
+                    "answer": ''
+                }
+                self.questions[number] = question
+                self.current_group['numbers'].append(number)
+            self.current_question = question
+            self.mode = 'questions'
+            self._add_options(rest)
+            return True
+
+        if self.mode == 'appendix' and self.appendix:
+            question = self.questions.get(number)
+            if question is not None and not question['question']:
+                question['question'] = re.sub(r'\s+', ' ', rest).strip()
+            self.appendix[-1]['numbers'].append(number)
+            return True
+
+        return False
+
+    def _feed_option_line(self, line: str):
+        """没有题号的选项行；题号丢失时（如组标题后直接是“A) ...”）按顺序推断题号"""
+        group = self.current_group
+        starts_new = self.current_question is None or (line.lstrip()[0] == 'A' and 'A' in self.current_question['options'])
+        if starts_new and group is not None:
+            number = group['numbers'][-1] + 1 if group['numbers'] else group['first']
+            if number <= group['last'] and number not in self.questions:
+                self._feed_question(number, line)
+            return
+        if self.current_question is not None:
+            self._add_options(line)
+
+    def _add_options(self, text: str):
+        for letter, content in parse_options(text):
+            self.current_question['options'].setdefault(letter, content)
+
+    def _feed_text(self, line: str):
+        """普通文本：根据当前状态归入说明、原文或附录原文"""
+        if self.mode == 'directions' and self.current_section is not None:
+            self.current_section['introduction'].append(line)
+        elif self.mode == 'transcript' and self.current_group is not None:
+            self.current_group['transcript'].append(line)
+        elif self.mode == 'appendix' and self.appendix and not self.appendix[-1]['numbers']:
+            # 附录中题干之后的文字不属于原文
+            self.appendix[-1]['content'].append(line)
+
+    def _attach_appendix(self):
+        """将附录中的原文按题号（找不到题号时按顺序）对应到题组"""
+        for position, passage in enumerate(self.appendix):
+            group = None
+            for number in passage['numbers']:
+                group = next((g for g in self.groups if g['first'] <= number <= g['last']), None)
+                if group is not None:
+                    break
+            if group is None and position < len(self.groups):
+                group = self.groups[position]
+            if group is not None and not group['transcript']:
+                group['transcript'] = passage['content']
+
+    def result(self) -> Dict[str, Any]:
+        """返回解析结果"""
+        self._attach_appendix()
+        return {
+            "title": self.title,
+            "sections": [
+                {"section": section['section'], "introduction": ' '.join(section['introduction'])}
+                for section in self.sections
+            ],
+            "groups": self.groups,
+            "questions": self.questions
+        }
+
+
+def parse_paper(paragraphs: List[str]) -> Dict[str, Any]:
+    """解析试卷文档的段落"""
+    parser = PaperParser()
+    for paragraph in paragraphs:
+        parser.feed(paragraph)
+    return parser.result()
+
+
+def build_records(material_id: str, paper: Dict[str, Any],
+                  difficulty: str = DEFAULT_DIFFICULTY) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    将解析结果转换为materials.json和transcripts.json中的记录
+
+    Args:
+        material_id: 材料ID（目录名）
+        paper: parse_paper的返回值
+        difficulty: 难度级别
+
+    Returns:
+        (材料记录, 听力原文记录)
+    """
+    def question_record(number: int) -> Dict[str, Any]:
+        question = paper['questions'][number]
+        return {
+            "id": number,
+            "section": question['section'],
+            "question": question['question'],
+            "options": [f"{letter}) {text}" for letter, text in sorted(question['options'].items())],
+            "answer": question['answer'],
+            "explanation": ''
+        }
+
+    questions = [question_record(number) for number in sorted(paper['questions'])]
+    material = {
+        "id": material_id,
+        "title": paper['title'] or material_id,
+        "difficulty": difficulty,
+        "topics": list(DEFAULT_TOPICS),
+        "audio_file": f"{material_id}.mp3",
+        "transcript": TRANSCRIPT_SUMMARY,
+        "questions": questions,
+        "vocabulary": []
+    }
+
+    sections = []
+    for section in paper['sections']:
+        passages = []
+        for group in paper['groups']:
+            if group['section'] != section['section']:
+                continue
+            passages.append({
+                "passage_id": len(passages) + 1,
+                "content": '\n\n'.join(group['transcript']),
+                "questions": [
+                    {
+                        "question_id": record['id'],
+                        "question": record['question'],
+                        "options": record['options'],
+                        "answer": record['answer'],
+                        "explanation": ''
+                    }
+                    for record in map(question_record, group['numbers'])
+                ]
+            })
+        sections.append({
+            "section": section['section'],
+            "description": SECTION_DESCRIPTIONS.get(section['section'], ''),
+            "introduction": section['introduction'],
+            "passages": passages
+        })
+
+    transcript = {"id": material_id, "title": material['title'], "sections": sections}
+    return material, transcript
+
+
+def paper_warnings(material: Dict[str, Any]) -> List[str]:
+    """检查解析结果中缺失的内容"""
+    warnings = []
+    for question in material['questions']:
+        if len(question['options']) != 4:
+            warnings.append(f"第{question['id']}题有{len(question['options'])}个选项")
+        if not question['answer']:
+            warnings.append(f"第{question['id']}题缺少答案")
+    return warnings
+
+
+def ingest_document(material_id: str, path: str, difficulty: str = DEFAULT_DIFFICULTY) -> Dict[str, Any]:
+    """
+    解析单份试卷文档（在进程池中执行）
+
+    Returns:
+        dict: material、transcript和warnings
+    """
+    paper = parse_paper(read_docx_paragraphs(path))
+    material, transcript = build_records(material_id, paper, difficulty)
+    return {"material": material, "transcript": transcript, "warnings": paper_warnings(material)}
+
+
+def index_entry(material: Dict[str, Any]) -> Dict[str, Any]:
+    """生成index.json中difficulties数组的条目"""
+    material_id = material['id']
+    name = material['title']
+    match = re.match(r'^(\d{4})_(\d{1,2})(?:_(\d+))?$', material_id)
+    exam = EXAM_NAMES.get(material['difficulty'])
+    if match and exam and 1 <= int(match.group(2)) <= 12:
+        year, month, number = match.group(1), int(match.group(2)), match.group(3)
+        name = f"{year}年{exam}听力真题{CHINESE_MONTHS[month - 1]}月"
+        if number:
+            name += f"第{CHINESE_MONTHS[int(number) - 1] if int(number) <= 12 else number}套"
+
+    return {
+        "id": material_id,
+        "name": name,
+        "description": f"{name}，适合准备{exam or material['difficulty']}考试的学习者",
+        "materials_count": 1,
+        "materials_path": f"/materials/{material_id}/materials.json"
+    }
+
+
+def _load_json(path: str, default: Any) -> Any:
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"读取文件失败: {path}, 错误: {str(e)}")
+        return default
+
+
+def detail_entry(material: Dict[str, Any]) -> Dict[str, Any]:
+    """生成index.json中materials_details数组的条目（材料目录从这里读取材料列表）"""
+    return {
+        "id": material['id'],
+        "title": index_entry(material)['name'],
+        "difficulty": material['difficulty'],
+        "topics": list(material.get('topics') or [])
+    }
+
+
+def _merge_entries(items: List[Any], entries: List[Dict[str, Any]], overwrite: bool) -> bool:
+    """按id将条目合并到列表中，返回是否有变化"""
+    positions = {item.get('id'): position for position, item in enumerate(items) if isinstance(item, dict)}
+    changed = False
+    for entry in entries:
+        position = positions.get(entry['id'])
+        if position is None:
+            positions[entry['id']] = len(items)
+            items.append(entry)
+            changed = True
+        elif overwrite and items[position] != entry:
+            items[position] = entry
+            changed = True
+    return changed
+
+
+def _update_index(index_path: str, materials: List[Dict[str, Any]], overwrite: bool):
+    """将新试卷写入index.json的difficulties、materials_details和available_materials（保留已有条目和原有格式）"""
+    index = _load_json(index_path, {})
+    changed = _merge_entries(index.setdefault('difficulties', []), [index_entry(m) for m in materials], overwrite)
+    changed = _merge_entries(index.setdefault('materials_details', []), [detail_entry(m) for m in materials],
+                             overwrite) or changed
+
+    available = index.setdefault('available_materials', [])
+    for material in materials:
+        if material['id'] not in available:
+            available.append(material['id'])
+            changed = True
+
+    if changed:
+        atomic_write_json(index_path, index, indent=10)
+
+
+def ingest_materials(materials_dir: Optional[str] = None, output_dir: Optional[str] = None,
+                     workers: Optional[int] = None, overwrite: bool = False,
+                     difficulty: Optional[str] = None) -> Dict[str, int]:
+    """
+    并行导入材料目录下所有试卷文档
+
+    Args:
+        materials_dir: 前端材料目录，默认自动定位
+        output_dir: 输出目录，默认写回材料目录
+        workers: 进程数，默认为CPU核数
+        overwrite: 是否覆盖不是由导入生成的（手工维护的）JSON文件
+        difficulty: 新试卷的难度级别；已有难度记录的试卷保持原来的难度
+
+    Returns:
+        dict: 各类结果的数量
+    """
+    materials_dir = materials_dir or get_frontend_materials_path()
+    output_dir = output_dir or materials_dir
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    manifest = _load_json(manifest_path, {})
+    papers = manifest.setdefault('papers', {})
+
+    stats = {"documents": 0, "parsed": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+    pending: List[Tuple[str, str, str, str]] = []
+
+    for material_id in list_material_directories(materials_dir):
+        path = find_paper_document(os.path.join(materials_dir, material_id))
+        if path is None:
+            continue
+        stats['documents'] += 1
+
+        target = os.path.join(output_dir, material_id)
+        outputs_exist = all(os.path.exists(os.path.join(target, name)) for name in ('materials.json', 'transcripts.json'))
+        digest = document_hash(path)
+        recorded = papers.get(material_id)
+        level = paper_difficulty(path, recorded, os.path.join(target, 'materials.json'), difficulty)
+
+        if recorded and recorded.get('hash') == digest and recorded.get('difficulty') == level and outputs_exist:
+            stats['unchanged'] += 1
+            continue
+        if recorded is None and os.path.exists(os.path.join(target, 'materials.json')) and not overwrite:
+            print(f"跳过{material_id}：已存在手工维护的materials.json（使用--overwrite覆盖）")
+            stats['skipped'] += 1
+            continue
+        pending.append((material_id, path, digest, level))
+
+    def finish(material_id: str, path: str, digest: str, level: str, result: Dict[str, Any]):
+        target = os.path.join(output_dir, material_id)
+        atomic_write_json(os.path.join(target, 'materials.json'), {"materials": [result['material']]}, indent=4)
+        atomic_write_json(os.path.join(target, 'transcripts.json'), {"transcripts": [result['transcript']]}, indent=4)
+        papers[material_id] = {
+            "source": os.path.relpath(path, materials_dir),
+            "hash": digest,
+            "difficulty": level,
+            "questions": len(result['material']['questions'])
+        }
+        entries.append(result['material'])
+        stats['parsed'] += 1
+        print(f"已导入{material_id}：{len(result['material']['questions'])}道题")
+        for warning in result['warnings']:
+            print(f"  {material_id}: {warning}")
+
+    entries: List[Dict[str, Any]] = []
+    if len(pending) == 1 or workers == 1:
+        # 只有一份文档时不启动进程池
+        for material_id, path, digest, level in pending:
+            try:
+                finish(material_id, path, digest, level, ingest_document(material_id, path, level))
+            except Exception as e:
+                print(f"导入{material_id}失败: {path}, 错误: {str(e)}")
+                stats['failed'] += 1
+    elif pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(ingest_document, material_id, path, level): (material_id, path, digest, level)
+                for material_id, path, digest, level in pending
+            }
+            for future in as_completed(futures):
+                material_id, path, digest, level = futures[future]
+                try:
+                    finish(material_id, path, digest, level, future.result())
+                except Exception as e:
+                    print(f"导入{material_id}失败: {path}, 错误: {str(e)}")
+                    stats['failed'] += 1
+
+    if entries:
+        entries.sort(key=lambda material: material['id'])
+        _update_index(os.path.join(output_dir, 'index.json'), entries, overwrite)
+    if pending:
+        manifest['parser_version'] = PARSER_VERSION
+        atomic_write_json(manifest_path, manifest, indent=2)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='从Word试卷文档生成听力材料JSON文件')
+    parser.add_argument('--materials-dir', default=None, help='前端材料目录，默认自动定位')
+    parser.add_argument('--output-dir', default=None, help='输出目录，默认写回材料目录')
+    parser.add_argument('--workers', type=int, default=None, help='并行进程数，默认为CPU核数')
+    parser.add_argument('--difficulty', default=None,
+                        help='新试卷的难度级别，默认根据文件名推断；不影响已有难度记录的试卷')
+    parser.add_argument('--overwrite', action='store_true', help='覆盖手工维护的materials.json和transcripts.json')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = ingest_materials(args.materials_dir, args.output_dir, args.workers, args.overwrite, args.difficulty)
+    elapsed = time.perf_counter() - start
+    print(f"导入完成 ({elapsed:.2f}s)")
+    for name, count in stats.items():
+        print(f"  {name}: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,14 @@
 import json
 import os
-import glob
 from typing import Dict, List, Any
 
+from services.backend_materials import get_backend_store
+from services.material_catalog import get_catalog
+from services.material_db import get_material_db
+from services.question_table import invalidate_question_table
+from services.search_index import update_search_index
+from services.similarity_index import update_similarity_index
+
 def initialize_sample_materials():
     """初始化示例材料数据"""
     # 确保数据目录存在
@@ -15,143 +21,13 @@ def initialize_sample_materials():
 
 def get_all_materials():
     """获取所有可用的听力材料索引，用于推荐系统"""
-    materials_index = []
-    
-    try:
-        # 修正前端材料目录路径计算
-        # 首先尝试从当前项目根目录获取路径
-        frontend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../frontend/public/materials'))
-        if not os.path.exists(frontend_path):
-            # 如果路径不存在，尝试从当前工作目录计算
-            frontend_path = os.path.abspath('frontend/public/materials')
-            
-        print(f"使用前端材料目录路径: {frontend_path}")
-        index_path = os.path.join(frontend_path, 'index.json')
-        
-        if os.path.exists(index_path):
-            with open(index_path, 'r', encoding='utf-8') as f:
-                index_data = json.load(f)
-                
-            print(f"成功加载材料索引文件: {index_path}")
-            
-            # 直接使用materials_details数据，这些数据已经包含了完整的材料信息
-            if 'materials_details' in index_data and index_data['materials_details']:
-                print(f"从materials_details中获取材料，共{len(index_data['materials_details'])}个")
-                for material in index_data['materials_details']:
-                    # 确保每个材料都有id字段
-                    if 'id' not in material:
-                        print(f"警告: 材料缺少id字段: {material}")
-                        continue
-                    materials_index.append(material)
-                print(f"成功添加{len(materials_index)}个材料到索引")
-            else:
-                print("materials_details不存在或为空，尝试从difficulties获取")
-                
-                # 处理difficulties数据
-                for difficulty in index_data.get('difficulties', []):
-                    # 修正材料路径计算
-                    materials_path = os.path.join(frontend_path, difficulty['materials_path'].lstrip('/').replace('/', os.path.sep))
-                    # 如果路径中包含相对路径，需要进行规范化
-                    materials_path = os.path.normpath(materials_path)
-                    print(f"处理难度级别: {difficulty['id']}, 路径: {materials_path}")
-                    
-                    if os.path.exists(materials_path):
-                        try:
-                            with open(materials_path, 'r', encoding='utf-8') as f:
-                                materials_data = json.load(f)
-                                
-                            # 将材料添加到索引中
-                            materials_count = 0
-                            for material in materials_data.get('materials', []):
-                                # 确保每个材料都有id字段
-                                if 'id' not in material:
-                                    print(f"警告: 材料缺少id字段，添加id: {difficulty['id']}")
-                                    material['id'] = difficulty['id']
-                                
-                                # 添加难度信息
-                                material['difficulty_id'] = difficulty['id']
-                                material['difficulty_name'] = difficulty['name']
-                                materials_index.append(material)
-                                materials_count += 1
-                            print(f"从{difficulty['id']}添加了{materials_count}个材料")
-                        except Exception as e:
-                            print(f"读取材料文件失败: {materials_path}, 错误: {str(e)}")
-            
-            # 如果上面的方法都没有获取到材料，尝试直接从各个材料目录获取
-            if not materials_index:
-                print("尝试直接从各个材料目录获取")
-                # 从available_materials获取材料ID列表
-                available_ids = index_data.get('available_materials', [])
-                print(f"available_materials包含{len(available_ids)}个材料ID")
-                
-                # 遍历每个可用的材料ID，尝试从对应目录获取材料
-                for material_id in available_ids:
-                    material_dir = os.path.join(frontend_path, material_id)
-                    material_file = os.path.join(material_dir, 'materials.json')
-                    
-                    if os.path.exists(material_file):
-                        try:
-                            with open(material_file, 'r', encoding='utf-8') as f:
-                                material_data = json.load(f)
-                            
-                            if 'materials' in material_data and len(material_data['materials']) > 0:
-                                for material in material_data['materials']:
-                                    if 'id' not in material:
-                                        material['id'] = material_id
-                                    materials_index.append(material)
-                                print(f"从目录 {material_id} 添加了 {len(material_data['materials'])} 个材料")
-                        except Exception as e:
-                            print(f"读取材料文件失败: {material_file}, 错误: {str(e)}")
-                
-                # 如果仍然没有获取到材料，尝试从latest_materials获取
-                if not materials_index:
-                    print("尝试从latest_materials获取材料")
-                    latest_materials = index_data.get('latest_materials', [])
-                    print(f"latest_materials包含{len(latest_materials)}个材料")
-                    
-                    for material in latest_materials:
-                        if 'id' in material and material['id'] in available_ids:
-                            materials_index.append(material)
-                    
-                    print(f"从latest_materials添加了{len(materials_index)}个材料")
-        else:
-            print(f"材料索引文件不存在: {index_path}")
-            
-        # 如果没有从前端获取到材料，使用后端的材料数据
-        if not materials_index:
-            print("从后端获取材料数据")
-            if os.path.exists('data/materials.json'):
-                with open('data/materials.json', 'r', encoding='utf-8') as f:
-                    backend_materials = json.load(f)
-                    
-                # 确保每个材料都有id字段
-                for material in backend_materials:
-                    if 'id' not in material:
-                        print(f"警告: 后端材料缺少id字段: {material}")
-                        continue
-                    materials_index.append(material)
-                print(f"从后端添加了{len(materials_index)}个材料")
-        
-        # 最终验证所有材料都有id字段
-        valid_materials = []
-        for material in materials_index:
-            if 'id' in material:
-                valid_materials.append(material)
-            else:
-                print(f"警告: 过滤掉没有id字段的材料: {material}")
-        
-        materials_index = valid_materials
-        print(f"最终材料索引包含{len(materials_index)}个有效材料")
-        
-        # 打印所有材料的ID
-        material_ids = [m.get('id') for m in materials_index]
-        print(f"材料ID列表: {material_ids}")
-    except Exception as e:
-        print(f"获取材料索引失败: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        
-    return materials_index
+    # 配置了SQLite材料库时直接查询数据库
+    material_db = get_material_db()
+    if material_db:
+        return material_db.list_materials()
+    # 材料目录常驻内存，只有文件发生变化时才会重新解析
+    # 返回列表副本，避免调用方的增删操作影响共享目录
+    return list(get_catalog().materials())
 
 def get_materials_by_difficulty(difficulty: str) -> List[Dict[str, Any]]:
     """
@@ -163,8 +39,7 @@ def get_materials_by_difficulty(difficulty: str) -> List[Dict[str, Any]]:
     Returns:
         list: 符合难度要求的材料列表
     """
-    materials = get_all_materials()
-    return [m for m in materials if m.get('difficulty') == difficulty]
+    return filter_materials(difficulty=difficulty)
 
 def get_materials_by_topic(topic: str) -> List[Dict[str, Any]]:
     """
@@ -176,16 +51,48 @@ def get_materials_by_topic(topic: str) -> List[Dict[str, Any]]:
     Returns:
         list: 符合话题要求的材料列表
     """
-    materials = get_all_materials()
-    return [m for m in materials if topic.lower() in [t.lower() for t in m.get('topic', [])]]
+    return filter_materials(topic=topic)
+
+def filter_materials(difficulty: str = None, topic: str = None) -> List[Dict[str, Any]]:
+    """
+    按难度和话题组合筛选听力材料
+    
+    Args:
+        difficulty (str, optional): 难度等级
+        topic (str, optional): 话题标签
+        
+    Returns:
+        list: 同时满足所有条件的材料列表
+    """
+    material_db = get_material_db()
+    if material_db:
+        return material_db.list_materials(difficulty=difficulty, topic=topic)
+    return get_catalog().filter(difficulty=difficulty, topic=topic)
 
 def get_material_by_id(material_id: str) -> Dict[str, Any]:
-    """根据ID获取特定的听力材料"""
-    materials = get_all_materials()
-    for material in materials:
-        if material.get('id') == material_id:
-            return material
-    return None
+    """根据ID获取特定的听力材料（包含题目等详情字段）"""
+    material_db = get_material_db()
+    if material_db:
+        return material_db.get_material(material_id, detail=True)
+    return get_catalog().get_detail(material_id)
+
+def _apply_change(material_id: str):
+    """
+    后端材料增删改之后，更新内存中的目录和依赖它的索引
+
+    配置了SQLite材料库时，变化同样写入材料库，两种模式下读取到的材料保持一致。
+    """
+    catalog = get_catalog()
+    catalog.apply_backend_change(material_id)
+    # 删除后端材料可能恢复前端的同ID材料
+    detail = catalog.get_detail(material_id)
+    material_db = get_material_db()
+    if material_db:
+        material_db.apply_material(material_id, catalog.get(material_id), detail)
+    # 相似度索引和检索索引只更新这一份材料，不重建
+    update_similarity_index(material_id, detail)
+    update_search_index(material_id, detail)
+    invalidate_question_table()
 
 def add_material(material: Dict[str, Any]) -> bool:
     """
@@ -198,19 +105,20 @@ def add_material(material: Dict[str, Any]) -> bool:
         bool: 添加是否成功
     """
     try:
-        materials = get_all_materials()
+        if not material.get('id'):
+            print("材料缺少id字段")
+            return False
+
+        catalog = get_catalog()
         
         # 检查ID是否已存在
-        if any(m.get('id') == material.get('id') for m in materials):
+        if catalog.get(material.get('id')) is not None:
             print(f"材料ID '{material.get('id')}' 已存在")
             return False
         
-        # 添加新材料
-        materials.append(material)
-        
-        # 保存到文件
-        with open('data/materials.json', 'w', encoding='utf-8') as f:
-            json.dump(materials, f, ensure_ascii=False, indent=2)
+        # 只向变更日志追加这一条记录，并直接更新内存中的目录
+        get_backend_store().put(material)
+        _apply_change(material['id'])
         
         return True
     except Exception as e:
@@ -229,22 +137,24 @@ def update_material(material_id: str, updated_data: Dict[str, Any]) -> bool:
         bool: 更新是否成功
     """
     try:
-        materials = get_all_materials()
+        if not material_id:
+            print("材料ID不能为空")
+            return False
+
+        catalog = get_catalog()
+        # 在完整记录上修改，目录中的摘要不包含题目等详情字段
+        material = catalog.get_detail(material_id)
         
-        # 查找材料
-        for i, material in enumerate(materials):
-            if material.get('id') == material_id:
-                # 更新数据
-                materials[i].update(updated_data)
-                
-                # 保存到文件
-                with open('data/materials.json', 'w', encoding='utf-8') as f:
-                    json.dump(materials, f, ensure_ascii=False, indent=2)
-                
-                return True
+        if material is None:
+            print(f"找不到材料ID '{material_id}'")
+            return False
         
-        print(f"找不到材料ID '{material_id}'")
-        return False
+        # 复制后再修改，不直接改动目录中的共享对象；ID不允许被修改
+        # 前端材料被修改时，修改后的版本保存在后端并覆盖前端版本
+        get_backend_store().put({**material, **updated_data, 'id': material_id})
+        _apply_change(material_id)
+        
+        return True
     except Exception as e:
         print(f"更新材料时出错: {str(e)}")
         return False
@@ -260,21 +170,17 @@ def delete_material(material_id: str) -> bool:
         bool: 删除是否成功
     """
     try:
-        materials = get_all_materials()
+        backend_store = get_backend_store()
+        
+        # 前端目录中的材料文件不能通过接口删除
+        if material_id not in backend_store.materials():
+            print(f"找不到材料ID '{material_id}'")
+            return False
         
-        # 查找并删除材料
-        for i, material in enumerate(materials):
-            if material.get('id') == material_id:
-                del materials[i]
-                
-                # 保存到文件
-                with open('data/materials.json', 'w', encoding='utf-8') as f:
-                    json.dump(materials, f, ensure_ascii=False, indent=2)
-                
-                return True
+        backend_store.delete(material_id)
+        _apply_change(material_id)
         
-        print(f"找不到材料ID '{material_id}'")
-        return False
+        return True
     except Exception as e:
         print(f"删除材料时出错: {str(e)}")
-        return False 
\ No newline at end of file
+        return False
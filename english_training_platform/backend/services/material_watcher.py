@@ -0,0 +1,297 @@
+"""
+材料目录文件监视
+监视前端材料目录下的index.json以及各子目录中的materials.json、transcripts.json，
+检测到新增、修改或删除后只重新加载受影响的目录，并按材料ID更新材料目录、
+相似度索引和检索索引中受影响的条目，不整体重建。
+
+Linux下通过inotify接收文件事件（使用ctypes调用libc，无需额外依赖），
+其他平台或inotify不可用时退化为定时轮询文件签名。
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from services.file_utils import FileSignature, file_signature
+from services.material_catalog import get_catalog, get_frontend_materials_path
+from services.material_db import get_material_db, list_material_directories
+from services.search_index import update_search_index, update_search_transcript
+from services.similarity_index import update_similarity_index
+from services.transcript_store import get_material_store, get_transcript_store, is_safe_directory_name
+
+# 需要监视的文件名
+INDEX_FILENAME = 'index.json'
+DIRECTORY_FILENAMES = ('materials.json', 'transcripts.json')
+
+# 轮询模式下两次扫描的间隔（秒）
+DEFAULT_POLL_INTERVAL = 2.0
+
+# 收到第一个事件后等待的时间（秒），合并编辑器保存时产生的一连串事件
+DEFAULT_DEBOUNCE = 0.2
+
+# inotify事件掩码（见<sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MODIFY
+INOTIFY_EVENT = struct.Struct('iIII')
+
+# (变化的子目录集合, index.json是否变化)
+ChangeHandler = Callable[[Set[str], bool], None]
+
+
+def apply_material_changes(directories: Set[str], index_changed: bool):
+    """
+    将文件变化应用到进程内的材料缓存
+
+    只更新受影响的材料：材料目录按ID增删改，相似度索引和检索索引只替换这些材料
+    （以及发生变化的听力原文）的文档，不重建。题目表跟随材料目录的版本号重建。
+    配置了SQLite材料库（MATERIALS_DB_PATH）时，同样按ID写入材料库。
+
+    Args:
+        directories: 发生变化的材料子目录
+        index_changed: index.json是否变化
+    """
+    transcript_store = get_transcript_store()
+    material_store = get_material_store()
+    changed_transcripts: Set[str] = set()
+    changed_records: Set[str] = set()
+    for directory in sorted(directories):
+        changed_transcripts |= transcript_store.refresh(directory)
+        changed_records |= material_store.refresh(directory)
+
+    # 目录只重新解析签名变化的文件，并按ID更新受影响的材料
+    catalog = get_catalog()
+    affected = catalog.reload_changed()
+
+    material_db = get_material_db()
+    material_directories = list_material_directories(get_frontend_materials_path())
+    if material_db:
+        # 配置了SQLite材料库时变化同样写入材料库，与material_manager一致
+        for material_id in sorted(affected):
+            material_db.apply_material(material_id, catalog.get(material_id), catalog.get_detail(material_id))
+    # 相似度文本包含同ID的听力原文
+    for material_id in sorted(affected | {transcript_id for transcript_id in changed_transcripts
+                                          if catalog.get(transcript_id) is not None}):
+        update_similarity_index(material_id, catalog.get_detail(material_id))
+    for material_id in sorted(affected | changed_records):
+        detail = catalog.get_detail(material_id)
+        if detail is None:
+            # 与构建检索索引时一致，只存在于目录文件中、不在材料目录里的材料也参与检索
+            detail, _ = material_store.get(material_id, material_directories)
+        update_search_index(material_id, detail)
+    for transcript_id in sorted(changed_transcripts):
+        # 与构建索引时一致，按目录名顺序取第一份同ID的原文
+        transcript, directory = transcript_store.get(transcript_id, material_directories)
+        update_search_transcript(transcript_id, transcript)
+        if material_db:
+            material_db.apply_transcript(transcript_id, transcript, directory)
+
+    changed = ', '.join(sorted(directories)) or '-'
+    print(f"材料文件已更新 (目录: {changed}, index.json: {'是' if index_changed else '否'}, "
+          f"受影响的材料: {len(affected)}, 听力原文: {len(changed_transcripts)})")
+
+
+class _Inotify:
+    """通过ctypes调用libc的inotify接口"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or not libc_name:
+            raise OSError('当前平台不支持inotify')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1失败')
+        # 监视描述符 -> 子目录名（材料根目录为''）
+        self.watches: Dict[int, str] = {}
+
+    def add_watch(self, path: str, directory: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch失败: {path}')
+        self.watches[wd] = directory
+
+    def read_events(self, timeout: Optional[float]):
+        """
+        读取事件
+
+        Yields:
+            (子目录名, 文件名, 事件掩码)
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            wd, mask, _cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            directory = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+            if directory is not None:
+                yield directory, name, mask
+
+    def close(self):
+        os.close(self.fd)
+
+
+class MaterialWatcher:
+    """
+    材料目录监视器
+
+    在后台线程中运行，检测到变化后调用on_change（默认为apply_material_changes）。
+    """
+
+    def __init__(self, base_path: Optional[str] = None, on_change: Optional[ChangeHandler] = None,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, debounce: float = DEFAULT_DEBOUNCE,
+                 use_inotify: bool = True):
+        self.base_path = base_path or get_frontend_materials_path()
+        self.on_change = on_change or apply_material_changes
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.use_inotify = use_inotify
+        self.mode: Optional[str] = None
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._signatures: Dict[Tuple[str, str], FileSignature] = {}
+
+    def start(self):
+        """启动后台监视线程"""
+        if self._thread is not None:
+            return
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = self._setup_inotify()
+            except OSError as e:
+                print(f"inotify不可用，改为轮询材料目录: {str(e)}")
+        self.mode = 'inotify' if inotify else 'polling'
+        self._signatures = self._scan()
+
+        target = (lambda: self._run_inotify(inotify)) if inotify else self._run_polling
+        self._thread = threading.Thread(target=target, name='material-watcher', daemon=True)
+        self._thread.start()
+        print(f"材料目录监视已启动 ({self.mode}): {self.base_path}")
+
+    def stop(self):
+        """停止监视"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _subdirectories(self):
+        try:
+            names = os.listdir(self.base_path)
+        except OSError:
+            return []
+        return sorted(name for name in names
+                      if is_safe_directory_name(name) and os.path.isdir(os.path.join(self.base_path, name)))
+
+    def _scan(self) -> Dict[Tuple[str, str], FileSignature]:
+        """获取所有被监视文件的签名"""
+        signatures = {('', INDEX_FILENAME): file_signature(os.path.join(self.base_path, INDEX_FILENAME))}
+        for directory in self._subdirectories():
+            for filename in DIRECTORY_FILENAMES:
+                path = os.path.join(self.base_path, directory, filename)
+                signatures[(directory, filename)] = file_signature(path)
+        return signatures
+
+    def _diff(self) -> Tuple[Set[str], bool]:
+        """与上一次扫描结果比较，返回变化的子目录和index.json是否变化"""
+        current = self._scan()
+        changed = {key for key in set(current) | set(self._signatures)
+                   if current.get(key) != self._signatures.get(key)}
+        self._signatures = current
+        directories = {directory for directory, _ in changed if directory}
+        return directories, ('', INDEX_FILENAME) in changed
+
+    def _notify(self, directories: Set[str], index_changed: bool):
+        if not directories and not index_changed:
+            return
+        try:
+            self.on_change(directories, index_changed)
+        except Exception as e:
+            print(f"重新加载材料失败: {str(e)}")
+            print(traceback.format_exc())
+
+    def _run_polling(self):
+        while not self._stop.wait(self.poll_interval):
+            self._notify(*self._diff())
+
+    def _setup_inotify(self) -> _Inotify:
+        inotify = _Inotify()
+        try:
+            inotify.add_watch(self.base_path, '')
+            for directory in self._subdirectories():
+                inotify.add_watch(os.path.join(self.base_path, directory), directory)
+        except OSError:
+            inotify.close()
+            raise
+        return inotify
+
+    def _handle_events(self, inotify: _Inotify, timeout: Optional[float]) -> bool:
+        """读取一批inotify事件，返回其中是否有需要处理的变化"""
+        pending = False
+        for directory, name, mask in inotify.read_events(timeout):
+            if directory == '' and mask & IN_ISDIR:
+                # 新建的材料子目录也需要监视
+                if mask & (IN_CREATE | IN_MOVED_TO) and is_safe_directory_name(name):
+                    try:
+                        inotify.add_watch(os.path.join(self.base_path, name), name)
+                    except OSError as e:
+                        print(f"无法监视新目录: {name}, 错误: {str(e)}")
+                pending = True
+            elif name in DIRECTORY_FILENAMES or (directory == '' and name == INDEX_FILENAME) or mask & IN_DELETE_SELF:
+                pending = True
+        return pending
+
+    def _run_inotify(self, inotify: _Inotify):
+        try:
+            while not self._stop.is_set():
+                if self._handle_events(inotify, timeout=0.5):
+                    # 等待一连串事件结束后统一处理；以文件签名为准确定实际变化的文件
+                    time.sleep(self.debounce)
+                    self._handle_events(inotify, timeout=0)
+                    self._notify(*self._diff())
+        finally:
+            inotify.close()
+
+
+_watcher: Optional[MaterialWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def start_material_watcher(**kwargs) -> MaterialWatcher:
+    """启动进程内唯一的材料目录监视器（重复调用返回同一个实例）"""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = MaterialWatcher(**kwargs)
+            _watcher.start()
+    return _watcher
@@ -0,0 +1,90 @@
+"""
+列表接口的分页、字段投影和流式输出
+分页使用游标（上一页最后一条记录的ID），插入新记录不会导致翻页时重复或遗漏；
+全量导出时逐条编码输出，不在内存中拼出完整的JSON字符串。
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# 未指定limit时的每页数量，以及limit的上限
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+
+# 流式输出时每次产出的字符数下限，避免每条记录一次写入
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def encode_cursor(record_id: str) -> str:
+    """将记录ID编码为不透明的游标"""
+    return base64.urlsafe_b64encode(str(record_id).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> str:
+    """
+    解析游标
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return base64.b64decode(padded.encode('ascii'), altchars=b'-_', validate=True).decode('utf-8')
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError(f"无效的cursor: {cursor}") from e
+
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """
+    解析fields参数，如"id,title,difficulty"
+
+    Returns:
+        list: 字段列表（始终包含id），未指定时返回None表示返回全部字段
+    """
+    if not value:
+        return None
+    fields = ['id']
+    for field in value.split(','):
+        field = field.strip()
+        if field and field not in fields:
+            fields.append(field)
+    return fields
+
+
+def project(record: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """只保留指定的字段（记录中不存在的字段会被忽略）"""
+    if fields is None:
+        return record
+    return {field: record[field] for field in fields if field in record}
+
+
+def iter_json_array(records: Iterable[Dict[str, Any]], fields: Optional[List[str]] = None) -> Iterator[str]:
+    """
+    将记录逐条编码为JSON数组
+
+    Args:
+        records: 记录（可以是生成器）
+        fields: 字段投影（可选）
+
+    Yields:
+        str: JSON文本片段，拼接后是一个完整的数组
+    """
+    encoder = json.JSONEncoder(ensure_ascii=False)
+    buffer = ['[']
+    size = 1
+    first = True
+    for record in records:
+        chunk = encoder.encode(project(record, fields))
+        if not first:
+            buffer.append(',')
+        buffer.append(chunk)
+        size += len(chunk) + 1
+        first = False
+        if size >= STREAM_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    buffer.append(']')
+    yield ''.join(buffer)
@@ -0,0 +1,239 @@
+"""
+题目级索引
+将所有材料中嵌套的题目展开为一张按列存储的表（材料ID、题目ID、部分、难度、话题、答案），
+并按部分、难度和话题建立行号索引（升序的NumPy数组）。组卷时对索引求交集后直接随机抽取行号，
+不需要遍历每份材料；题目正文只对抽中的行从材料详情中读取。
+"""
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.material_catalog import (
+    MaterialCatalog,
+    get_catalog,
+    get_material_topics,
+    normalize_difficulty,
+    normalize_topic,
+)
+
+# 默认和最多返回的题目数量
+DEFAULT_DRILL_SIZE = 20
+MAX_DRILL_SIZE = 100
+
+
+def question_key(material_id: str, question_id: Any) -> Tuple[str, str]:
+    """题目在表中的唯一键"""
+    return (str(material_id), str(question_id))
+
+
+class QuestionTable:
+    """
+    按列存储的题目表
+
+    第i行的各列分别保存在material_ids[i]、positions[i]（题目在材料questions列表中的位置）、
+    question_ids[i]、sections[i]、difficulties[i]、answers[i]中；by_section、by_difficulty、
+    by_topic保存各取值对应的行号数组。
+    """
+
+    def __init__(self):
+        self.material_ids: List[str] = []
+        self.positions = np.zeros(0, dtype=np.int32)
+        self.question_ids: List[Any] = []
+        self.sections: List[Optional[str]] = []
+        self.difficulties: List[Optional[str]] = []
+        self.answers: List[Optional[str]] = []
+        self.by_section: Dict[str, np.ndarray] = {}
+        self.by_difficulty: Dict[str, np.ndarray] = {}
+        self.by_topic: Dict[str, np.ndarray] = {}
+        self.row_of: Dict[Tuple[str, str], int] = {}
+        self.rows_of_material: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.material_ids)
+
+    @classmethod
+    def build(cls, materials: Iterable[Dict[str, Any]]) -> 'QuestionTable':
+        """
+        从完整材料构建题目表
+
+        Args:
+            materials: 包含questions的完整材料
+
+        Returns:
+            QuestionTable: 构建好的表
+        """
+        table = cls()
+        positions: List[int] = []
+        facets: Dict[str, Dict[str, List[int]]] = {'section': {}, 'difficulty': {}, 'topic': {}}
+        material_rows: Dict[str, List[int]] = {}
+
+        for material in materials:
+            material_id = material['id']
+            if material_id in material_rows:
+                continue
+            material_rows[material_id] = []
+            difficulty = normalize_difficulty(material['difficulty']) if material.get('difficulty') is not None else None
+            topics = {normalize_topic(topic) for topic in get_material_topics(material)}
+
+            for position, question in enumerate(material.get('questions') or []):
+                if not isinstance(question, dict):
+                    continue
+                row = len(table.material_ids)
+                question_id = question.get('id', position + 1)
+                section = str(question.get('section') or '').upper() or None
+
+                table.material_ids.append(material_id)
+                positions.append(position)
+                table.question_ids.append(question_id)
+                table.sections.append(section)
+                table.difficulties.append(difficulty)
+                table.answers.append(question.get('answer'))
+                table.row_of.setdefault(question_key(material_id, question_id), row)
+                material_rows[material_id].append(row)
+
+                if section:
+                    facets['section'].setdefault(section, []).append(row)
+                if difficulty:
+                    facets['difficulty'].setdefault(difficulty, []).append(row)
+                for topic in topics:
+                    facets['topic'].setdefault(topic, []).append(row)
+
+        # 行号按构建顺序递增，索引数组天然有序，可以直接用于求交集
+        table.positions = np.array(positions, dtype=np.int32)
+        table.by_section = {key: np.array(rows, dtype=np.int64) for key, rows in facets['section'].items()}
+        table.by_difficulty = {key: np.array(rows, dtype=np.int64) for key, rows in facets['difficulty'].items()}
+        table.by_topic = {key: np.array(rows, dtype=np.int64) for key, rows in facets['topic'].items()}
+        table.rows_of_material = {key: np.array(rows, dtype=np.int64) for key, rows in material_rows.items()}
+        return table
+
+    def select(self, section: Optional[str] = None, difficulty: Optional[str] = None,
+               topic: Optional[str] = None) -> np.ndarray:
+        """
+        按部分、难度和话题筛选，多个条件之间为AND关系
+
+        Returns:
+            np.ndarray: 升序的行号数组
+        """
+        facets = []
+        if section is not None:
+            facets.append(self.by_section.get(str(section).upper(), np.zeros(0, dtype=np.int64)))
+        if difficulty is not None:
+            facets.append(self.by_difficulty.get(normalize_difficulty(difficulty), np.zeros(0, dtype=np.int64)))
+        if topic is not None:
+            facets.append(self.by_topic.get(normalize_topic(topic), np.zeros(0, dtype=np.int64)))
+        if not facets:
+            return np.arange(len(self), dtype=np.int64)
+
+        # 从最小的数组出发求交集
+        facets.sort(key=len)
+        rows = facets[0]
+        for other in facets[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def exclusion_rows(self, keys: Sequence[str]) -> np.ndarray:
+        """
+        将需要排除的题目转换为行号
+
+        Args:
+            keys: "材料ID:题目ID"排除单道题目，只有材料ID时排除该材料的所有题目
+
+        Returns:
+            np.ndarray: 升序的行号数组
+        """
+        rows: List[int] = []
+        for key in keys:
+            material_id, separator, question_id = str(key).rpartition(':')
+            if separator and question_key(material_id, question_id) in self.row_of:
+                rows.append(self.row_of[question_key(material_id, question_id)])
+            elif str(key) in self.rows_of_material:
+                rows.extend(self.rows_of_material[str(key)].tolist())
+        return np.unique(np.array(rows, dtype=np.int64))
+
+    def sample(self, rows: np.ndarray, count: int, seed: int, exclude: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        从候选行中不放回地随机抽取
+
+        Args:
+            rows: 候选行号（升序）
+            count: 抽取数量
+            seed: 随机种子，相同的种子和候选集得到相同的结果
+            exclude: 需要排除的行号（升序）
+
+        Returns:
+            np.ndarray: 抽中的行号，保持随机顺序
+        """
+        if exclude is not None and len(exclude):
+            rows = np.setdiff1d(rows, exclude, assume_unique=True)
+        count = min(count, len(rows))
+        if count <= 0:
+            return np.zeros(0, dtype=np.int64)
+        rng = np.random.default_rng(seed)
+        return rows[rng.choice(len(rows), size=count, replace=False)]
+
+    def describe(self, row: int) -> Dict[str, Any]:
+        """某一行的元数据"""
+        return {
+            "material_id": self.material_ids[row],
+            "question_id": self.question_ids[row],
+            "section": self.sections[row],
+            "difficulty": self.difficulties[row]
+        }
+
+
+def build_drill(table: QuestionTable, rows: np.ndarray, catalog: MaterialCatalog) -> List[Dict[str, Any]]:
+    """
+    读取抽中题目的正文
+
+    Args:
+        table: 题目表
+        rows: 抽中的行号
+        catalog: 材料目录，用于读取材料详情
+
+    Returns:
+        list: 题目（题目原有字段加上材料ID、材料标题、部分和难度）
+    """
+    questions = []
+    for row in rows.tolist():
+        material = catalog.get_detail(table.material_ids[row])
+        if material is None:
+            continue
+        material_questions = material.get('questions') or []
+        position = int(table.positions[row])
+        if position >= len(material_questions):
+            continue
+        questions.append({
+            **material_questions[position],
+            **table.describe(row),
+            "material_title": material.get('title'),
+            "topics": get_material_topics(material)
+        })
+    return questions
+
+
+_question_table: Optional[QuestionTable] = None
+_question_table_version: Optional[int] = None
+_question_table_lock = threading.Lock()
+
+
+def get_question_table() -> QuestionTable:
+    """获取进程内共享的题目表（首次调用或材料目录版本变化后重新构建）"""
+    global _question_table, _question_table_version
+    catalog = get_catalog()
+    version = catalog.version
+    if _question_table is None or _question_table_version != version:
+        with _question_table_lock:
+            if _question_table is None or _question_table_version != version:
+                _question_table = QuestionTable.build(catalog.iter_details())
+                _question_table_version = version
+                print(f"题目表已构建，共{len(_question_table)}道题目")
+    return _question_table
+
+
+def invalidate_question_table():
+    """丢弃当前题目表，下一次组卷时重新构建（正在使用旧表的请求不受影响）"""
+    global _question_table
+    with _question_table_lock:
+        _question_table = None
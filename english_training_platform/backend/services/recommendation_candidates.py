@@ -0,0 +1,182 @@
+"""
+推荐Agent的候选材料预筛选
+推荐时不再把整个材料索引放进提示词，而是先在本地按分析结果中的推荐标准
+（recommendation_criteria的focus_tags、preferred_topics和difficulty）给每份材料打分，
+只把得分最高的前N份材料的精简摘要交给大模型挑选。摘要按估计的token数累加，
+不超过提示词预算，提示词的长度（以及推荐调用的耗时和费用）不再随材料库增长。
+
+标签匹配不要求完全相同：相同得1分，互相包含得0.8分，否则按字符二元组的Dice系数计分
+（低于0.5视为不匹配），"细节理解"这类中文标签也能匹配"细节"、"理解细节"等写法。
+"""
+
+import heapq
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from services.material_catalog import get_material_topics, normalize_difficulty, normalize_topic
+
+# 默认交给大模型的候选材料数量，以及推荐提示词的token预算
+DEFAULT_CANDIDATE_COUNT = 20
+DEFAULT_PROMPT_TOKEN_BUDGET = 4000
+
+# 难度由低到高
+DIFFICULTY_LEVELS = ('CET4', 'CET6', 'IELTS', 'TOEFL')
+
+# 各项标准的权重：薄弱环节最重要，其次是偏好的话题和难度
+FOCUS_WEIGHT = 2.0
+TOPIC_WEIGHT = 1.5
+DIFFICULTY_WEIGHT = 1.0
+
+# 字符二元组相似度低于此值时视为不匹配
+MIN_SIMILARITY = 0.5
+
+# 摘要中保留的标签数量
+SUMMARY_TAG_COUNT = 5
+
+CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估计文本的token数（偏保守）
+
+    中日韩字符和全角标点每个按1个token计，其他字符约4个计1个token。
+    """
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _bigrams(term: str) -> FrozenSet[str]:
+    return frozenset(term[i:i + 2] for i in range(len(term) - 1)) if len(term) > 1 else frozenset((term,))
+
+
+class _Term:
+    """预先计算好二元组的标签"""
+
+    __slots__ = ('text', 'bigrams')
+
+    def __init__(self, text: Any):
+        self.text = normalize_topic(text)
+        self.bigrams = _bigrams(self.text)
+
+
+def term_similarity(a: _Term, b: _Term) -> float:
+    """两个标签的相似度（0~1）"""
+    if not a.text or not b.text:
+        return 0.0
+    if a.text == b.text:
+        return 1.0
+    if a.text in b.text or b.text in a.text:
+        return 0.8
+    dice = 2 * len(a.bigrams & b.bigrams) / (len(a.bigrams) + len(b.bigrams))
+    return dice if dice >= MIN_SIMILARITY else 0.0
+
+
+def _match(wanted: List[_Term], available: List[_Term]) -> float:
+    """每个期望的标签取与材料标签的最高相似度，求和"""
+    if not wanted or not available:
+        return 0.0
+    return sum(max(term_similarity(term, other) for other in available) for term in wanted)
+
+
+@lru_cache(maxsize=8192)
+def _term(text: str) -> _Term:
+    # 材料之间大量重复相同的标签，二元组只计算一次
+    return _Term(text)
+
+
+def _terms(values: Any) -> List[_Term]:
+    if isinstance(values, str):
+        values = [values]
+    return [_term(str(value)) for value in values or [] if str(value).strip()]
+
+
+def target_difficulty(analysis_result: Dict[str, Any]) -> Optional[str]:
+    """分析结果中建议的难度（recommendation_criteria.difficulty），没有时返回None"""
+    criteria = analysis_result.get('recommendation_criteria') or {}
+    difficulty = criteria.get('difficulty') or analysis_result.get('level')
+    if not difficulty:
+        return None
+    difficulty = normalize_difficulty(difficulty)
+    return difficulty if difficulty in DIFFICULTY_LEVELS else None
+
+
+def difficulty_score(material_difficulty: Any, target: Optional[str]) -> float:
+    """难度相同得1分，相差一级得0.5分"""
+    if target is None or not material_difficulty:
+        return 0.0
+    difficulty = normalize_difficulty(material_difficulty)
+    if difficulty not in DIFFICULTY_LEVELS:
+        return 0.0
+    distance = abs(DIFFICULTY_LEVELS.index(difficulty) - DIFFICULTY_LEVELS.index(target))
+    return {0: 1.0, 1: 0.5}.get(distance, 0.0)
+
+
+def score_materials(materials_index: Iterable[Dict[str, Any]], analysis_result: Dict[str, Any]) -> List[Tuple[float, int, Dict[str, Any]]]:
+    """
+    按推荐标准给每份材料打分
+
+    Returns:
+        list: [(得分, 材料在索引中的位置, 材料), ...]，顺序与索引相同
+    """
+    criteria = analysis_result.get('recommendation_criteria') or {}
+    focus = _terms(criteria.get('focus_tags') or analysis_result.get('weak_areas'))
+    topics = _terms(criteria.get('preferred_topics'))
+    target = target_difficulty(analysis_result)
+
+    scored = []
+    for position, material in enumerate(materials_index):
+        if not material.get('id'):
+            continue
+        material_topics = _terms(get_material_topics(material))
+        # 薄弱环节与材料的标签、话题和题目所在部分比较
+        material_tags = _terms(material.get('tags')) + material_topics + _terms(list(material.get('section_counts') or {}))
+        score = (FOCUS_WEIGHT * _match(focus, material_tags)
+                 + TOPIC_WEIGHT * _match(topics, material_topics)
+                 + DIFFICULTY_WEIGHT * difficulty_score(material.get('difficulty'), target))
+        scored.append((score, position, material))
+    return scored
+
+
+def compact_summary(material: Dict[str, Any]) -> Dict[str, Any]:
+    """放进提示词的材料摘要：ID、标题、难度、话题、前几个标签和题目数量"""
+    summary = {
+        "id": material.get('id'),
+        "title": material.get('title'),
+        "difficulty": material.get('difficulty'),
+        "topics": get_material_topics(material),
+        "tags": list(material.get('tags') or [])[:SUMMARY_TAG_COUNT],
+        "question_count": material.get('question_count')
+    }
+    return {key: value for key, value in summary.items() if value not in (None, [], '')}
+
+
+def select_candidates(materials_index: Iterable[Dict[str, Any]], analysis_result: Dict[str, Any],
+                      limit: int = DEFAULT_CANDIDATE_COUNT, token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    选出交给大模型的候选材料
+
+    Args:
+        materials_index: 材料索引
+        analysis_result: 分析Agent的结果
+        limit: 最多选出的材料数量
+        token_budget: 候选材料部分（每行一份摘要）的token上限；至少保留得分最高的一份
+
+    Returns:
+        list: 按得分从高到低排列的材料摘要（得分相同时保持索引中的顺序）
+    """
+    scored = score_materials(materials_index, analysis_result)
+    ranked = heapq.nlargest(limit, scored, key=lambda item: (item[0], -item[1]))
+
+    candidates: List[Dict[str, Any]] = []
+    used = 0
+    for _, _, material in ranked:
+        summary = compact_summary(material)
+        tokens = estimate_tokens(json.dumps(summary, ensure_ascii=False)) + 1
+        if candidates and token_budget is not None and used + tokens > token_budget:
+            break
+        candidates.append(summary)
+        used += tokens
+    return candidates
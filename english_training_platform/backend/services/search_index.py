@@ -0,0 +1,254 @@
+"""
+听力语料全文检索
+对transcripts.json中的段落和materials.json中的题目、选项建立内存倒排索引，
+使用BM25对结果排序。索引在第一次查询时构建一次，之后常驻内存；材料增删改时只替换
+该材料的文档（update_search_index），不重建整个索引。
+"""
+
+import heapq
+import math
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.material_db import collect_corpus
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 英文单词（含缩写）、数字，以及单个中日韩字符
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?|[\u4e00-\u9fff]")
+
+# 返回的摘要长度（字符数）
+SNIPPET_LENGTH = 160
+
+
+def tokenize(text: str) -> List[str]:
+    """将文本切分为小写词项"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def find_term_offsets(text: str, terms: set) -> List[Tuple[int, int]]:
+    """
+    查找文本中命中查询词项的字符区间
+
+    Args:
+        text: 原文
+        terms: 查询词项集合
+
+    Returns:
+        list: [(起始位置, 结束位置), ...]
+    """
+    return [match.span() for match in TOKEN_PATTERN.finditer(text.lower()) if match.group() in terms]
+
+
+class SearchDocument:
+    """被索引的单个文档（一个段落或一道题目）"""
+
+    __slots__ = ('kind', 'material_id', 'title', 'section', 'ref', 'text', 'length')
+
+    def __init__(self, kind: str, material_id: str, title: str, section: Optional[str], ref: Dict[str, Any], text: str):
+        self.kind = kind
+        self.material_id = material_id
+        self.title = title
+        self.section = section
+        self.ref = ref
+        self.text = text
+        self.length = 0
+
+
+class SearchIndex:
+    """
+    BM25倒排索引
+
+    postings: 词项 -> [(文档下标, 词频), ...]
+    查询时只访问查询词项的倒排列表，耗时与命中文档数成正比，与语料规模无关。
+    删除的文档在documents中留下None，下标不变；删除时替换整个倒排列表，正在查询的读取方不受影响。
+    """
+
+    def __init__(self):
+        self.documents: List[Optional[SearchDocument]] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.average_length = 0.0
+        self.document_count = 0
+        self._total_length = 0
+        # (文档类型, 材料ID) -> 文档下标
+        self._by_material: Dict[Tuple[str, str], List[int]] = {}
+
+    def add(self, document: SearchDocument):
+        """添加文档"""
+        doc_index = len(self.documents)
+        self.documents.append(document)
+        self._by_material.setdefault((document.kind, document.material_id), []).append(doc_index)
+
+        frequencies: Dict[str, int] = {}
+        for term in tokenize(document.text):
+            frequencies[term] = frequencies.get(term, 0) + 1
+        document.length = sum(frequencies.values())
+
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, []).append((doc_index, frequency))
+
+        self._update_length(document.length, 1)
+
+    def remove(self, kind: str, material_id: str):
+        """删除某个材料的某类文档"""
+        for doc_index in self._by_material.pop((kind, material_id), []):
+            document = self.documents[doc_index]
+            if document is None:
+                continue
+            for term in set(tokenize(document.text)):
+                postings = [posting for posting in self.postings.get(term, []) if posting[0] != doc_index]
+                if postings:
+                    self.postings[term] = postings
+                else:
+                    self.postings.pop(term, None)
+            self.documents[doc_index] = None
+            self._update_length(-document.length, -1)
+
+    def _update_length(self, length: int, count: int):
+        self._total_length += length
+        self.document_count += count
+        self.average_length = self._total_length / self.document_count if self.document_count else 0.0
+
+    def search(self, query: str, limit: int = 10, kind: Optional[str] = None,
+               material_id: Optional[str] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        检索并按BM25得分排序
+
+        Args:
+            query: 查询文本
+            limit: 返回数量上限
+            kind: 只返回某类文档（passage或question）
+            material_id: 只返回某个材料中的文档
+
+        Returns:
+            (命中总数, 结果列表)
+        """
+        terms = set(tokenize(query))
+        document_count = self.document_count
+        scores: Dict[int, float] = {}
+
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_index, frequency in postings:
+                document = self.documents[doc_index]
+                if document is None:
+                    continue
+                if kind and document.kind != kind:
+                    continue
+                if material_id and document.material_id != material_id:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * document.length / (self.average_length or 1))
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return len(scores), [self._format_result(self.documents[doc_index], score, terms) for doc_index, score in top]
+
+    def _format_result(self, document: SearchDocument, score: float, terms: set) -> Dict[str, Any]:
+        """构建单条结果，包含命中位置和摘要"""
+        offsets = find_term_offsets(document.text, terms)
+        snippet_start = max(0, offsets[0][0] - SNIPPET_LENGTH // 4) if offsets else 0
+        return {
+            "kind": document.kind,
+            "material_id": document.material_id,
+            "title": document.title,
+            "section": document.section,
+            **document.ref,
+            "score": round(score, 4),
+            "offsets": offsets,
+            "snippet_start": snippet_start,
+            "snippet": document.text[snippet_start:snippet_start + SNIPPET_LENGTH]
+        }
+
+
+def add_transcript(index: SearchIndex, transcript: Dict[str, Any]):
+    """将听力原文的每个段落加入索引"""
+    for section in transcript.get('sections', []):
+        section_key = str(section.get('section', '')).upper() or None
+        for passage in section.get('passages', []):
+            content = passage.get('content') or ''
+            if not content:
+                continue
+            index.add(SearchDocument('passage', transcript['id'], transcript.get('title', ''), section_key,
+                                     {"passage_id": passage.get('passage_id')}, content))
+
+
+def add_questions(index: SearchIndex, material: Dict[str, Any]):
+    """将材料的每道题目（题干和选项）加入索引"""
+    for question_index, question in enumerate(material.get('questions') or []):
+        text = '\n'.join([str(question.get('question', ''))] + [str(option) for option in question.get('options') or []])
+        index.add(SearchDocument('question', material['id'], material.get('title', ''), question.get('section'),
+                                 {"question_id": question.get('id', question_index + 1), "question_index": question_index}, text))
+
+
+def build_search_index(frontend_path: Optional[str] = None) -> SearchIndex:
+    """
+    从材料目录构建检索索引
+
+    Args:
+        frontend_path: 前端材料目录，默认自动定位
+
+    Returns:
+        SearchIndex: 构建好的索引
+    """
+    materials, transcripts = collect_corpus(frontend_path)
+    index = SearchIndex()
+
+    for item in transcripts:
+        add_transcript(index, item['transcript'])
+    for item in materials:
+        add_questions(index, item['detail'])
+
+    print(f"检索索引已构建，共{index.document_count}个文档，{len(index.postings)}个词项")
+    return index
+
+
+_search_index: Optional[SearchIndex] = None
+_search_index_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    """获取进程内共享的检索索引（首次调用时构建）"""
+    global _search_index
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                _search_index = build_search_index()
+    return _search_index
+
+
+def update_search_index(material_id: str, material: Optional[Dict[str, Any]]):
+    """
+    用材料的最新内容替换索引中该材料的题目文档，索引尚未构建时不做任何事
+
+    Args:
+        material_id: 材料ID
+        material: 完整材料，材料已被删除时为None
+    """
+    with _search_index_lock:
+        if _search_index is None:
+            return
+        _search_index.remove('question', material_id)
+        if material is not None:
+            add_questions(_search_index, material)
+
+
+def update_search_transcript(transcript_id: str, transcript: Optional[Dict[str, Any]]):
+    """
+    用听力原文的最新内容替换索引中该原文的段落文档，索引尚未构建时不做任何事
+
+    Args:
+        transcript_id: 听力原文ID
+        transcript: 听力原文，已被删除时为None
+    """
+    with _search_index_lock:
+        if _search_index is None:
+            return
+        _search_index.remove('passage', transcript_id)
+        if transcript is not None:
+            add_transcript(_search_index, transcript)
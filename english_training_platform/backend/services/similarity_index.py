@@ -0,0 +1,284 @@
+"""
+材料相似度索引
+将每份材料的听力原文、题目和选项表示为TF-IDF向量（词项通过哈希映射到固定维度，
+不需要维护词表），归一化后按CSR格式（indptr/indices/data）保存在NumPy数组中。
+查询与某份材料最相似的材料只需要一次稀疏矩阵与稠密向量的乘积。
+
+新材料追加到数组末尾（数组按倍数扩容），不重建整个矩阵；追加时使用当时的文档频率
+计算IDF，已有材料的向量不重新加权。替换或删除材料时从文档频率和文档数中减去旧行的词项。
+材料文件变化后由文件监视器只替换受影响材料的行。
+"""
+
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from services.material_db import collect_corpus, find_transcript
+from services.search_index import tokenize
+
+# 哈希空间的维度（2^18），冲突对相似度排序的影响可以忽略
+HASH_DIMENSIONS = 1 << 18
+
+# 默认和最多返回的相似材料数量
+DEFAULT_SIMILAR_COUNT = 5
+MAX_SIMILAR_COUNT = 50
+
+# 数组的初始容量
+INITIAL_ROWS = 64
+INITIAL_NONZEROS = 16 * 1024
+
+
+def hash_term(term: str) -> int:
+    """将词项映射到哈希空间中的下标（crc32在不同进程之间保持一致）"""
+    return zlib.crc32(term.encode('utf-8')) % HASH_DIMENSIONS
+
+
+def material_text(material: Dict[str, Any], transcript: Optional[Dict[str, Any]] = None) -> str:
+    """
+    拼接材料中参与相似度计算的文本：标题、听力原文段落、题目和选项
+
+    Args:
+        material: 完整材料
+        transcript: 材料对应的听力原文（可选）
+    """
+    parts = [str(material.get('title') or '')]
+    for section in (transcript or {}).get('sections', []):
+        for passage in section.get('passages', []):
+            parts.append(str(passage.get('content') or ''))
+    for question in material.get('questions') or []:
+        if isinstance(question, dict):
+            parts.append(str(question.get('question', '')))
+            parts.extend(str(option) for option in question.get('options') or [])
+    return '\n'.join(parts)
+
+
+def _term_counts(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """返回文本中出现的哈希下标（升序）及其词频"""
+    hashed = np.fromiter((hash_term(term) for term in tokenize(text)), dtype=np.int32)
+    return np.unique(hashed, return_counts=True)
+
+
+class SimilarityIndex:
+    """
+    基于CSR稀疏矩阵的材料相似度索引
+
+    第i行是第i份材料归一化后的TF-IDF向量；材料被替换或删除时，旧行的权重置零，
+    行号不再复用。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.document_frequency = np.zeros(HASH_DIMENSIONS, dtype=np.int32)
+        self.document_count = 0
+
+        self._indptr = np.zeros(INITIAL_ROWS + 1, dtype=np.int64)
+        self._indices = np.zeros(INITIAL_NONZEROS, dtype=np.int32)
+        self._data = np.zeros(INITIAL_NONZEROS, dtype=np.float32)
+        self._rows = 0
+        # 行号 -> 材料ID（已删除的行为None），材料ID -> 行号
+        self._row_ids: List[Optional[str]] = []
+        self._row_of: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, material_id: str) -> bool:
+        return material_id in self._row_of
+
+    @property
+    def nonzeros(self) -> int:
+        """矩阵中非零权重的数量（包括已删除的行）"""
+        return int(self._indptr[self._rows])
+
+    def _idf(self, indices: np.ndarray) -> np.ndarray:
+        """平滑的IDF，与常见的TF-IDF实现一致"""
+        return np.log((1 + self.document_count) / (1 + self.document_frequency[indices])) + 1
+
+    def _reserve(self, rows: int, nonzeros: int):
+        """保证数组容量足够，不足时按倍数扩容（旧数组仍可被正在查询的线程使用）"""
+        if self._rows + rows + 1 > len(self._indptr):
+            capacity = max(len(self._indptr) * 2, self._rows + rows + 1)
+            indptr = np.zeros(capacity, dtype=np.int64)
+            indptr[:self._rows + 1] = self._indptr[:self._rows + 1]
+            self._indptr = indptr
+        used = int(self._indptr[self._rows])
+        if used + nonzeros > len(self._indices):
+            capacity = max(len(self._indices) * 2, used + nonzeros)
+            indices = np.zeros(capacity, dtype=np.int32)
+            data = np.zeros(capacity, dtype=np.float32)
+            indices[:used] = self._indices[:used]
+            data[:used] = self._data[:used]
+            self._indices, self._data = indices, data
+
+    def _append_row(self, material_id: str, indices: np.ndarray, weights: np.ndarray):
+        """追加一行（调用方需持有锁）"""
+        self._reserve(1, len(indices))
+        start = int(self._indptr[self._rows])
+        end = start + len(indices)
+        self._indices[start:end] = indices
+        self._data[start:end] = weights
+        self._indptr[self._rows + 1] = end
+        self._row_ids.append(material_id)
+        self._row_of[material_id] = self._rows
+        # 行数最后更新，查询方不会看到写了一半的行
+        self._rows += 1
+
+    def _clear_row(self, material_id: str):
+        """将材料原有的行置零，并从文档频率中减去该行的词项（调用方需持有锁）"""
+        row = self._row_of.pop(material_id, None)
+        if row is None:
+            return
+        start, end = self._indptr[row], self._indptr[row + 1]
+        # 每行的词项下标互不相同，可以直接按下标相减
+        self.document_frequency[self._indices[start:end]] -= 1
+        self.document_count -= 1
+        self._data[start:end] = 0
+        self._row_ids[row] = None
+
+    @staticmethod
+    def _weights(counts: np.ndarray, idf: np.ndarray) -> np.ndarray:
+        """次线性词频乘以IDF，并做L2归一化"""
+        weights = (1 + np.log(counts)) * idf
+        norm = np.linalg.norm(weights)
+        return (weights / norm if norm > 0 else weights).astype(np.float32)
+
+    def build(self, documents: Iterable[Tuple[str, str]]):
+        """
+        批量构建索引：先统计所有文档的文档频率，再计算各行的权重
+
+        Args:
+            documents: (材料ID, 文本)
+        """
+        counted = []
+        seen = set()
+        for material_id, text in documents:
+            if material_id in seen:
+                continue
+            seen.add(material_id)
+            counted.append((material_id, *_term_counts(text)))
+
+        with self._lock:
+            for material_id, _, _ in counted:
+                self._clear_row(material_id)
+            for _, indices, _ in counted:
+                self.document_frequency[indices] += 1
+            self.document_count += len(counted)
+            self._reserve(len(counted), sum(len(indices) for _, indices, _ in counted))
+            for material_id, indices, counts in counted:
+                self._append_row(material_id, indices, self._weights(counts, self._idf(indices)))
+
+    def add(self, material_id: str, text: str):
+        """
+        增量添加或替换一份材料，只追加一行，不重建矩阵
+
+        Args:
+            material_id: 材料ID
+            text: 材料文本（见material_text）
+        """
+        indices, counts = _term_counts(text)
+        with self._lock:
+            self._clear_row(material_id)
+            self.document_count += 1
+            self.document_frequency[indices] += 1
+            self._append_row(material_id, indices, self._weights(counts, self._idf(indices)))
+
+    def remove(self, material_id: str):
+        """删除一份材料"""
+        with self._lock:
+            self._clear_row(material_id)
+
+    def similar(self, material_id: str, k: int = DEFAULT_SIMILAR_COUNT) -> Optional[List[Tuple[str, float]]]:
+        """
+        查找与指定材料最相似的材料
+
+        Args:
+            material_id: 材料ID
+            k: 返回数量
+
+        Returns:
+            list: [(材料ID, 余弦相似度), ...]，按相似度降序；材料不在索引中时返回None
+        """
+        with self._lock:
+            row = self._row_of.get(material_id)
+            if row is None:
+                return None
+            rows = self._rows
+            indptr = self._indptr[:rows + 1]
+            nonzeros = int(indptr[rows])
+            indices, data = self._indices[:nonzeros], self._data[:nonzeros]
+            row_ids = self._row_ids[:rows]
+
+        start, end = indptr[row], indptr[row + 1]
+        query = np.zeros(HASH_DIMENSIONS, dtype=np.float32)
+        query[indices[start:end]] = data[start:end]
+
+        # 稀疏矩阵乘以稠密向量：逐个非零元素相乘后按行求和
+        products = data * query[indices]
+        # reduceat只在非空行的起始位置求和（空行之间的区间长度为0，不影响相邻行），空行得分为0
+        scores = np.zeros(rows, dtype=np.float32)
+        nonempty = np.flatnonzero(indptr[:-1] < indptr[1:])
+        if len(nonempty):
+            scores[nonempty] = np.add.reduceat(products, indptr[nonempty])
+        # 已删除的行权重为0，得分为0，和材料自身一起在下面被排除
+        scores[row] = -np.inf
+
+        k = min(k, rows)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(row_ids[i], float(scores[i])) for i in top if np.isfinite(scores[i]) and scores[i] > 0]
+
+
+def build_similarity_index(frontend_path: Optional[str] = None) -> SimilarityIndex:
+    """
+    从材料目录构建相似度索引
+
+    Args:
+        frontend_path: 前端材料目录，默认自动定位
+
+    Returns:
+        SimilarityIndex: 构建好的索引
+    """
+    materials, transcripts = collect_corpus(frontend_path)
+    transcripts_by_id = {item['transcript'].get('id'): item['transcript'] for item in transcripts}
+
+    index = SimilarityIndex()
+    index.build((item['detail']['id'], material_text(item['detail'], transcripts_by_id.get(item['detail']['id'])))
+                for item in materials if item['in_catalog'])
+    print(f"相似度索引已构建，共{len(index)}份材料，{index.nonzeros}个非零权重")
+    return index
+
+
+_similarity_index: Optional[SimilarityIndex] = None
+_similarity_index_lock = threading.Lock()
+
+
+def get_similarity_index() -> SimilarityIndex:
+    """获取进程内共享的相似度索引（首次调用时构建）"""
+    global _similarity_index
+    if _similarity_index is None:
+        with _similarity_index_lock:
+            if _similarity_index is None:
+                _similarity_index = build_similarity_index()
+    return _similarity_index
+
+
+def update_similarity_index(material_id: str, material: Optional[Dict[str, Any]]):
+    """
+    将一次材料增删改增量应用到已构建的索引；索引尚未构建时不做任何事
+
+    Args:
+        material_id: 材料ID
+        material: 新的完整材料，删除时为None
+    """
+    index = _similarity_index
+    if index is None:
+        return
+    if material is None:
+        index.remove(material_id)
+    else:
+        # 与构建索引时一致，听力原文可能在任意材料子目录中（如CET4材料的原文在2022_06下）
+        index.add(material_id, material_text(material, find_transcript(material_id)))
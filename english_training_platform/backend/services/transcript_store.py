@@ -0,0 +1,296 @@
+"""
+听力原文与材料文件的按目录缓存
+前端材料目录下每个子目录都有自己的materials.json和transcripts.json。
+这里按目录懒加载这些文件，解析后以记录ID为键常驻内存，文件变化时才重新解析。
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from services.file_utils import FileSignature, file_signature
+from services.material_catalog import DEFAULT_CHECK_INTERVAL, get_frontend_materials_path
+
+# 每个仓库最多常驻内存的目录数量，超过后淘汰最久未使用的目录
+DEFAULT_MAX_DIRECTORIES = 128
+
+
+def is_safe_directory_name(directory: str) -> bool:
+    """检查目录名是否为材料根目录下的单级目录，防止路径穿越"""
+    if not directory or directory in ('.', '..'):
+        return False
+    return not any(separator in directory for separator in ('/', '\\', os.sep))
+
+
+def extract_records(data: Any, collection_key: str) -> Dict[str, Dict[str, Any]]:
+    """
+    从解析后的JSON中提取记录
+
+    支持三种结构：{collection_key: [...]}、记录列表，以及直接是单条记录的对象。
+
+    Args:
+        data: 解析后的JSON数据
+        collection_key: 记录列表所在的键，如materials、transcripts
+
+    Returns:
+        dict: 记录ID -> 记录
+    """
+    if isinstance(data, dict):
+        if collection_key in data:
+            items = data[collection_key]
+        elif 'id' in data:
+            items = [data]
+        else:
+            items = []
+    else:
+        items = data
+
+    records = {}
+    for item in items or []:
+        if isinstance(item, dict) and 'id' in item:
+            # 重复ID以第一次出现的记录为准
+            records.setdefault(item['id'], item)
+    return records
+
+
+class _DirectoryEntry:
+    """单个目录中某个JSON文件的解析结果"""
+
+    def __init__(self, signature: FileSignature, records: Dict[str, Dict[str, Any]]):
+        self.signature = signature
+        self.records = records
+        self.checked_at = time.monotonic()
+
+
+class DirectoryRecordStore:
+    """
+    按目录懒加载的记录仓库
+
+    每个目录第一次被访问时才读取其中的JSON文件，记录按ID建立字典，
+    之后的查询只需一次字典查找。常驻内存的目录数量有上限（max_directories，
+    None表示不限制），超过后淘汰最久未使用的目录，被淘汰的目录下次访问时重新读取。
+    """
+
+    def __init__(self, filename: str, collection_key: str, base_path: Optional[str] = None,
+                 check_interval: float = DEFAULT_CHECK_INTERVAL,
+                 max_directories: Optional[int] = DEFAULT_MAX_DIRECTORIES):
+        self.filename = filename
+        self.collection_key = collection_key
+        self.base_path = base_path
+        self.check_interval = check_interval
+        self.max_directories = max_directories
+
+        self._lock = threading.Lock()
+        self._directories: 'OrderedDict[str, _DirectoryEntry]' = OrderedDict()
+
+    def _file_path(self, directory: str) -> str:
+        return os.path.join(self.base_path or get_frontend_materials_path(), directory, self.filename)
+
+    def _load(self, path: str, signature: FileSignature) -> Dict[str, Dict[str, Any]]:
+        """读取并解析文件，返回ID到记录的映射"""
+        if signature is None:
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"读取文件失败: {path}, 错误: {str(e)}")
+            return {}
+
+        return extract_records(data, self.collection_key)
+
+    def directory_records(self, directory: str) -> Dict[str, Dict[str, Any]]:
+        """
+        获取某个目录中的全部记录
+
+        Args:
+            directory: 材料根目录下的子目录名
+
+        Returns:
+            dict: 记录ID -> 记录
+        """
+        if not is_safe_directory_name(directory):
+            return {}
+
+        entry = self._directories.get(directory)
+        if entry and time.monotonic() - entry.checked_at < self.check_interval:
+            return entry.records
+
+        with self._lock:
+            entry = self._directories.get(directory)
+            path = self._file_path(directory)
+            signature = file_signature(path)
+            if entry and entry.signature == signature:
+                entry.checked_at = time.monotonic()
+                # 使用顺序只在重新检查文件时更新，快速路径不加锁
+                self._directories.move_to_end(directory)
+                return entry.records
+
+            entry = _DirectoryEntry(signature, self._load(path, signature))
+            self._store(directory, entry)
+            return entry.records
+
+    def _store(self, directory: str, entry: _DirectoryEntry):
+        """保存目录条目，超出数量上限时淘汰最久未使用的目录（调用方需持有锁）"""
+        self._directories[directory] = entry
+        self._directories.move_to_end(directory)
+        if self.max_directories is None:
+            return
+        while len(self._directories) > self.max_directories:
+            evicted, _ = self._directories.popitem(last=False)
+            self._on_evict(evicted)
+
+    def _on_evict(self, directory: str):
+        """目录被淘汰后的回调，子类可以释放与该目录相关的缓存"""
+
+    def refresh(self, directory: str) -> Set[str]:
+        """
+        立即重新加载某个目录（文件监视器检测到变化时调用）
+
+        新的解析结果构建完成后整体替换旧条目，正在读取旧记录的请求不受影响。
+
+        Returns:
+            set: 新增、修改或删除的记录ID；目录此前未被加载时为文件中的全部记录ID
+        """
+        if not is_safe_directory_name(directory):
+            return set()
+        with self._lock:
+            path = self._file_path(directory)
+            signature = file_signature(path)
+            entry = self._directories.get(directory)
+            if entry is None and signature is None:
+                return set()
+            if entry and entry.signature == signature:
+                entry.checked_at = time.monotonic()
+                return set()
+            records = self._load(path, signature)
+            self._store(directory, _DirectoryEntry(signature, records))
+        old_records = entry.records if entry else {}
+        return {record_id for record_id in set(records) | set(old_records)
+                if records.get(record_id) != old_records.get(record_id)}
+
+    def get(self, record_id: str, directories: List[str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        按顺序在多个目录中查找记录
+
+        Args:
+            record_id: 记录ID
+            directories: 候选目录列表
+
+        Returns:
+            (记录, 所在目录)，找不到时返回(None, None)
+        """
+        for directory in directories:
+            record = self.directory_records(directory).get(record_id)
+            if record is not None:
+                return record, directory
+        return None, None
+
+
+class TranscriptStore(DirectoryRecordStore):
+    """
+    听力原文仓库
+
+    除了按材料ID获取完整原文外，还可以直接获取单个部分(section)或段落(passage)。
+    每篇原文的部分/段落索引在第一次访问时构建并缓存。
+    """
+
+    def __init__(self, base_path: Optional[str] = None, check_interval: float = DEFAULT_CHECK_INTERVAL,
+                 max_directories: Optional[int] = DEFAULT_MAX_DIRECTORIES):
+        super().__init__('transcripts.json', 'transcripts', base_path=base_path, check_interval=check_interval,
+                         max_directories=max_directories)
+        # (目录, 材料ID) -> (原文对象, 部分索引, 段落索引)
+        self._section_indexes: Dict[Tuple[str, str], Tuple[Dict[str, Any], Dict[str, Dict[str, Any]], Dict[Tuple[str, str], Dict[str, Any]]]] = {}
+
+    def _sections_of(self, material_id: str, directories: List[str]):
+        """获取（必要时构建）原文的部分和段落索引"""
+        transcript, directory = self.get(material_id, directories)
+        if transcript is None:
+            return {}, {}
+
+        key = (directory, material_id)
+        cached = self._section_indexes.get(key)
+        # 文件重新加载后原文对象会变化，此时需要重建索引
+        if cached and cached[0] is transcript:
+            return cached[1], cached[2]
+
+        sections = {}
+        passages = {}
+        for section in transcript.get('sections', []):
+            section_key = str(section.get('section', '')).upper()
+            sections.setdefault(section_key, section)
+            for passage in section.get('passages', []):
+                passages.setdefault((section_key, str(passage.get('passage_id'))), passage)
+
+        self._section_indexes[key] = (transcript, sections, passages)
+        return sections, passages
+
+    def _on_evict(self, directory: str):
+        # 原文已被淘汰，其部分/段落索引也不再保留
+        for key in list(self._section_indexes):
+            if key[0] == directory:
+                self._section_indexes.pop(key, None)
+
+    def get_transcript(self, material_id: str, directories: List[str]) -> Optional[Dict[str, Any]]:
+        """根据材料ID获取完整听力原文"""
+        transcript, _ = self.get(material_id, directories)
+        return transcript
+
+    def get_section(self, material_id: str, section: str, directories: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        获取听力原文中的某个部分
+
+        Args:
+            material_id: 材料ID
+            section: 部分标识，如A、B、C
+            directories: 候选目录列表
+
+        Returns:
+            dict: 部分内容，找不到时返回None
+        """
+        sections, _ = self._sections_of(material_id, directories)
+        return sections.get(str(section).upper())
+
+    def get_passage(self, material_id: str, section: str, passage_id: Any, directories: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        获取听力原文中的某个段落
+
+        Args:
+            material_id: 材料ID
+            section: 部分标识，如A、B、C
+            passage_id: 段落编号
+            directories: 候选目录列表
+
+        Returns:
+            dict: 段落内容，找不到时返回None
+        """
+        _, passages = self._sections_of(material_id, directories)
+        return passages.get((str(section).upper(), str(passage_id)))
+
+
+_transcript_store: Optional[TranscriptStore] = None
+_material_store: Optional[DirectoryRecordStore] = None
+_store_lock = threading.Lock()
+
+
+def get_transcript_store() -> TranscriptStore:
+    """获取进程内共享的听力原文仓库"""
+    global _transcript_store
+    if _transcript_store is None:
+        with _store_lock:
+            if _transcript_store is None:
+                _transcript_store = TranscriptStore()
+    return _transcript_store
+
+
+def get_material_store() -> DirectoryRecordStore:
+    """获取进程内共享的材料文件仓库（按目录读取materials.json）"""
+    global _material_store
+    if _material_store is None:
+        with _store_lock:
+            if _material_store is None:
+                _material_store = DirectoryRecordStore('materials.json', 'materials')
+    return _material_store